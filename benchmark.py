@@ -0,0 +1,339 @@
+# This script benchmarks the computations of this repository and checks their results against our published outputs in
+# the directory output. It only uses the Python standard library and runs offline.
+#
+# There are two kinds of measurements. The micro benchmarks time single calls of the hot functions in this process:
+# the number and weight of the admissible fillings of a boundary constraint of rectangular blocks (transfer_matrix.py);
+# the transfer matrix of the (4 x 4)-block of rectangular_grid.py, whose last row is checked against the back side in
+# the first three columns only, together with its expected weight, backward messages and contraction by the front side
+# as used by the sweep (rectangular_sweep.py); the tables of numbers and weights of the admissible fillings of the
+# hexagon of hexagonal_grid.py, from which its expected weights are taken, computed from scratch, extended from k - 1
+# and looked up by translation (hexagonal_table.py), and, if NumPy is installed, computed and evaluated as arrays
+# (hexagonal_vectorized.py); and the enumeration of k-heights, the number and weight of admissible fillings and the
+# block divergence of the cycle blocks of Type 1.X.1 in generic_block.py; for several values of k and several block
+# sizes. The regression checks run the scripts themselves as subprocesses, compare every computed block divergence with
+# the published one character by character, and record the running time of the script.
+#
+# The timings are written to a baseline file with the option --record. Later runs compare their timings with this
+# baseline and flag everything that became slower than the tolerance. The exit status is nonzero if a computed result
+# differs from the published one.
+
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import generic_block
+import hexagonal_table
+import hexagonal_vectorized
+import rectangular_sweep
+from rectangular_block import RectangularBlock
+from transfer_matrix import compute_strips
+
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIRECTORY = os.path.join(DIRECTORY, "output")
+
+
+def time_calls(function, arguments_list, minimum_time=0.1, number_repetitions=5):
+
+    """
+    Calls function on every tuple of arguments_list, repeatedly until at least minimum_time seconds have passed. This
+    is repeated number_repetitions times, and the fastest repetition is taken, which is the least disturbed by other
+    processes.
+    :return:    Mean number of seconds per call in the fastest repetition
+    """
+
+    best_time_per_call = None
+
+    for _ in range(number_repetitions):
+        number_calls = 0
+        start_time = time.perf_counter()
+        while True:
+            for arguments in arguments_list:
+                function(*arguments)
+            number_calls += len(arguments_list)
+            elapsed = time.perf_counter() - start_time
+            if elapsed >= minimum_time:
+                break
+        if best_time_per_call is None or elapsed / number_calls < best_time_per_call:
+            best_time_per_call = elapsed / number_calls
+
+    return best_time_per_call
+
+
+def sample_rectangular_boundary_constraints(k, width, height, number_samples, seed=0):
+
+    """
+    :return:    List of number_samples random boundary constraints (front, left, right, back) of a
+                (width x height)-block whose boundary vertices at distance 2 differ by at most two
+    """
+
+    front_strips = compute_strips(k, width)
+    side_strips = compute_strips(k, height)
+    generator = random.Random(seed)
+
+    boundary_constraints = []
+    while len(boundary_constraints) < number_samples:
+        front = generator.choice(front_strips)
+        back = generator.choice(front_strips)
+        left = generator.choice(side_strips)
+        right = generator.choice(side_strips)
+        if abs(front[0] - left[0]) <= 2 and abs(front[-1] - right[0]) <= 2 and abs(back[0] - left[-1]) <= 2 \
+                and abs(back[-1] - right[-1]) <= 2:
+            boundary_constraints.append((front, left, right, back))
+
+    return boundary_constraints
+
+
+def cycle_block(k, x):
+
+    """
+    :return:    The block of Type 1.X.1 in three_regular_graphs.py, i.e. a cycle of length x whose vertices have one
+                boundary neighbor each. For x = 6, this is the block of hexagonal_grid.py.
+    """
+
+    block_boundary_edges = [(i, i) for i in range(x)]
+    edges = [(i, i + 1) for i in range(x - 1)] + [(x - 1, 0)]
+    return generic_block.Block(k, x, edges, x, [], block_boundary_edges)
+
+
+def run_micro_benchmarks(is_full):
+
+    """
+    :return:    Dictionary which maps the name of a micro benchmark to the number of seconds per call
+    """
+
+    results = dict()
+
+    rectangular_cases = [(2, 3, 3), (2, 4, 4), (3, 4, 4), (2, 3, 5)]
+    if is_full:
+        rectangular_cases += [(4, 4, 4), (2, 5, 5), (3, 3, 6)]
+    for k, width, height in rectangular_cases:
+        block = RectangularBlock(k, width, height)
+        boundary_constraints = sample_rectangular_boundary_constraints(k, width, height, 100)
+        results["RectangularBlock.count_and_weight k=" + str(k) + " " + str(width) + "x" + str(height)] = \
+            time_calls(block.count_and_weight, boundary_constraints)
+
+    # The transfer matrix of rectangular_grid.py is built anew in every call, and its evaluation is timed on the
+    # sampled boundary constraints that have admissible fillings.
+
+    sweep_cases = [2, 3]
+    if is_full:
+        sweep_cases += [4]
+    for k in sweep_cases:
+        suffix = " k=" + str(k) + " 4x4 back_columns=0..2"
+
+        def build_transfer_matrix():
+            rectangular_sweep._transfer_matrices.pop(k, None)
+            return rectangular_sweep.get_transfer_matrix(k)
+
+        results["rectangular_sweep.get_transfer_matrix" + suffix] = time_calls(build_transfer_matrix, [()],
+                                                                               number_repetitions=3)
+        transfer_matrix = rectangular_sweep.get_transfer_matrix(k)
+        boundary_constraints = [boundary_constraint for boundary_constraint
+                                in sample_rectangular_boundary_constraints(k, 4, 4, 200)
+                                if transfer_matrix.count_and_weight(*boundary_constraint)[0] > 0][:100]
+        results["TransferMatrix.expected_weight" + suffix] = time_calls(transfer_matrix.expected_weight,
+                                                                        boundary_constraints)
+        results["TransferMatrix.backward_messages" + suffix] = time_calls(
+            transfer_matrix.backward_messages, [(left, right, back) for _, left, right, back in boundary_constraints])
+        messages = transfer_matrix.backward_messages(*boundary_constraints[0][1:])
+        results["TransferMatrix.contract" + suffix] = time_calls(
+            transfer_matrix.contract, [(messages, front) for front, _, _, _ in boundary_constraints])
+
+    # The expected weights of hexagonal_grid.py are taken from the table of numbers and weights of all boundary
+    # restrictions of the hexagon.
+
+    hexagon_cases = [2, 3, 4, 5, 6]
+    if is_full:
+        hexagon_cases += [8, 10]
+    for k in hexagon_cases:
+        suffix = " k=" + str(k)
+        block_fillings = hexagonal_table.compute_block_fillings(k)
+        results["hexagonal_table.count_and_weight_table" + suffix] = time_calls(
+            hexagonal_table.count_and_weight_table, [(block_fillings, k)], number_repetitions=3)
+        previous_table = hexagonal_table.count_and_weight_table(hexagonal_table.compute_block_fillings(k - 1), k - 1)
+        results["hexagonal_table.extend_count_and_weight_table" + suffix] = time_calls(
+            hexagonal_table.extend_count_and_weight_table, [(previous_table, block_fillings, k)], number_repetitions=3)
+        if hexagonal_vectorized.numpy is not None:
+            results["hexagonal_vectorized.count_and_weight_table" + suffix] = time_calls(
+                hexagonal_vectorized.count_and_weight_table, [(block_fillings, k)], number_repetitions=3)
+            table = hexagonal_vectorized.count_and_weight_table(block_fillings, k)
+            results["hexagonal_vectorized.maximum_over_all_cover_relations" + suffix] = time_calls(
+                hexagonal_vectorized.maximum_over_all_cover_relations, [(table, k)], number_repetitions=3)
+
+    translation_table = hexagonal_table.count_and_weight_table(
+        hexagonal_table.compute_block_fillings(hexagonal_table.TRANSLATION_K), hexagonal_table.TRANSLATION_K)
+    for k in [10, 20]:
+        cover_relations = list(hexagonal_table.translated_cover_relations(translation_table, k))
+        generator = random.Random(0)
+        boundary_constraints = [boundary_constraint for cover_relation in generator.sample(cover_relations, 50)
+                                for boundary_constraint in cover_relation]
+        results["hexagonal_table.translated_count_and_weight k=" + str(k)] = time_calls(
+            hexagonal_table.translated_count_and_weight,
+            [(translation_table, k, boundary_constraint) for boundary_constraint in boundary_constraints])
+
+    # The cycles of length 6 are the hexagons of hexagonal_grid.py.
+
+    cycle_cases = [(2, 6), (3, 6), (4, 6), (2, 10), (3, 8)]
+    if is_full:
+        cycle_cases += [(5, 6), (6, 6), (3, 10), (4, 8)]
+    for k, x in cycle_cases:
+        suffix = " k=" + str(k) + " cycle " + str(x)
+        edges = [(i, i + 1) for i in range(x - 1)] + [(x - 1, 0)]
+        results["Block.compute_all_k_heights" + suffix] = time_calls(generic_block.Block.compute_all_k_heights,
+                                                                     [(k, x, edges)])
+        block = cycle_block(k, x)
+        results["Block.compute_count_and_weight" + suffix] = time_calls(
+            block.compute_count_and_weight,
+            [(boundary_constraint,) for boundary_constraint in block.boundary_constraints])
+
+        def block_divergence():
+            # A fresh block, such that the table of numbers and weights is not reused.
+            return cycle_block(k, x).block_divergence(0)
+
+        results["Block.block_divergence" + suffix] = time_calls(block_divergence, [()], number_repetitions=3)
+
+    return results
+
+
+def read_lines(path):
+
+    with open(path) as file:
+        return file.read().splitlines()
+
+
+def parse_results(script, lines):
+
+    """
+    Extracts the computed block divergences from the output of a script.
+    :return:    Dictionary which maps a case to the printed result, as string
+    """
+
+    results = dict()
+
+    for line in lines:
+        if script == "hexagonal_grid.py" and line.startswith("Block divergence for k="):
+            case, result = line[len("Block divergence for "):].split(" : ")
+            results[case] = result
+        elif script == "rectangular_grid.py" and line.startswith("BLOCK DIVERGENCE IN CASE k = "):
+            case, result = line[len("BLOCK DIVERGENCE IN CASE "):].split(": ")
+            results[case.replace(" ", "")] = result
+        elif script == "three_regular_graphs.py" and line[:1].isdigit() and "; " in line:
+            # The whole line, including number of fillings and boundary constraints, has to match.
+            fields = line.split("; ")
+            results["k=" + fields[0] + " " + fields[1]] = line
+
+    return results
+
+
+def run_regression_check(script, arguments, published_results):
+
+    """
+    Runs a script as subprocess and compares its results with the published results.
+    :return:    Tuple (running time in seconds, number of compared results, list of mismatches)
+    """
+
+    start_time = time.perf_counter()
+    completed_process = subprocess.run([sys.executable, os.path.join(DIRECTORY, script)] + arguments,
+                                       stdout=subprocess.PIPE, universal_newlines=True, cwd=DIRECTORY, check=True)
+    elapsed = time.perf_counter() - start_time
+
+    results = parse_results(script, completed_process.stdout.splitlines())
+    if not results:
+        return elapsed, 0, [(script + " " + " ".join(arguments), "no result", "")]
+
+    mismatches = []
+    for case, result in results.items():
+        published_result = published_results.get(case)
+        if published_result != result:
+            mismatches.append((script + " " + case, result, published_result))
+
+    return elapsed, len(results), mismatches
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmarks the computations and checks their results against the "
+                                                 "published outputs.")
+    parser.add_argument("--full", action="store_true",
+                        help="also run the larger cases, e.g. rectangular_grid.py for k = 3 (takes several minutes)")
+    parser.add_argument("--baseline", default=os.path.join(DIRECTORY, "benchmark_baseline.json"),
+                        help="baseline file (default: benchmark_baseline.json, which is not under version control)")
+    parser.add_argument("--record", action="store_true", help="write the timings of this run to the baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown against the baseline that is reported (default: 0.25)")
+    parser.add_argument("--skip-micro", action="store_true", help="skip the micro benchmarks")
+    parser.add_argument("--skip-regression", action="store_true", help="skip the regression checks")
+    arguments = parser.parse_args()
+
+    print("PYTHON VERSION:\n" + sys.version)
+
+    timings = dict()
+    number_mismatches = 0
+
+    if not arguments.skip_micro:
+        print("Micro benchmarks (seconds per call):")
+        for name, seconds in run_micro_benchmarks(arguments.full).items():
+            timings[name] = seconds
+            print("    " + name + ": " + format(seconds, ".3e"))
+
+    if not arguments.skip_regression:
+        published_results = dict()
+        for script in ["hexagonal_grid.py", "rectangular_grid.py", "three_regular_graphs.py"]:
+            published_results[script] = parse_results(
+                script, read_lines(os.path.join(OUTPUT_DIRECTORY, script[:-len(".py")] + ".txt")))
+
+        regression_checks = [
+            ("hexagonal_grid.py", ["--k", "2", "3", "4", "5", "6"]),
+            ("rectangular_grid.py", ["--k", "2", "--processes", "1"]),
+            ("three_regular_graphs.py", ["--k", "2"]),
+        ]
+        if arguments.full:
+            regression_checks += [
+                ("rectangular_grid.py", ["--k", "3"]),
+                ("three_regular_graphs.py", ["--k", "3"]),
+            ]
+
+        print("Regression checks against the published outputs:")
+        for script, script_arguments in regression_checks:
+            elapsed, number_results, mismatches = run_regression_check(script, script_arguments,
+                                                                       published_results[script])
+            name = script + " " + " ".join(script_arguments)
+            timings[name] = elapsed
+            number_mismatches += len(mismatches)
+            print("    " + name + ": " + str(number_results - len(mismatches)) + " of " + str(number_results)
+                  + " results match, " + format(elapsed, ".1f") + " seconds")
+            for case, result, published_result in mismatches:
+                print("        MISMATCH " + case + ": computed " + str(result) + ", published " + str(published_result))
+
+    if os.path.exists(arguments.baseline) and not arguments.record:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        print("Comparison with the baseline of " + baseline["date"] + " (Python " + baseline["python_version"] + "):")
+        for name, seconds in timings.items():
+            if name not in baseline["timings"]:
+                continue
+            ratio = seconds / baseline["timings"][name]
+            print("    " + name + ": " + format(ratio, ".2f") + " x baseline"
+                  + ("  SLOWER" if ratio > 1 + arguments.tolerance else ""))
+
+    if arguments.record:
+        with open(arguments.baseline, "w") as file:
+            json.dump({"date": time.strftime("%Y-%m-%d %H:%M:%S"), "python_version": platform.python_version(),
+                       "platform": platform.platform(), "timings": timings}, file, indent=4, sort_keys=True)
+        print("Timings written to " + arguments.baseline)
+
+    if number_mismatches:
+        print(str(number_mismatches) + " RESULTS DIFFER FROM THE PUBLISHED OUTPUTS")
+        sys.exit(1)
+    print("All results match the published outputs.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+# This program estimates the expected weight difference of a single cover relation of a rectangular (width x height)-
+# block by Monte Carlo, for blocks that are too large for the sweep over all boundary restrictions of
+# rectangular_block.py, e.g. (6x6)- or (8x8)-blocks. A cover relation is a pair of boundary restrictions, the lower one
+# and the upper one, which is larger by one at the augmentation vertex on the front side; see rectangular_block.py for
+# the sides of the boundary.
+#
+# Fillings that are admissible with respect to a boundary restriction are sampled uniformly at random by walking a
+# counting dynamic program backwards. Two backends are available:
+#
+# * transfer-matrix: the row-by-row dynamic program of transfer_matrix.py counts, for every row and every k-strip, the
+#   admissible completions of the rows behind (TransferMatrix.completion_counts). The rows are then sampled from the
+#   front, each conditioned on the row before. As in rectangular_block.py, the rows are parallel to the shorter sides.
+# * elimination: the variable elimination of elimination_block.py, for the block given as a generic block. The
+#   vertices are sampled in reverse elimination order, each conditioned on the vertices that are eliminated later
+#   (EliminationBlock.eliminate). The cost is exponential in the treewidth of the grid, i.e. in the shorter side.
+#
+# In both cases, every vertex takes the value given by the inverse of the distribution function of its conditional
+# distribution at a uniform random number, like in markov_chain.py. The random numbers are 64-bit integers, and the
+# inverse is evaluated with exact integer arithmetic, so that the numbers of fillings may exceed the range of floats.
+# The lower and the upper boundary restriction are sampled with the same random numbers ("common random numbers"):
+# since the admissible fillings form a distributive lattice, the conditional distributions are monotone in the boundary
+# and in the values chosen before, hence the filling for the upper boundary restriction is at least the filling for the
+# lower one at every vertex. The weight difference of the two fillings is an unbiased estimator of the expected weight
+# difference whose variance is much smaller than for independent samples; the factor is reported as well.
+#
+# The samples are drawn in batches by a pool of processes. The random numbers of a batch are determined by the seed and
+# the index of the batch, and only integer sums are returned, so the result does not depend on the number of processes.
+# The confidence intervals are those of the normal approximation.
+
+
+import argparse
+import functools
+import math
+import multiprocessing
+import os
+import random
+import sys
+
+import elimination_block
+import generic_block
+import instrumentation
+import table_store
+from rectangular_block import RectangularBlock, augment_front
+from rectangular_search import is_valid_boundary
+from transfer_matrix import TransferMatrix
+
+
+# Number of bits of the random numbers that determine the value of a vertex.
+UNIFORM_BITS = 64
+
+
+def invert(totals, uniform):
+
+    """
+    Evaluates the inverse of a distribution function at a uniform random number.
+    :param totals:      List of the nonnegative integer weights of the values 0, 1, ..., not all zero
+    :param uniform:     Integer in 0, ..., 2^UNIFORM_BITS - 1
+    :return:            The smallest index i such that the sum of totals[0], ..., totals[i] exceeds
+                        uniform / 2^UNIFORM_BITS times the sum of all totals
+    """
+
+    threshold = (uniform * sum(totals)) >> UNIFORM_BITS
+    for value, total in enumerate(totals):
+        if threshold < total:
+            return value
+        threshold -= total
+    raise ValueError("The weights of the values are all zero.")
+
+
+def rectangular_block_graph(width, height):
+
+    """
+    Describes the (width x height)-block as generic block, see generic_block.Block. Block vertex (row, column) has the
+    index row * width + column, rows are indexed from the front to the back. The boundary vertices are those of the
+    front side, the left side, the right side and the back side, in this order.
+    :return:    Tuple (number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges)
+    """
+
+    edges = [(r * width + c, r * width + c + 1) for r in range(height) for c in range(width - 1)] \
+        + [(r * width + c, (r + 1) * width + c) for r in range(height - 1) for c in range(width)]
+
+    sides = [(0, width), (width, height), (width + height, height), (width + 2 * height, width)]
+    boundary_edges = [(start + i, start + i + 1) for start, length in sides for i in range(length - 1)]
+
+    block_boundary_edges = [(c, c) for c in range(width)] \
+        + [(r * width, width + r) for r in range(height)] \
+        + [(r * width + width - 1, width + height + r) for r in range(height)] \
+        + [((height - 1) * width + c, width + 2 * height + c) for c in range(width)]
+
+    return width * height, edges, 2 * (width + height), boundary_edges, block_boundary_edges
+
+
+class RectangularSampler:
+
+    def __init__(self, k, width, height, front, left, right, back):
+
+        """
+        Samples the fillings of a rectangular block that are admissible with respect to a boundary restriction, by the
+        transfer-matrix backend. Raises a NoAdmissibleFilling exception if there is no such filling.
+        :param front, left, right, back:    Sides of the boundary restriction, see rectangular_block.py
+        """
+
+        self.width = width
+        self.height = height
+
+        # If the block is transposed, the rows of the transfer matrix are the columns of the block.
+
+        self.is_transposed = width > height
+        if self.is_transposed:
+            self.transfer_matrix = TransferMatrix(k, height, width)
+            self.counts = self.transfer_matrix.completion_counts(left, front, back, right)
+        else:
+            self.transfer_matrix = TransferMatrix(k, width, height)
+            self.counts = self.transfer_matrix.completion_counts(front, left, right, back)
+
+        self.number_fillings = sum(self.counts[0])
+        if self.number_fillings == 0:
+            raise generic_block.NoAdmissibleFilling()
+
+        self.first_candidates = [j for j, count in enumerate(self.counts[0]) if count]
+
+        # vertices[r][c] is the index of the block vertex in row r and column c of the transfer matrix.
+
+        if self.is_transposed:
+            self.vertices = [[c * width + r for c in range(height)] for r in range(width)]
+        else:
+            self.vertices = [[r * width + c for c in range(width)] for r in range(height)]
+
+    def sample(self, uniforms):
+
+        """
+        :param uniforms:    List of random integers in 0, ..., 2^UNIFORM_BITS - 1, one per block vertex
+        :return:            The sampled filling as tuple of values of the block vertices, see rectangular_block_graph()
+        """
+
+        strips = self.transfer_matrix.strips
+        compatible = self.transfer_matrix.compatible
+
+        filling = [0] * (self.width * self.height)
+        candidates = self.first_candidates
+
+        for r, counts in enumerate(self.counts):
+            if r > 0:
+                candidates = [j for j in compatible[candidates[0]] if counts[j]]
+
+            # The values of the row are sampled one after the other among the candidates that are still possible.
+
+            for c, vertex in enumerate(self.vertices[r]):
+                totals = [0] * (self.transfer_matrix.k + 1)
+                for j in candidates:
+                    totals[strips[j][c]] += counts[j]
+                value = invert(totals, uniforms[vertex])
+                candidates = [j for j in candidates if strips[j][c] == value]
+                filling[vertex] = value
+
+        return tuple(filling)
+
+
+class EliminationSampler:
+
+    def __init__(self, block, boundary_constraint):
+
+        """
+        Samples the fillings of a block that are admissible with respect to a boundary constraint, by the elimination
+        backend. Raises a NoAdmissibleFilling exception if there is no such filling.
+        :param block:                   elimination_block.EliminationBlock
+        :param boundary_constraint:     Boundary constraint given as a tuple of integers
+        """
+
+        self.k = block.k
+        self.number_vertices = block.number_vertices
+
+        (self.number_fillings, _), self.domains, steps = block.eliminate(boundary_constraint)
+        if self.number_fillings == 0:
+            raise generic_block.NoAdmissibleFilling()
+
+        self.steps = steps[::-1]
+
+    def sample(self, uniforms):
+
+        """
+        :param uniforms:    List of random integers in 0, ..., 2^UNIFORM_BITS - 1, one per block vertex
+        :return:            The sampled filling as tuple of values of the block vertices
+        """
+
+        values = dict()
+
+        for vertex, factors in self.steps:
+            totals = [0] * (self.k + 1)
+            for h in self.domains[vertex]:
+                values[vertex] = h
+                product = 1
+                for factor_scope, factor_table in factors:
+                    product *= factor_table.get(tuple(values[v] for v in factor_scope), (0, 0))[0]
+                    if product == 0:
+                        break
+                totals[h] = product
+            values[vertex] = invert(totals, uniforms[vertex])
+
+        return tuple(values[vertex] for vertex in range(self.number_vertices))
+
+
+@functools.lru_cache(maxsize=4)
+def get_sampler(backend, k, width, height, boundary):
+
+    """
+    :param backend:     "transfer-matrix" or "elimination"
+    :param boundary:    Tuple (front, left, right, back) of tuples
+    :return:            Sampler for the boundary restriction; cached, such that every worker process builds it once
+    """
+
+    if backend == "transfer-matrix":
+        return RectangularSampler(k, width, height, *boundary)
+
+    block = elimination_block.EliminationBlock(k, *rectangular_block_graph(width, height))
+    return EliminationSampler(block, sum(boundary, ()))
+
+
+def sample_batch(backend, k, width, height, lower, upper, seed, batch, number_samples):
+
+    """
+    Samples pairs of fillings for the lower and the upper boundary restriction with common random numbers.
+    :param lower, upper:    Boundary restrictions (front, left, right, back) of the cover relation
+    :param batch:           Index of the batch; together with seed, it determines the random numbers
+    :return:                Dictionary with the index of the batch, the number of samples and the list of the sums of
+                            the lower weights, the upper weights, the weight differences and of their squares
+    """
+
+    generator = random.Random(str(seed) + "/" + str(batch))
+    lower_sampler = get_sampler(backend, k, width, height, lower)
+    upper_sampler = get_sampler(backend, k, width, height, upper)
+    number_vertices = width * height
+
+    sums = [0] * 6
+    for _ in range(number_samples):
+        uniforms = [generator.getrandbits(UNIFORM_BITS) for _ in range(number_vertices)]
+        lower_filling = lower_sampler.sample(uniforms)
+        upper_filling = upper_sampler.sample(uniforms)
+
+        # Sanity check: the coupling is monotone.
+        assert all(lower_value <= upper_value for lower_value, upper_value in zip(lower_filling, upper_filling))
+
+        lower_weight = sum(lower_filling)
+        upper_weight = sum(upper_filling)
+        difference = upper_weight - lower_weight
+        for i, value in enumerate((lower_weight, upper_weight, difference)):
+            sums[2 * i] += value
+            sums[2 * i + 1] += value * value
+
+    return {"batch": batch, "number_samples": number_samples, "sums": sums}
+
+
+def _sample_batch_star(arguments):
+
+    # The last argument are the settings of the instrumentation, which worker processes do not necessarily inherit.
+
+    instrumentation.configure(**arguments[-1])
+    return sample_batch(*arguments[:-1])
+
+
+def normal_quantile(p):
+
+    """
+    :return:    The p-quantile of the standard normal distribution, computed by bisection
+    """
+
+    low, high = -40.0, 40.0
+    for _ in range(200):
+        middle = (low + high) / 2
+        if (1 + math.erf(middle / math.sqrt(2))) / 2 < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def mean_and_standard_error(number_samples, total, total_of_squares):
+
+    """
+    :return:    Tuple (sample mean, standard error of the mean); the variance is computed from the integer sums exactly
+    """
+
+    mean = total / number_samples
+    if number_samples < 2:
+        return mean, float("inf")
+    variance = (number_samples * total_of_squares - total * total) / (number_samples * (number_samples - 1))
+    return mean, math.sqrt(variance / number_samples)
+
+
+def estimate(backend, k, width, height, lower, upper, number_samples, batch_size=1000, processes=1, seed=0,
+             confidence=0.95):
+
+    """
+    Estimates the expected weights of the fillings for the lower and the upper boundary restriction of a cover relation
+    and their difference, see the comment at the beginning.
+    :param backend:         "transfer-matrix" or "elimination"
+    :param lower, upper:    Boundary restrictions (front, left, right, back) of the cover relation, each as tuple of
+                            tuples
+    :param number_samples:  Number of sampled pairs of fillings, at least 1
+    :param batch_size:      Number of samples per task of the pool, at least 1
+    :param processes:       Number of worker processes
+    :param seed:            Seed of the random numbers
+    :param confidence:      Confidence level of the intervals
+    :return:                Dictionary with the numbers of admissible fillings, and for "lower", "upper" and
+                            "difference" the pair (estimate, half-width of the confidence interval), as well as the
+                            variance reduction factor of the common random numbers
+    """
+
+    if number_samples < 1 or batch_size < 1:
+        raise ValueError("The number of samples and the batch size have to be positive.")
+
+    # Building the samplers in the main process raises NoAdmissibleFilling early, and single-process runs reuse them.
+
+    number_fillings = (get_sampler(backend, k, width, height, lower).number_fillings,
+                       get_sampler(backend, k, width, height, upper).number_fillings)
+
+    batches = [(batch, min(batch_size, number_samples - batch * batch_size))
+               for batch in range((number_samples + batch_size - 1) // batch_size)]
+    arguments = [(backend, k, width, height, lower, upper, seed, batch, size, instrumentation.get_settings())
+                 for batch, size in batches]
+
+    if processes > 1 and len(arguments) > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_sample_batch_star, arguments)
+    else:
+        pool = None
+        results = map(_sample_batch_star, arguments)
+
+    progress = instrumentation.Progress("block_sampler", total=number_samples, unit="samples", k=k,
+                                        block=[width, height], backend=backend)
+    processed = 0
+    sums = [0] * 6
+
+    try:
+        for result in results:
+            processed += result["number_samples"]
+            sums = [total + value for total, value in zip(sums, result["sums"])]
+            progress.update(processed, sums[4] / processed)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    z = normal_quantile((1 + confidence) / 2)
+    summary = {"number_fillings": number_fillings, "number_samples": processed}
+    for i, name in enumerate(("lower", "upper", "difference")):
+        mean, standard_error = mean_and_standard_error(processed, sums[2 * i], sums[2 * i + 1])
+        summary[name] = (mean, z * standard_error)
+
+    # Without common random numbers, the variance of the difference would be the sum of the two variances.
+
+    independent_half_width = math.hypot(summary["lower"][1], summary["upper"][1])
+    summary["variance_reduction"] = (independent_half_width / summary["difference"][1]) ** 2 \
+        if summary["difference"][1] > 0 else float("inf")
+
+    progress.update(processed, summary["difference"][0], is_final=True)
+
+    return summary
+
+
+def exact_expected_weight_difference(backend, k, width, height, lower, upper):
+
+    """
+    :return:    The expected weight difference of the cover relation, computed by the counting dynamic program
+    """
+
+    if backend == "transfer-matrix":
+        count_and_weight = RectangularBlock(k, width, height).count_and_weight
+    else:
+        block = elimination_block.EliminationBlock(k, *rectangular_block_graph(width, height))
+
+        def count_and_weight(*boundary):
+            return block.compute_count_and_weight(sum(boundary, ()))
+
+    expected_weights = []
+    for boundary in (lower, upper):
+        count, weight = count_and_weight(*boundary)
+        expected_weights.append(weight / count)
+
+    return expected_weights[1] - expected_weights[0]
+
+
+def format_estimate(pair):
+
+    return format(pair[0], ".6f") + " +- " + format(pair[1], ".6f")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Estimates the expected weight difference of a cover relation of a "
+                                                 "rectangular block by sampling admissible fillings.")
+    parser.add_argument("--width", type=int, default=6, help="number of vertices on the front side (default: 6)")
+    parser.add_argument("--height", type=int, default=6, help="number of vertices on the left side (default: 6)")
+    parser.add_argument("--k", type=int, nargs="+", default=[2], help="values of k (default: 2)")
+    for side, length in (("front", "width"), ("left", "height"), ("right", "height"), ("back", "width")):
+        parser.add_argument("--" + side, type=int, nargs="+", default=None,
+                            help="values of the " + side + " side of the lower boundary restriction, " + length
+                                 + " many (default: all k // 2)")
+    parser.add_argument("--augmentation-vertex", type=int, default=None,
+                        help="index of the augmented vertex on the front side (default: (width - 1) // 2)")
+    parser.add_argument("--backend", choices=["transfer-matrix", "elimination"], default="transfer-matrix",
+                        help="dynamic program that the sampling walks backwards (default: transfer-matrix)")
+    parser.add_argument("--samples", type=int, default=10000, help="number of sampled pairs (default: 10000)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="number of samples per task of the worker processes (default: 1000)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random numbers (default: 0)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="confidence level of the intervals (default: 0.95)")
+    parser.add_argument("--compare-exact", action="store_true",
+                        help="also compute the expected weight difference exactly by the dynamic program")
+    instrumentation.add_arguments(parser)
+    table_store.add_arguments(parser)
+    arguments = parser.parse_args()
+    instrumentation.configure_from_arguments(arguments)
+    table_store.configure_from_arguments(arguments)
+
+    width, height = arguments.width, arguments.height
+    index = (width - 1) // 2 if arguments.augmentation_vertex is None else arguments.augmentation_vertex
+    if not 0 <= index < width:
+        parser.error("the augmentation vertex has to be one of 0, ..., width - 1")
+    if arguments.samples < 1 or arguments.batch_size < 1:
+        parser.error("the number of samples and the batch size have to be positive")
+    for side, length in (("front", width), ("left", height), ("right", height), ("back", width)):
+        if getattr(arguments, side) is not None and len(getattr(arguments, side)) != length:
+            parser.error("the " + side + " side needs " + str(length) + " values")
+
+    print("PYTHON VERSION:\n" + sys.version)
+
+    for k in arguments.k:
+
+        print("CASE k = " + str(k) + ", BLOCK " + str(width) + " x " + str(height) + ", BACKEND " + arguments.backend)
+
+        front, left, right, back = [tuple(getattr(arguments, side)) if getattr(arguments, side) is not None
+                                    else (k // 2,) * length
+                                    for side, length in (("front", width), ("left", height), ("right", height),
+                                                         ("back", width))]
+        augmented_front = augment_front(k, front, left, right, index) \
+            if is_valid_boundary(k, [front, left, right, back]) else None
+        if augmented_front is None:
+            print("The boundary restriction or its augmentation at front vertex " + str(index) + " is not valid.")
+            continue
+
+        lower = (front, left, right, back)
+        upper = (augmented_front, left, right, back)
+        print("Lower boundary restriction: " + str({"front": front, "left": left, "right": right, "back": back})
+              + "; augmentation at front vertex " + str(index))
+
+        try:
+            summary = estimate(arguments.backend, k, width, height, lower, upper, arguments.samples,
+                               arguments.batch_size, arguments.processes, arguments.seed, arguments.confidence)
+        except generic_block.NoAdmissibleFilling:
+            print("There is no admissible filling for the lower or the upper boundary restriction.")
+            continue
+
+        instrumentation.write_record(dict(summary, name="block_sampler result", k=k, block=[width, height],
+                                          backend=arguments.backend, lower=lower, augmentation_vertex=index))
+
+        level = format(100 * arguments.confidence, "g") + "%"
+        print("Admissible fillings: " + str(summary["number_fillings"][0]) + " (lower), "
+              + str(summary["number_fillings"][1]) + " (upper)")
+        print("Expected weights with " + level + " confidence intervals: " + format_estimate(summary["lower"])
+              + " (lower), " + format_estimate(summary["upper"]) + " (upper)")
+        print("Variance reduction by common random numbers: factor " + format(summary["variance_reduction"], ".1f"))
+        print("EXPECTED WEIGHT DIFFERENCE IN CASE k = " + str(k) + ": " + format_estimate(summary["difference"])
+              + " (" + level + " confidence interval, " + str(summary["number_samples"]) + " samples)")
+
+        if arguments.compare_exact:
+            exact_difference = exact_expected_weight_difference(arguments.backend, k, width, height, lower, upper)
+            is_covered = abs(exact_difference - summary["difference"][0]) <= summary["difference"][1]
+            print("Exact expected weight difference: " + str(exact_difference) + " ("
+                  + ("inside" if is_covered else "outside") + " the confidence interval)")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# This code runs a list of block divergence computations ("cases") of generic_block.py, as used by
+# three_regular_graphs.py . Every case is described as data, i.e. as a dictionary with the name of the case, the k of
+# the k-heights, the block graph, the boundary and the augmentation vertex, so that the cases can be sent to a pool of
+# worker processes. Cases that differ only in their augmentation vertex share one block and are computed together in
+# one pass over the boundary constraints, see generic_block.Block.block_divergences(). The results are returned in the
+# order of the cases, independent of the order in which the workers finish, so that the output of a script stays the
+# same.
+#
+# In incremental mode, cases that differ only in k and in their augmentation vertex are also computed together: the
+# blocks are built in increasing order of k, and the block for k extends the tables of the block for k - 1, see
+# generic_block.Block. This changes neither the results nor their order, but there are fewer tasks for the pool.
+#
+# Optionally, the results are kept in a cache file with one line of JSON per computed case. A case is identified by its
+# k, block graph, boundary, augmentation vertex and whether it is computed exactly, but not by its name or the backend,
+# which do not change the result. Cases that are found in the cache file are not computed again, so a rerun or a run
+# with additional cases only computes the new cases. The cache file has to be deleted if the computation itself is
+# changed.
+
+
+import fractions
+import json
+import multiprocessing
+import os
+
+import elimination_block
+import generic_block
+import instrumentation
+
+
+BLOCK_CLASSES = {
+    "enumeration": generic_block.Block,
+    "elimination": elimination_block.EliminationBlock,
+}
+
+
+def make_case(name, k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges,
+              augmentation_vertex):
+
+    """
+    :return:    The description of a case as dictionary; the parameters are those of generic_block.Block and of
+                generic_block.Block.block_divergence .
+    """
+
+    return {"name": name, "k": k, "number_vertices": number_vertices, "edges": edges,
+            "number_boundary_vertices": number_boundary_vertices, "boundary_edges": boundary_edges,
+            "block_boundary_edges": block_boundary_edges, "augmentation_vertex": augmentation_vertex}
+
+
+def block_key(case, is_incremental=False):
+
+    """
+    :return:    String that identifies the block of the case, i.e. k, block graph and boundary. In incremental mode,
+                k is left out, so that the blocks for all k are computed together.
+    """
+
+    return json.dumps([None if is_incremental else case["k"], case["number_vertices"], case["edges"],
+                       case["number_boundary_vertices"], case["boundary_edges"], case["block_boundary_edges"]])
+
+
+def case_key(case, is_exact):
+
+    """
+    :return:    String that identifies the result of the case in the cache file
+    """
+
+    return json.dumps([case["k"], case["number_vertices"], case["edges"], case["number_boundary_vertices"],
+                       case["boundary_edges"], case["block_boundary_edges"], case["augmentation_vertex"], is_exact])
+
+
+def parse_result(result, is_exact):
+
+    # Results are stored as strings: floats by their shortest representation, which is read back exactly, and
+    # fractions as "p/q".
+
+    if is_exact:
+        return fractions.Fraction(result)
+    return float(result)
+
+
+def read_cache(cache_file):
+
+    """
+    :return:    Dictionary which maps the keys of the cached cases to their records. Empty if there is no cache file.
+    """
+
+    cache = dict()
+    if cache_file is None or not os.path.exists(cache_file):
+        return cache
+
+    with open(cache_file) as file:
+        for line in file:
+            # A line that is incomplete because a run has been interrupted while writing it is ignored.
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            cache[record["key"]] = record
+
+    return cache
+
+
+def compute_block_cases(cases, backend="enumeration", is_exact=False, is_incremental=False):
+
+    """
+    Computes the block divergence of cases that share their block, i.e. that differ at most in their augmentation
+    vertex, and in incremental mode also in k. The block is built once per k, in increasing order of k.
+    :return:    List of records, one per case, as dictionaries with the number of fillings, the number of boundary
+                constraints and the block divergence as string
+    """
+
+    records = [None] * len(cases)
+    previous_block = None
+
+    for k in sorted(set(case["k"] for case in cases)):
+
+        indices = [index for index, case in enumerate(cases) if case["k"] == k]
+        case = cases[indices[0]]
+        arguments = [k, case["number_vertices"], case["edges"], case["number_boundary_vertices"],
+                     case["boundary_edges"], case["block_boundary_edges"]]
+        if previous_block is not None and previous_block.k == k - 1:
+            arguments.append(previous_block)
+        block = BLOCK_CLASSES[backend](*arguments)
+
+        augmentation_vertices = sorted(set(cases[index]["augmentation_vertex"] for index in indices))
+        results = dict(zip(augmentation_vertices, block.block_divergences(augmentation_vertices, is_exact)))
+
+        for index in indices:
+            records[index] = {"number_fillings": block.number_fillings,
+                              "number_boundary_constraints": len(block.boundary_constraints),
+                              "result": str(results[cases[index]["augmentation_vertex"]])}
+        previous_block = block if is_incremental else None
+
+    return records
+
+
+def _compute_block_cases_star(arguments):
+
+    # The last argument are the settings of the instrumentation, which worker processes do not necessarily inherit.
+
+    instrumentation.configure(**arguments[-1])
+    indices, cases, backend, is_exact, is_incremental = arguments[:-1]
+    return list(zip(indices, compute_block_cases(cases, backend, is_exact, is_incremental)))
+
+
+def run_cases(cases, backend="enumeration", is_exact=False, processes=1, cache_file=None, is_incremental=False):
+
+    """
+    Computes the block divergence of all cases, in parallel if processes > 1, and skips the cases that are found in the
+    cache file. Newly computed results are appended to the cache file as soon as they are available.
+    :param cases:           List of cases, see make_case()
+    :param backend:         "enumeration" for generic_block.Block or "elimination" for
+                            elimination_block.EliminationBlock
+    :param is_exact:        Whether the expected weight differences are compared exactly
+    :param processes:       Number of worker processes
+    :param cache_file:      Path of the cache file, or None for not caching results
+    :param is_incremental:  Whether the blocks for k extend the tables of the blocks for k - 1, see the comment at the
+                            beginning
+    :return:                Generator of tuples (case, number of fillings, number of boundary constraints, block
+                            divergence) in the order of cases. The block divergence is a float, or a
+                            fractions.Fraction if is_exact.
+    """
+
+    cache = read_cache(cache_file)
+    keys = [case_key(case, is_exact) for case in cases]
+
+    # The cases that are not found in the cache are grouped by their block, in the order of their first case.
+
+    indices_by_block = dict()
+    for index, case in enumerate(cases):
+        if keys[index] not in cache:
+            indices_by_block.setdefault(block_key(case, is_incremental), []).append(index)
+
+    arguments = [(indices, [cases[index] for index in indices], backend, is_exact, is_incremental,
+                  instrumentation.get_settings())
+                 for indices in indices_by_block.values()]
+
+    if processes > 1 and len(arguments) > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_compute_block_cases_star, arguments)
+    else:
+        pool = None
+        results = map(_compute_block_cases_star, arguments)
+
+    cache_stream = open(cache_file, "a") if cache_file is not None else None
+
+    # Results that arrive before the results of all earlier cases are held back until these are available.
+
+    records = dict()
+    next_index = 0
+
+    try:
+        for index in range(len(cases)):
+            while keys[index] not in cache and index not in records:
+                for finished_index, record in next(results):
+                    records[finished_index] = record
+                    if cache_stream is not None:
+                        cache_stream.write(json.dumps(dict(record, key=keys[finished_index])) + "\n")
+                if cache_stream is not None:
+                    cache_stream.flush()
+
+            record = records.pop(index, None) or cache[keys[index]]
+            yield (cases[index], record["number_fillings"], record["number_boundary_constraints"],
+                   parse_result(record["result"], is_exact))
+            next_index = index + 1
+    finally:
+        if cache_stream is not None:
+            cache_stream.close()
+        if pool is not None:
+            if next_index < len(cases):
+                # The generator has not been exhausted, e.g. because a case raised an exception.
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
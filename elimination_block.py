@@ -0,0 +1,199 @@
+# This code provides an alternative backend for generic_block.Block that does not iterate over all fillings of the
+# block. Number and total weight of the admissible fillings with respect to a boundary constraint are computed by
+# variable elimination over the block graph instead: every block vertex is a variable, the boundary constraint is
+# conditioned in by restricting the domain of every block vertex to the values that differ by at most one from all of
+# its boundary neighbors, and every edge of the block is a factor that only allows values differing by at most one.
+# Factors map assignments of their variables to pairs (number, weight), which are multiplied by
+# (c1, w1) * (c2, w2) = (c1 * c2, c1 * w2 + c2 * w1) and summed up componentwise.
+#
+# The variables are eliminated in a greedy minimum degree order. This order corresponds to a tree decomposition of the
+# block graph whose bags are the eliminated vertices together with their neighbors at the time of elimination, and the
+# cost of a computation is exponential only in the size of the largest bag. For the cycles and paths in
+# three_regular_graphs.py, the bags have at most three vertices, so the cost is polynomial in the size of the block and
+# in k.
+
+
+import itertools
+
+import generic_block
+
+
+def multiply(first, second):
+
+    """
+    :return:    The product of two pairs (number, weight) as described above.
+    """
+
+    return first[0] * second[0], first[0] * second[1] + second[0] * first[1]
+
+
+def compute_elimination_order(number_vertices, edges):
+
+    """
+    Computes a greedy minimum degree elimination order of the graph.
+    :return:    Tuple (order, bags) where order is the list of vertices in elimination order and bags[i] is the set of
+                neighbors of order[i] at the time of its elimination
+    """
+
+    neighbors = [set() for _ in range(number_vertices)]
+    for edge in edges:
+        if edge[0] != edge[1]:
+            neighbors[edge[0]].add(edge[1])
+            neighbors[edge[1]].add(edge[0])
+
+    order = []
+    bags = []
+    remaining = set(range(number_vertices))
+
+    while remaining:
+        vertex = min(remaining, key=lambda v: (len(neighbors[v]), v))
+        bag = set(neighbors[vertex])
+        order.append(vertex)
+        bags.append(bag)
+
+        # Eliminating the vertex connects all of its neighbors.
+        for neighbor in bag:
+            neighbors[neighbor] |= bag - {neighbor}
+            neighbors[neighbor].discard(vertex)
+        remaining.remove(vertex)
+
+    return order, bags
+
+
+class EliminationBlock(generic_block.Block):
+
+    def prepare_fillings(self):
+
+        """
+        Replaces the enumeration of generic_block.Block: the fillings of the block are not enumerated, hence the
+        attribute fillings is None; use number_fillings instead. The elimination order of the block graph is computed
+        once. The boundary constraints are only enumerated on first use, so that a large block can be used for single
+        boundary constraints, see block_sampler.py .
+        """
+
+        self.elimination_order, self.bags = compute_elimination_order(self.number_vertices, self.edges)
+        self.treewidth_bound = max([len(bag) for bag in self.bags] + [0])
+
+        self.boundary_neighbors = [[] for _ in range(self.number_vertices)]
+        for block_vertex, boundary_vertex in self.block_boundary_edges:
+            self.boundary_neighbors[block_vertex].append(boundary_vertex)
+
+        self.fillings = None
+        self._number_fillings = None
+        self._boundary_constraints = None
+
+    @property
+    def number_fillings(self):
+
+        if self._number_fillings is None:
+            self._number_fillings = self.compute_count_and_weight(None)[0]
+        return self._number_fillings
+
+    @property
+    def boundary_constraints(self):
+
+        if self._boundary_constraints is None:
+            self._boundary_constraints = generic_block.get_all_k_heights(
+                self.k, generic_block.canonical_graph(self.number_boundary_vertices, self.boundary_edges))
+        return self._boundary_constraints
+
+    def compute_domains(self, boundary_constraint):
+
+        """
+        :return:    For every block vertex, the list of values that are compatible with all of its boundary neighbors.
+                    If boundary_constraint is None, no boundary vertex is taken into account.
+        """
+
+        domains = []
+        for vertex in range(self.number_vertices):
+            lowest = 0
+            highest = self.k
+            if boundary_constraint is not None:
+                for boundary_vertex in self.boundary_neighbors[vertex]:
+                    lowest = max(lowest, boundary_constraint[boundary_vertex] - 1)
+                    highest = min(highest, boundary_constraint[boundary_vertex] + 1)
+            domains.append(list(range(lowest, highest + 1)))
+        return domains
+
+    def compute_count_and_weight(self, boundary_constraint):
+
+        """
+        Counts the admissible fillings with respect to the boundary_constraint and sums up their weights by variable
+        elimination.
+        :param boundary_constraint:     Boundary constraint given as a tuple of integers, or None for counting all
+                                        fillings of the block.
+        :return:                        Tuple of integers (number of admissible fillings, total weight).
+        """
+
+        return self.eliminate(boundary_constraint)[0]
+
+    def eliminate(self, boundary_constraint):
+
+        """
+        Runs the variable elimination for the boundary constraint, see compute_count_and_weight().
+        :return:    Tuple (result, domains, steps). result is the tuple (number of admissible fillings, total weight),
+                    domains are the domains of the block vertices, see compute_domains(), and steps is the list of
+                    pairs (vertex, factors) in elimination order, where factors are the factors that involve the vertex
+                    when it is eliminated. Given values of all vertices that are eliminated later, the number of
+                    admissible fillings in which the vertex has the value h is proportional to the product of the
+                    numbers of these factors at h, which is used for sampling, see block_sampler.py . If a domain is
+                    empty, steps is empty.
+        """
+
+        domains = self.compute_domains(boundary_constraint)
+        if any(len(domain) == 0 for domain in domains):
+            return (0, 0), domains, []
+
+        # A factor is a pair (scope, table) where scope is a tuple of vertices and table maps tuples of values of these
+        # vertices to pairs (number, weight). Missing entries stand for (0, 0).
+
+        factors = [((vertex,), {(h,): (1, h) for h in domains[vertex]}) for vertex in range(self.number_vertices)]
+        for edge in self.edges:
+            if edge[0] == edge[1]:
+                continue
+            table = dict()
+            for h in domains[edge[0]]:
+                for g in domains[edge[1]]:
+                    if abs(h - g) <= 1:
+                        table[(h, g)] = (1, 0)
+            factors.append(((edge[0], edge[1]), table))
+
+        steps = []
+
+        for vertex in self.elimination_order:
+
+            involved = [factor for factor in factors if vertex in factor[0]]
+            factors = [factor for factor in factors if vertex not in factor[0]]
+            steps.append((vertex, involved))
+
+            scope = tuple(sorted(set(v for factor_scope, _ in involved for v in factor_scope) - {vertex}))
+            table = dict()
+
+            for assignment in itertools.product(*[domains[v] for v in scope]):
+                values = dict(zip(scope, assignment))
+                count = 0
+                weight = 0
+                for h in domains[vertex]:
+                    values[vertex] = h
+                    product = (1, 0)
+                    for factor_scope, factor_table in involved:
+                        entry = factor_table.get(tuple(values[v] for v in factor_scope))
+                        if entry is None:
+                            product = None
+                            break
+                        product = multiply(product, entry)
+                    if product is not None:
+                        count += product[0]
+                        weight += product[1]
+                if count:
+                    table[assignment] = (count, weight)
+
+            factors.append((scope, table))
+
+        # Only factors with empty scope remain.
+
+        result = (1, 0)
+        for _, table in factors:
+            result = multiply(result, table.get((), (0, 0)))
+
+        return result, domains, steps
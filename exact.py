@@ -0,0 +1,83 @@
+# This code provides the exact arithmetic that is used when the block divergence is computed without rounding. The
+# dynamic programs count the admissible fillings and sum up their weights as integers anyway, so the expected weight
+# difference of a cover relation (l, u) is the fraction
+#
+#       weight_u / count_u - weight_l / count_l = (weight_u * count_l - weight_l * count_u) / (count_u * count_l) .
+#
+# We keep such differences as pairs (numerator, denominator) of integers with positive denominators and compare them by
+# cross-multiplication. Only the final maximum is converted to a fractions.Fraction.
+
+
+from fractions import Fraction
+
+
+def difference(count_lower, weight_lower, count_upper, weight_upper):
+
+    """
+    :return:    The expected weight difference of a cover relation as pair (numerator, denominator) of integers, given
+                number and total weight of the admissible fillings with respect to the lower and the upper boundary
+                constraint. Both numbers of fillings have to be positive.
+    """
+
+    return weight_upper * count_lower - weight_lower * count_upper, count_upper * count_lower
+
+
+def is_greater(numerator, denominator, other_numerator, other_denominator):
+
+    """
+    :return:    True iff numerator / denominator > other_numerator / other_denominator, where both denominators are
+                positive.
+    """
+
+    return numerator * other_denominator > other_numerator * denominator
+
+
+class ExactMaximum:
+
+    def __init__(self, numerator=0, denominator=1, witness=None):
+
+        """
+        Keeps track of the maximum of expected weight differences together with a witness. Initially, the maximum is 0
+        without a witness, as in the floating point computations.
+        """
+
+        self.numerator = numerator
+        self.denominator = denominator
+        self.witness = witness
+
+    def update(self, count_lower, weight_lower, count_upper, weight_upper, witness=None):
+
+        """
+        Updates the maximum by the expected weight difference of a cover relation, see difference().
+        :return:    True iff the maximum was increased
+        """
+
+        numerator = weight_upper * count_lower - weight_lower * count_upper
+        denominator = count_upper * count_lower
+
+        if numerator * self.denominator > self.numerator * denominator:
+            self.numerator = numerator
+            self.denominator = denominator
+            self.witness = witness
+            return True
+
+        return False
+
+    def merge(self, other):
+
+        """
+        Updates the maximum by the maximum kept in another ExactMaximum, e.g. of another shard.
+        """
+
+        if is_greater(other.numerator, other.denominator, self.numerator, self.denominator):
+            self.numerator = other.numerator
+            self.denominator = other.denominator
+            self.witness = other.witness
+
+    def value(self):
+
+        """
+        :return:    The maximum as fractions.Fraction
+        """
+
+        return Fraction(self.numerator, self.denominator)
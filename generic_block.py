@@ -2,18 +2,156 @@
 # This code is a generic brute force attack for computing the block divergence for arbitrary blocks in arbitrary graphs.
 # As it iterates over all block constraints and block fillings, it may only be applied for blocks consisting of
 # few vertices and few boundary vertices, otherwise the runtime will explode.
+#
+# In order to speed up the computations for a single boundary constraint, sets of fillings are encoded as bitsets, i.e.
+# Python integers whose i-th bit corresponds to the i-th filling. For every block vertex and every boundary value, we
+# precompute the bitset of the fillings whose value on the block vertex differs by at most one from the boundary value,
+# and for every bit position j of the weights the bitset of the fillings whose weight has the j-th bit set. Then the
+# admissible fillings with respect to a boundary constraint are the AND of one bitset per block boundary edge, their
+# number is a popcount, and their total weight is a weighted sum of popcounts.
 
 
+import collections
+import functools
 import itertools
 
+import exact
+import instrumentation
+import table_store
+
 
 class NoAdmissibleFilling(Exception):
     pass
 
 
+try:
+    popcount = int.bit_count
+except AttributeError:
+    # Python < 3.10
+    def popcount(bitset):
+        return bin(bitset).count("1")
+
+
+def canonical_graph(n, edges):
+
+    """
+    :return:    Hashable description (n, edges) of the graph with vertices 0, ..., n-1 and the given edges, where every
+                edge is written with the smaller vertex first and the edges are sorted and without repetitions. Hence,
+                it does not depend on the order and orientation in which the edges are given.
+    """
+
+    return n, tuple(sorted(set((min(edge), max(edge)) for edge in edges)))
+
+
+# The k-heights of a graph and the bitsets of a block are shared by all blocks with the same graph, e.g. by the blocks
+# of three_regular_graphs.py that differ only in their boundary or in their augmentation vertex. The caches are
+# bounded, since the k-heights of the boundary alone can take more than a hundred megabytes for k = 3. They are used
+# read-only. If a table directory is configured, they are also kept on disk for later runs, see table_store.py .
+
+@functools.lru_cache(maxsize=8)
+def get_all_k_heights(k, graph):
+
+    """
+    :param graph:   Graph as returned by canonical_graph()
+    :return:        Tuple of all k-heights of the graph in lexicographic order, see Block.compute_all_k_heights()
+    """
+
+    return table_store.cached("k_heights", {"k": k, "graph": graph},
+                              lambda: tuple(Block.compute_all_k_heights(k, graph[0], graph[1])),
+                              lambda k_heights: table_store.encode_rows("k_heights", k_heights, graph[0]),
+                              lambda arrays: tuple(table_store.decode_rows(arrays, "k_heights")))
+
+
+def compute_boundary_depth(number_vertices, edges, block_boundary_edges):
+
+    """
+    :return:    The largest distance of a block vertex to the boundary, i.e. one plus the largest distance in the block
+                graph to a block vertex with a boundary neighbor, or None if some block vertex is not connected to such
+                a vertex. The values of an admissible filling differ by at most this distance from the boundary values.
+    """
+
+    neighbors = [[] for _ in range(number_vertices)]
+    for v, w in edges:
+        neighbors[v].append(w)
+        neighbors[w].append(v)
+
+    distances = {v: 1 for v, _ in block_boundary_edges}
+    queue = collections.deque(distances)
+    while queue:
+        v = queue.popleft()
+        for w in neighbors[v]:
+            if w not in distances:
+                distances[w] = distances[v] + 1
+                queue.append(w)
+
+    if len(distances) < number_vertices:
+        return None
+    return max(distances.values(), default=0)
+
+
+@functools.lru_cache(maxsize=8)
+def get_filling_bitsets(k, graph):
+
+    """
+    Computes the bitsets of the fillings of a block with the given graph that are described in the module comment:
+    all_fillings_bitset contains all fillings, near_value_bitsets[i][c] contains the fillings whose value on block
+    vertex i differs by at most one from c, and weight_bitsets[j] contains the fillings whose weight has the j-th bit
+    set. The i-th bit corresponds to the i-th filling of get_all_k_heights(k, graph).
+    :param graph:   Graph as returned by canonical_graph()
+    :return:        Tuple (all_fillings_bitset, near_value_bitsets, weight_bitsets)
+    """
+
+    return table_store.cached("filling_bitsets", {"k": k, "graph": graph},
+                              lambda: compute_filling_bitsets(k, graph), encode_filling_bitsets,
+                              lambda arrays: decode_filling_bitsets(arrays, k, graph))
+
+
+def compute_filling_bitsets(k, graph):
+
+    number_vertices = graph[0]
+    fillings = get_all_k_heights(k, graph)
+
+    def bitset(predicate):
+        # The last filling corresponds to the most significant bit.
+        return int("0" + "".join("1" if predicate(filling) else "0" for filling in reversed(fillings)), 2)
+
+    all_fillings_bitset = (1 << len(fillings)) - 1
+
+    near_value_bitsets = []
+    for i in range(number_vertices):
+        near_value_bitsets.append({c: bitset(lambda filling: abs(filling[i] - c) <= 1) for c in range(-1, k + 2)})
+
+    max_weight = k * number_vertices
+    weight_bitsets = [bitset(lambda filling: (sum(filling) >> j) & 1) for j in range(max_weight.bit_length())]
+
+    return all_fillings_bitset, near_value_bitsets, weight_bitsets
+
+
+def encode_filling_bitsets(filling_bitsets):
+
+    # The near-value bitsets are stored in the order of the block vertices and then of the values -1, ..., k + 1.
+
+    all_fillings_bitset, near_value_bitsets, weight_bitsets = filling_bitsets
+    number_fillings = all_fillings_bitset.bit_length()
+    arrays = table_store.encode_bitsets("near_value", [bitset for bitsets in near_value_bitsets
+                                                       for _, bitset in sorted(bitsets.items())], number_fillings)
+    arrays.update(table_store.encode_bitsets("weight", weight_bitsets, number_fillings))
+    arrays["number_fillings"] = table_store.values_array([number_fillings])
+    return arrays
+
+
+def decode_filling_bitsets(arrays, k, graph):
+
+    values = list(range(-1, k + 2))
+    bitsets = table_store.decode_bitsets(arrays, "near_value")
+    near_value_bitsets = [dict(zip(values, bitsets[i * len(values):(i + 1) * len(values)])) for i in range(graph[0])]
+    return (1 << arrays["number_fillings"][0]) - 1, near_value_bitsets, table_store.decode_bitsets(arrays, "weight")
+
+
 class Block:
 
-    def __init__(self, k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges):
+    def __init__(self, k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges,
+                 previous=None):
 
         """
         Remark: We use 0-based indices for the vertices.
@@ -29,6 +167,9 @@ class Block:
                                             of boundary vertex indices
         :param block_boundary_edges:        Edges between a block vertex and a boundary vertex, given as a list of
                                             tuples of a block vertex in dex and a boundary vertex index.
+        :param previous:                    The same block for k - 1, or None. If given, the numbers and weights of
+                                            the admissible fillings are taken from previous where possible, see
+                                            get_count_and_weight_table().
         """
 
         self.k = k
@@ -38,9 +179,34 @@ class Block:
         self.boundary_edges = boundary_edges
         self.block_boundary_edges = block_boundary_edges
 
-        self.fillings = self.compute_all_k_heights(self.k, self.number_vertices, self.edges)
-        self.boundary_constraints = self.compute_all_k_heights(self.k, self.number_boundary_vertices,
-                                                                      self.boundary_edges)
+        self.prepare_fillings()
+
+        self.count_and_weight_table = None
+        self.previous_count_and_weight_table = previous.get_count_and_weight_table() if previous is not None else None
+
+    def prepare_fillings(self):
+
+        """
+        Enumerates the fillings of the block and the boundary constraints, and computes the bitsets of the fillings
+        that are used by compute_count_and_weight(). Called by __init__() after the block has been set up; a backend
+        that does not enumerate the fillings overrides this method, see elimination_block.py .
+        """
+
+        graph = canonical_graph(self.number_vertices, self.edges)
+        self.fillings = get_all_k_heights(self.k, graph)
+        self.boundary_constraints = get_all_k_heights(self.k, canonical_graph(self.number_boundary_vertices,
+                                                                              self.boundary_edges))
+
+        self.all_fillings_bitset, self.near_value_bitsets, self.weight_bitsets = get_filling_bitsets(self.k, graph)
+
+    @property
+    def number_fillings(self):
+
+        """
+        :return:    Number of internally valid fillings of the block
+        """
+
+        return len(self.fillings)
 
     @staticmethod
     def compute_all_k_heights(k, n, edges):
@@ -50,21 +216,189 @@ class Block:
         :param k:       The parameter k of the k-heights
         :param n:       Number of vertices which are indexed as 0, ..., n-1
         :param edges:   List of tuples of vertices that form an edge
-        :return:        List of n-tuples which represent all valid k-heights
+        :return:        List of n-tuples which represent all valid k-heights, in lexicographic order
+        """
+
+        return sorted(Block.iterate_all_k_heights(k, n, edges))
+
+    @staticmethod
+    def iterate_all_k_heights(k, n, edges):
+
+        """
+        Generates all k-heights of the graph with vertices 0, ..., n-1 and edges as given in the edges parameter by a
+        depth-first search. The vertices are assigned one after the other, always choosing next a vertex with the
+        largest number of already assigned neighbors, and the values of a vertex are restricted to [h - 1, h + 1] for
+        every already assigned neighbor with value h. A branch of the search is cut as soon as the range of the next
+        vertex becomes empty, so that far fewer than (k+1)^n partial assignments are visited. In graphs with cycles, a
+        branch may still be cut only after several vertices have been assigned, so that the search can visit partial
+        assignments that do not lead to any k-height.
+        :param k:       The parameter k of the k-heights
+        :param n:       Number of vertices which are indexed as 0, ..., n-1
+        :param edges:   List of tuples of vertices that form an edge
+        :return:        Generator of n-tuples which represent all valid k-heights. The order is lexicographic with
+                        respect to the assignment order of the vertices.
+        """
+
+        if n == 0:
+            yield ()
+            return
+
+        if not edges:
+            # Every tuple is a valid k-height.
+            yield from itertools.product(range(k + 1), repeat=n)
+            return
+
+        neighbors = [set() for _ in range(n)]
+        for edge in edges:
+            neighbors[edge[0]].add(edge[1])
+            neighbors[edge[1]].add(edge[0])
+
+        # Maximum cardinality search: repeatedly pick the vertex with the most assigned neighbors (ties are broken by
+        # the smaller index), so that the values of most vertices are narrowed down as early as possible.
+
+        order = []
+        number_assigned_neighbors = [0] * n
+        is_assigned = [False] * n
+        for _ in range(n):
+            vertex = max((v for v in range(n) if not is_assigned[v]), key=lambda v: (number_assigned_neighbors[v], -v))
+            order.append(vertex)
+            is_assigned[vertex] = True
+            for neighbor in neighbors[vertex]:
+                number_assigned_neighbors[neighbor] += 1
+
+        position = {vertex: i for i, vertex in enumerate(order)}
+        assigned_neighbors = [[neighbor for neighbor in neighbors[vertex] if position[neighbor] < i]
+                              for i, vertex in enumerate(order)]
+
+        k_height = [0] * n
+        current_values = [0] * n
+        highest_values = [0] * n
+
+        def narrow(i):
+            # Sets the range of possible values of the i-th vertex in the assignment order.
+            lowest = 0
+            highest = k
+            for neighbor in assigned_neighbors[i]:
+                h = k_height[neighbor]
+                if h - 1 > lowest:
+                    lowest = h - 1
+                if h + 1 < highest:
+                    highest = h + 1
+            current_values[i] = lowest
+            highest_values[i] = highest
+
+        last = n - 1
+        i = 0
+        narrow(0)
+
+        while i >= 0:
+
+            if current_values[i] > highest_values[i]:
+                # All values of the i-th vertex have been tried, go back to the previous one.
+                i -= 1
+                if i >= 0:
+                    current_values[i] += 1
+                continue
+
+            k_height[order[i]] = current_values[i]
+
+            if i == last:
+                for h in range(current_values[i], highest_values[i] + 1):
+                    k_height[order[i]] = h
+                    yield tuple(k_height)
+                current_values[i] = highest_values[i] + 1
+                continue
+
+            i += 1
+            narrow(i)
+
+    def compute_count_and_weight(self, boundary_constraint):
+
+        """
+        Counts the admissible fillings with respect to the boundary_constraint and sums up their weights.
+        :param boundary_constraint:     Boundary constraint given as a tuple of integers.
+        :return:                        Tuple of integers (number of admissible fillings, total weight).
+        """
+
+        admissible_fillings = self.all_fillings_bitset
+        for block_boundary_edge in self.block_boundary_edges:
+            admissible_fillings &= self.near_value_bitsets[block_boundary_edge[0]].get(
+                boundary_constraint[block_boundary_edge[1]], 0)
+            if not admissible_fillings:
+                return 0, 0
+
+        number_admissible_fillings = popcount(admissible_fillings)
+        total_weight_sum = 0
+        for j, weight_bitset in enumerate(self.weight_bitsets):
+            total_weight_sum += popcount(admissible_fillings & weight_bitset) << j
+
+        return number_admissible_fillings, total_weight_sum
+
+    def get_count_and_weight_table(self):
+
+        """
+        Computes number and total weight of the admissible fillings for every boundary constraint of the block, each
+        exactly once. The table is kept, so that the cover relations of all augmentation vertices are evaluated by
+        lookups.
+
+        If the table of the block for k - 1 is given (see the parameter previous of the constructor), the entries that
+        do not depend on the new value k are taken from it. Let D be the boundary depth, see compute_boundary_depth().
+        The values of every admissible filling are at most D larger and at most D smaller than the boundary values.
+        Hence, a boundary constraint whose values are at most k - 1 - D has the same admissible fillings as for k - 1,
+        and one whose values are at least D + 1 has the admissible fillings of the boundary constraint minus 1, plus 1,
+        which adds number_vertices to their weights. Only the remaining boundary constraints are computed.
+        :return:    Dictionary which maps every boundary constraint to the tuple of integers (number of admissible
+                    fillings, total weight).
         """
 
-        result = []
+        if self.count_and_weight_table is None:
+            timer = instrumentation.Timer(type(self).__name__ + ".compute_count_and_weight")
+            compute_count_and_weight = timer.wrap(self.compute_count_and_weight)
+            reused_entries = self.reused_count_and_weight_entries()
+            with instrumentation.profiled("generic_block_table"):
+                self.count_and_weight_table = {
+                    boundary_constraint: reused_entries.get(boundary_constraint)
+                    or compute_count_and_weight(boundary_constraint)
+                    for boundary_constraint in self.boundary_constraints}
+            timer.write(k=self.k, number_vertices=self.number_vertices,
+                        number_boundary_vertices=self.number_boundary_vertices, number_reused=len(reused_entries))
+            # The table of k - 1 is not needed anymore.
+            self.previous_count_and_weight_table = None
+        return self.count_and_weight_table
+
+    def reused_count_and_weight_entries(self):
 
-        for k_height in itertools.product(range(k + 1), repeat=n):
-            is_valid_k_height = True
-            for edge in edges:
-                if abs(k_height[edge[0]] - k_height[edge[1]]) > 1:
-                    is_valid_k_height = False
-                    break
-            if is_valid_k_height:
-                result.append(k_height)
+        """
+        :return:    Dictionary which maps the boundary constraints whose entries are taken from the table of the block
+                    for k - 1 to these entries, see get_count_and_weight_table(). Empty if there is no such table.
+        """
 
-        return result
+        previous_table = self.previous_count_and_weight_table
+        depth = compute_boundary_depth(self.number_vertices, self.edges, self.block_boundary_edges)
+        if previous_table is None or depth is None:
+            return dict()
+
+        # The boundary constraints of k - 1 are fewer than those of k, so they are the ones that are checked.
+        reused_entries = dict()
+        for boundary_constraint, (number, weight) in previous_table.items():
+            if not boundary_constraint:
+                continue
+            if max(boundary_constraint) + depth < self.k:
+                reused_entries[boundary_constraint] = (number, weight)
+            if min(boundary_constraint) >= depth:
+                reused_entries[tuple(value + 1 for value in boundary_constraint)] = \
+                    (number, weight + self.number_vertices * number)
+        return reused_entries
+
+    @property
+    def extensible_boundary_constraints(self):
+
+        """
+        :return:    List of the boundary constraints that have at least one admissible filling
+        """
+
+        return [boundary_constraint for boundary_constraint, (count, _) in self.get_count_and_weight_table().items()
+                if count > 0]
 
     def compute_expected_weight(self, boundary_constraint):
 
@@ -77,18 +411,7 @@ class Block:
         :return:                        Float. Expected weight.
         """
 
-        total_weight_sum = 0
-        number_admissible_fillings = 0
-
-        for filling in self.fillings:
-            is_admissible = True
-            for block_boundary_edge in self.block_boundary_edges:
-                if abs(filling[block_boundary_edge[0]] - boundary_constraint[block_boundary_edge[1]]) > 1:
-                    is_admissible = False
-                    break
-            if is_admissible:
-                total_weight_sum += sum(filling)
-                number_admissible_fillings += 1
+        number_admissible_fillings, total_weight_sum = self.compute_count_and_weight(boundary_constraint)
 
         if number_admissible_fillings == 0:
             # no admissible filling exists with respect to boundary_constraint
@@ -98,53 +421,114 @@ class Block:
 
     # computes the expected weight difference when doing an augmentation at boundary vertex augmentation_vertex
 
-    def block_divergence(self, augmentation_vertex):
+    def block_divergence(self, augmentation_vertex, is_exact=False):
 
         """
         Computes the expected weight difference all cover relations maximized over all cover relations that differ
         exactly on augmentation_vertex.
         :param augmentation_vertex:     Index of the vertex that is augmented by one.
-        :return:                        Float. Expected weight difference.
+        :param is_exact:                Whether the expected weight differences are compared exactly by integer
+                                        cross-multiplication, see exact.py .
+        :return:                        Float, or fractions.Fraction if is_exact. Expected weight difference.
+        """
+
+        return self.block_divergences([augmentation_vertex], is_exact)[0]
+
+    def block_divergences(self, augmentation_vertices, is_exact=False):
+
+        """
+        Computes the block divergence for several augmentation vertices in one pass over the boundary constraints, such
+        that the number and weight of the admissible fillings are looked up once per boundary constraint and shared by
+        all augmentation vertices.
+        :param augmentation_vertices:   List of indices of the vertices that are augmented by one.
+        :param is_exact:                Whether the expected weight differences are compared exactly by integer
+                                        cross-multiplication, see exact.py .
+        :return:                        List of the block divergences of the augmentation vertices, see
+                                        block_divergence()
         """
 
         adjacent_boundary_vertices = []
-        for boundary_edge in self.boundary_edges:
-            if boundary_edge[0] == augmentation_vertex:
-                adjacent_boundary_vertices.append(boundary_edge[1])
-            if boundary_edge[1] == augmentation_vertex:
-                adjacent_boundary_vertices.append(boundary_edge[0])
+        for augmentation_vertex in augmentation_vertices:
+            adjacent_boundary_vertices.append([])
+            for boundary_edge in self.boundary_edges:
+                if boundary_edge[0] == augmentation_vertex:
+                    adjacent_boundary_vertices[-1].append(boundary_edge[1])
+                if boundary_edge[1] == augmentation_vertex:
+                    adjacent_boundary_vertices[-1].append(boundary_edge[0])
+
+        max_expected_differences = [0] * len(augmentation_vertices)
+        witnesses = [None] * len(augmentation_vertices)
+        exact_maxima = [exact.ExactMaximum() for _ in augmentation_vertices]
+        count_and_weight_table = self.get_count_and_weight_table()
+
+        progress = instrumentation.Progress("generic_block block_divergence", total=len(self.boundary_constraints),
+                                            unit="boundary constraints", k=self.k,
+                                            number_vertices=self.number_vertices,
+                                            number_boundary_vertices=self.number_boundary_vertices,
+                                            augmentation_vertices=augmentation_vertices)
+
+        def best():
+            # The maximum over all augmentation vertices so far, together with its witness
+            if is_exact:
+                exact_maximum = max(exact_maxima, key=lambda maximum: maximum.value())
+                return exact_maximum.value(), exact_maximum.witness
+            i = max(range(len(augmentation_vertices)), key=lambda i: max_expected_differences[i])
+            return max_expected_differences[i], witnesses[i]
+
+        for r, boundary_constraint in enumerate(self.boundary_constraints):
+
+            if progress.is_due():
+                progress.update(r, *best())
+
+            number_without_augmentation, weight_without_augmentation = count_and_weight_table[boundary_constraint]
+            if number_without_augmentation == 0:
+                # no admissible filling exists with respect to the boundary constraint
+                continue
+
+            for i, augmentation_vertex in enumerate(augmentation_vertices):
+
+                can_be_augmented = True
+
+                if boundary_constraint[augmentation_vertex] == self.k:
+                    can_be_augmented = False
 
-        max_expected_difference = 0
+                for boundary_neighbor in adjacent_boundary_vertices[i]:
+                    if (boundary_constraint[augmentation_vertex] - boundary_constraint[boundary_neighbor]) == 1:
+                        can_be_augmented = False
 
-        for boundary_constraint in self.boundary_constraints:
+                if can_be_augmented:
 
-            can_be_augmented = True
+                    augmented_boundary_constraint = list(boundary_constraint)
+                    augmented_boundary_constraint[augmentation_vertex] += 1
+                    augmented_boundary_constraint = tuple(augmented_boundary_constraint)
 
-            if boundary_constraint[augmentation_vertex] == self.k:
-                can_be_augmented = False
+                    number_with_augmentation, weight_with_augmentation = \
+                        count_and_weight_table[augmented_boundary_constraint]
 
-            for boundary_neighbor in adjacent_boundary_vertices:
-                if (boundary_constraint[augmentation_vertex] - boundary_constraint[boundary_neighbor]) == 1:
-                    can_be_augmented = False
+                    if number_with_augmentation == 0:
+                        # no admissible filling exists with respect to the augmented boundary constraint
+                        continue
 
-            if can_be_augmented:
+                    if is_exact:
+                        exact_maxima[i].update(number_without_augmentation, weight_without_augmentation,
+                                               number_with_augmentation, weight_with_augmentation, boundary_constraint)
+                        continue
 
-                augmented_boundary_constraint = list(boundary_constraint)
-                augmented_boundary_constraint[augmentation_vertex] += 1
-                augmented_boundary_constraint = tuple(augmented_boundary_constraint)
+                    expected_weight_without_augmentation = weight_without_augmentation / number_without_augmentation
+                    expected_weight_with_augmentation = weight_with_augmentation / number_with_augmentation
 
-                try:
-                    expected_weight_without_augmentation = self.compute_expected_weight(boundary_constraint)
-                    expected_weight_with_augmentation = self.compute_expected_weight(augmented_boundary_constraint)
+                    expected_weight_difference = \
+                        expected_weight_with_augmentation - expected_weight_without_augmentation
+                    if expected_weight_difference > max_expected_differences[i]:
+                        max_expected_differences[i] = expected_weight_difference
+                        witnesses[i] = boundary_constraint
 
-                    expected_weight_difference = expected_weight_with_augmentation - expected_weight_without_augmentation
-                    if expected_weight_difference > max_expected_difference:
-                        max_expected_difference = expected_weight_difference
+        if is_exact:
+            max_expected_differences = [exact_maximum.value() for exact_maximum in exact_maxima]
 
-                except NoAdmissibleFilling:
-                    pass
+        progress.update(len(self.boundary_constraints), *best(), is_final=True)
 
-        if max_expected_difference == 0:
+        if any(max_expected_difference == 0 for max_expected_difference in max_expected_differences):
             raise Exception("Augmentation does not result in an increase of expected weight.")
 
-        return max_expected_difference
\ No newline at end of file
+        return max_expected_differences
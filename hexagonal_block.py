@@ -0,0 +1,519 @@
+# This code computes the block divergence of blocks that consist of several hexagons in toroidal hexagonal grids; see
+# hexagonal_grid.py for the case of a single hexagon. The torus is assumed to be large enough that the block and its
+# boundary do not wrap around.
+#
+# The hexagonal grid is drawn as brick wall, as in markov_chain.py: vertex (i, j) is adjacent to (i, j - 1) and
+# (i, j + 1), and to (i + 1, j) if i + j is even, otherwise to (i - 1, j). The hexagon with top left vertex (i, j),
+# where i + j is even, consists of the vertices (i, j), (i, j + 1), (i, j + 2) and (i + 1, j), (i + 1, j + 1),
+# (i + 1, j + 2). Hence, every row of a block of hexagons is a union of paths, and the rows are joined by the vertical
+# edges. The boundary of the block consists of all vertices outside the block that are adjacent to a block vertex; a
+# boundary vertex may have several block neighbors, e.g. the vertex between two paths of a row. As in generic_block.py,
+# two boundary vertices have to differ by at most one if they are adjacent, and there are no further conditions between
+# boundary vertices.
+#
+# Number and weight of the admissible fillings are computed by a row-by-row dynamic program instead of enumerating the
+# fillings: the candidates for every row are its k-heights, i.e. k-strips if the row is a path (see transfer_matrix.py),
+# and a candidate may follow a candidate of the previous row iff their values differ by at most one on every vertical
+# edge between the rows. For the augmented
+# boundary vertex d, the dynamic program is run from the first row and from the last row towards a row that contains a
+# block neighbor of d. The resulting messages only depend on the boundary values on the other rows, so that they are
+# computed once for all boundary constraints that agree there, in particular for both sides of a cover relation.
+#
+# The block divergence is computed for every boundary vertex that is distinct under the automorphisms of the block
+# together with its boundary, and only for one cover relation of every orbit under the automorphisms that fix the
+# augmented boundary vertex and the value flip h -> k - h; see symmetry.py .
+
+
+import argparse
+import itertools
+import sys
+from fractions import Fraction
+
+import exact
+import generic_block
+import instrumentation
+import symmetry
+
+
+# Blocks that can be chosen by name; the hexagons are given by their top left vertices.
+PATCHES = {
+    "1": [(0, 0)],
+    "2": [(0, 0), (0, 2)],
+    "2-diagonal": [(0, 0), (1, 1)],
+    "3": [(0, 0), (0, 2), (1, 1)],
+    "3-line": [(0, 0), (0, 2), (0, 4)],
+    "7": [(0, 0), (0, 2), (0, 4), (-1, 1), (-1, 3), (1, 1), (1, 3)],
+}
+
+
+def grid_neighbors(vertex):
+
+    """
+    :return:    List of the three neighbors of the vertex (i, j) in the brick wall, see the comment at the beginning
+    """
+
+    i, j = vertex
+    return [(i, j - 1), (i, j + 1), (i + 1, j) if (i + j) % 2 == 0 else (i - 1, j)]
+
+
+def hexagon_vertices(hexagon):
+
+    i, j = hexagon
+    if (i + j) % 2:
+        raise ValueError("The top left vertex " + str(hexagon) + " of a hexagon needs an even sum of coordinates.")
+    return [(i, j), (i, j + 1), (i, j + 2), (i + 1, j), (i + 1, j + 1), (i + 1, j + 2)]
+
+
+def compute_automorphisms(vertices, neighbors, is_block):
+
+    """
+    Computes all permutations of the vertices that map edges to edges and block vertices to block vertices. The graph
+    has to be connected.
+    :param vertices:    List of vertices
+    :param neighbors:   Dictionary which maps every vertex to the list of its neighbors among vertices
+    :param is_block:    Function that tells whether a vertex is a block vertex
+    :return:            List of dictionaries which map every vertex to its image
+    """
+
+    # The vertices are mapped in the order of a breadth first search, so that the image of every vertex but the first
+    # one is a neighbor of the image of an earlier vertex.
+
+    order = [vertices[0]]
+    parent = {vertices[0]: None}
+    for vertex in order:
+        for neighbor in neighbors[vertex]:
+            if neighbor not in parent:
+                parent[neighbor] = vertex
+                order.append(neighbor)
+
+    def kind(vertex):
+        return is_block(vertex), len(neighbors[vertex])
+
+    automorphisms = []
+    image = dict()
+    used = set()
+
+    def extend(i):
+        if i == len(order):
+            automorphisms.append(dict(image))
+            return
+        vertex = order[i]
+        candidates = vertices if parent[vertex] is None else neighbors[image[parent[vertex]]]
+        for candidate in candidates:
+            if candidate in used or kind(candidate) != kind(vertex):
+                continue
+            if any(neighbor in image and image[neighbor] not in neighbors[candidate] for neighbor in neighbors[vertex]):
+                continue
+            image[vertex] = candidate
+            used.add(candidate)
+            extend(i + 1)
+            del image[vertex]
+            used.remove(candidate)
+
+    extend(0)
+    return automorphisms
+
+
+class HexagonalBlock:
+
+    def __init__(self, k, hexagons):
+
+        """
+        :param k:           The k of the k-heights
+        :param hexagons:    List of the top left vertices (i, j) of the hexagons of the block, see the comment at the
+                            beginning. The block together with its boundary has to be connected.
+        """
+
+        self.k = k
+        self.hexagons = sorted(set(hexagons))
+
+        block_vertices = set()
+        for hexagon in self.hexagons:
+            block_vertices.update(hexagon_vertices(hexagon))
+
+        # The block vertices are indexed row by row, from the left to the right. Every row is given as tuple
+        # (i, columns) of its index and the tuple of its columns.
+
+        self.vertices = sorted(block_vertices)
+        self.number_vertices = len(self.vertices)
+        self.rows = [(i, tuple(j for row_index, j in self.vertices if row_index == i))
+                     for i in sorted(set(i for i, _ in self.vertices))]
+
+        self.boundary_vertices = sorted(set(neighbor for vertex in self.vertices for neighbor in grid_neighbors(vertex)
+                                            if neighbor not in block_vertices))
+        self.number_boundary_vertices = len(self.boundary_vertices)
+        boundary_index = {vertex: b for b, vertex in enumerate(self.boundary_vertices)}
+
+        self.boundary_edges = sorted(set((min(b, boundary_index[neighbor]), max(b, boundary_index[neighbor]))
+                                         for b, vertex in enumerate(self.boundary_vertices)
+                                         for neighbor in grid_neighbors(vertex) if neighbor in boundary_index))
+
+        # attachments[r] contains the pairs (position in row r, boundary vertex index) of the edges between row r and
+        # the boundary, and boundary_rows[b] the set of rows that contain a block neighbor of boundary vertex b.
+
+        self.attachments = [[] for _ in self.rows]
+        self.boundary_rows = [set() for _ in self.boundary_vertices]
+        for r, (i, columns) in enumerate(self.rows):
+            for position, j in enumerate(columns):
+                for neighbor in grid_neighbors((i, j)):
+                    if neighbor in boundary_index:
+                        self.attachments[r].append((position, boundary_index[neighbor]))
+                        self.boundary_rows[boundary_index[neighbor]].add(r)
+
+        # The graph of the block together with its boundary, for the symmetries.
+
+        self.neighbors = {vertex: [neighbor for neighbor in grid_neighbors(vertex)
+                                   if neighbor in block_vertices or neighbor in boundary_index]
+                          for vertex in self.vertices + self.boundary_vertices}
+        automorphisms = compute_automorphisms(self.vertices + self.boundary_vertices, self.neighbors,
+                                              lambda vertex: vertex in block_vertices)
+        if len(set(vertex for automorphism in automorphisms for vertex in automorphism)) \
+                < len(self.vertices) + self.number_boundary_vertices:
+            raise ValueError("The block together with its boundary has to be connected.")
+
+        # Every automorphism as permutation p of the boundary vertex indices such that the boundary constraint c is
+        # mapped to (c[p[0]], c[p[1]], ...), see symmetry.cover_relation_orbit(). The automorphisms form a group, so it
+        # does not matter that p is the inverse of the automorphism.
+
+        self.boundary_permutations = sorted(set(tuple(boundary_index[automorphism[vertex]]
+                                                      for vertex in self.boundary_vertices)
+                                                for automorphism in automorphisms))
+
+        self.compute_rows()
+
+    def compute_rows(self):
+
+        # candidates[r] are the k-heights of row r, and column_masks[r][position][value] is the bitmask of the
+        # candidates whose entry at the position differs by at most one from value, as in transfer_matrix.py .
+
+        self.candidates = []
+        self.candidate_weights = []
+        self.column_masks = []
+        for i, columns in self.rows:
+            row_edges = [(position, position + 1) for position in range(len(columns) - 1)
+                         if columns[position + 1] == columns[position] + 1]
+            candidates = generic_block.get_all_k_heights(self.k, generic_block.canonical_graph(len(columns), row_edges))
+            self.candidates.append(candidates)
+            self.candidate_weights.append([sum(candidate) for candidate in candidates])
+            masks = []
+            for position in range(len(columns)):
+                masks.append({value: sum(1 << s for s, candidate in enumerate(candidates)
+                                         if abs(candidate[position] - value) <= 1) for value in range(self.k + 1)})
+            self.column_masks.append(masks)
+
+        # predecessors[r][s] contains the indices of the candidates of row r - 1 that may precede candidate s of row r,
+        # and successors[r][s] the indices of the candidates of row r + 1 that may follow it.
+
+        self.predecessors = [None] * len(self.rows)
+        self.successors = [None] * len(self.rows)
+        for r in range(len(self.rows) - 1):
+            (i, columns), (next_i, next_columns) = self.rows[r], self.rows[r + 1]
+            vertical_edges = [(position, next_columns.index(j)) for position, j in enumerate(columns)
+                              if next_i == i + 1 and (i + j) % 2 == 0 and j in next_columns]
+
+            candidates_by_values = dict()
+            for s, candidate in enumerate(self.candidates[r]):
+                values = tuple(candidate[position] for position, _ in vertical_edges)
+                candidates_by_values.setdefault(values, []).append(s)
+
+            self.predecessors[r + 1] = []
+            self.successors[r] = [[] for _ in self.candidates[r]]
+            for t, candidate in enumerate(self.candidates[r + 1]):
+                predecessors = []
+                for values in itertools.product(*[(candidate[position] - 1, candidate[position],
+                                                   candidate[position] + 1) for _, position in vertical_edges]):
+                    predecessors += candidates_by_values.get(values, [])
+                self.predecessors[r + 1].append(tuple(sorted(predecessors)))
+                for s in predecessors:
+                    self.successors[r][s].append(t)
+            self.successors[r] = [tuple(successors) for successors in self.successors[r]]
+
+        self._members = [dict() for _ in self.rows]
+
+    def row_mask(self, r, boundary_constraint):
+
+        """
+        :return:    Bitmask of the candidates of row r that are compatible with the boundary constraint
+        """
+
+        mask = (1 << len(self.candidates[r])) - 1
+        for position, b in self.attachments[r]:
+            mask &= self.column_masks[r][position][boundary_constraint[b]]
+        return mask
+
+    def members(self, r, mask):
+
+        if mask not in self._members[r]:
+            self._members[r][mask] = tuple(s for s in range(len(self.candidates[r])) if (mask >> s) & 1)
+        return self._members[r][mask]
+
+    def step(self, r, counts, weights, mask, predecessors):
+
+        """
+        Performs one step of the dynamic program into row r, see TransferMatrix.step() . predecessors[s] contains the
+        indices of the candidates of the previous row in the direction of the dynamic program that are compatible with
+        candidate s of row r.
+        """
+
+        new_counts = [0] * len(self.candidates[r])
+        new_weights = [0] * len(self.candidates[r])
+
+        for s in self.members(r, mask):
+            count = 0
+            weight = 0
+            for t in predecessors[s]:
+                count += counts[t]
+                weight += weights[t]
+            if count:
+                new_counts[s] = count
+                new_weights[s] = weight + count * self.candidate_weights[r][s]
+
+        return new_counts, new_weights
+
+    def messages(self, meeting_row, boundary_constraint):
+
+        """
+        Runs the dynamic program from the first row and from the last row towards the meeting row. The boundary values
+        of boundary vertices that are only adjacent to the meeting row are not taken into account.
+        :return:    Tuple (counts_before, weights_before, counts_after, weights_after) of lists indexed by the
+                    candidates of the meeting row: number and total weight of the admissible partial fillings of the
+                    rows up to the meeting row and of the rows behind it that are compatible with the candidate. The
+                    weight of the candidate itself is contained in weights_before.
+        """
+
+        all_candidates = (1 << len(self.candidates[meeting_row])) - 1
+
+        counts = [1] * len(self.candidates[0])
+        weights = list(self.candidate_weights[0])
+        if meeting_row > 0:
+            mask = self.row_mask(0, boundary_constraint)
+            counts = [1 if (mask >> s) & 1 else 0 for s in range(len(self.candidates[0]))]
+            weights = [weights[s] * counts[s] for s in range(len(self.candidates[0]))]
+        for r in range(1, meeting_row + 1):
+            mask = all_candidates if r == meeting_row else self.row_mask(r, boundary_constraint)
+            counts, weights = self.step(r, counts, weights, mask, self.predecessors[r])
+        counts_before, weights_before = counts, weights
+
+        counts_after = [1] * len(self.candidates[meeting_row])
+        weights_after = [0] * len(self.candidates[meeting_row])
+        last = len(self.rows) - 1
+        if meeting_row < last:
+            mask = self.row_mask(last, boundary_constraint)
+            counts = [1 if (mask >> s) & 1 else 0 for s in range(len(self.candidates[last]))]
+            weights = [self.candidate_weights[last][s] * counts[s] for s in range(len(self.candidates[last]))]
+            for r in range(last - 1, meeting_row, -1):
+                counts, weights = self.step(r, counts, weights, self.row_mask(r, boundary_constraint),
+                                            self.successors[r])
+            # The last step sums over the successors without adding the weight of the candidate of the meeting row.
+            successors = self.successors[meeting_row]
+            counts_after = [sum(counts[t] for t in successors[s]) for s in range(len(counts_before))]
+            weights_after = [sum(weights[t] for t in successors[s]) for s in range(len(counts_before))]
+
+        return counts_before, weights_before, counts_after, weights_after
+
+    def contract(self, meeting_row, messages, boundary_constraint):
+
+        """
+        Completes the messages by the boundary values on the meeting row.
+        :return:    Tuple of integers (number of admissible fillings, total weight of admissible fillings)
+        """
+
+        counts_before, weights_before, counts_after, weights_after = messages
+
+        count = 0
+        weight = 0
+        for s in self.members(meeting_row, self.row_mask(meeting_row, boundary_constraint)):
+            count += counts_before[s] * counts_after[s]
+            weight += weights_before[s] * counts_after[s] + counts_before[s] * weights_after[s]
+
+        return count, weight
+
+    def count_and_weight(self, boundary_constraint):
+
+        """
+        Counts the fillings of the block that are admissible with respect to the boundary constraint and sums up their
+        weights.
+        :param boundary_constraint:     Tuple of the values of the boundary vertices, in the order of boundary_vertices
+        :return:                        Tuple of integers (number of admissible fillings, total weight of admissible
+                                        fillings)
+        """
+
+        return self.contract(0, self.messages(0, boundary_constraint), boundary_constraint)
+
+    def boundary_positions(self):
+
+        """
+        :return:    List of the indices of the boundary vertices that are distinct under the automorphisms, namely the
+                    smallest index of every orbit
+        """
+
+        return sorted(set(min(permutation[b] for permutation in self.boundary_permutations)
+                          for b in range(self.number_boundary_vertices)))
+
+    def block_divergence(self, augmentation_vertex, is_exact=False):
+
+        """
+        Computes the maximum expected weight difference over all cover relations that differ on the given boundary
+        vertex.
+        :param augmentation_vertex:     Index of the augmented boundary vertex
+        :param is_exact:                Whether the expected weight differences are compared exactly, see exact.py
+        :return:                        Tuple (maximum expected weight difference, witness). The witness is the lower
+                                        boundary constraint of a maximizing cover relation. The maximum is a
+                                        fractions.Fraction in exact mode and a float otherwise.
+        """
+
+        k = self.k
+        d = augmentation_vertex
+        boundary_neighbors = [b for edge in self.boundary_edges for b in edge if d in edge and b != d]
+
+        # The messages are shared by the boundary constraints that agree on all boundary vertices that are adjacent to
+        # another row than the meeting row.
+
+        meeting_row = min(self.boundary_rows[d])
+        outer_vertices = [b for b in range(self.number_boundary_vertices) if self.boundary_rows[b] != {meeting_row}]
+
+        def outer_values(boundary_constraint):
+            return tuple(boundary_constraint[b] for b in outer_vertices)
+
+        permutations = [permutation for permutation in self.boundary_permutations if permutation[d] == d]
+        lower_boundary_constraints = (boundary_constraint for boundary_constraint in
+                                      generic_block.Block.iterate_all_k_heights(k, self.number_boundary_vertices,
+                                                                                self.boundary_edges)
+                                      if boundary_constraint[d] < k
+                                      and all(boundary_constraint[d] + 1 - boundary_constraint[b] <= 1
+                                              for b in boundary_neighbors))
+        cover_relations = sorted((lower_boundary_constraint for lower_boundary_constraint, _ in
+                                  symmetry.canonical_cover_relations(lower_boundary_constraints, d, k, permutations)),
+                                 key=outer_values)
+
+        progress = instrumentation.Progress("hexagonal_block block_divergence", total=len(cover_relations),
+                                            unit="cover relations", k=k, hexagons=self.hexagons,
+                                            augmentation_vertex=self.boundary_vertices[d])
+
+        max_block_divergence = 0
+        witness = None
+        exact_maximum = exact.ExactMaximum()
+        r = 0
+
+        for _, group in itertools.groupby(cover_relations, key=outer_values):
+
+            messages = None
+
+            for boundary_constraint in group:
+
+                if progress.is_due():
+                    progress.update(r, max_block_divergence, witness)
+                r += 1
+
+                augmented_boundary_constraint = boundary_constraint[:d] + (boundary_constraint[d] + 1,) \
+                    + boundary_constraint[d + 1:]
+
+                if messages is None:
+                    messages = self.messages(meeting_row, boundary_constraint)
+                number_without_augmentation, weight_without_augmentation = self.contract(meeting_row, messages,
+                                                                                         boundary_constraint)
+                if number_without_augmentation == 0:
+                    continue
+                augmented_messages = messages
+                if d in outer_vertices:
+                    augmented_messages = self.messages(meeting_row, augmented_boundary_constraint)
+                number_with_augmentation, weight_with_augmentation = self.contract(meeting_row, augmented_messages,
+                                                                                   augmented_boundary_constraint)
+                if number_with_augmentation == 0:
+                    continue
+
+                if is_exact:
+                    if exact_maximum.update(number_without_augmentation, weight_without_augmentation,
+                                            number_with_augmentation, weight_with_augmentation):
+                        max_block_divergence = exact_maximum.numerator / exact_maximum.denominator
+                        witness = boundary_constraint
+                    continue
+
+                # As in rectangular_block.py, the flipped cover relation is evaluated from the number and weight of the
+                # admissible fillings as well, such that the floating point result is exactly the one that we would
+                # obtain when computing it separately.
+
+                flipped_number_without_augmentation, flipped_weight_without_augmentation = \
+                    symmetry.flip_count_and_weight(number_with_augmentation, weight_with_augmentation, k,
+                                                   self.number_vertices)
+                flipped_number_with_augmentation, flipped_weight_with_augmentation = \
+                    symmetry.flip_count_and_weight(number_without_augmentation, weight_without_augmentation, k,
+                                                   self.number_vertices)
+
+                expected_weight_differences = [
+                    weight_with_augmentation / number_with_augmentation
+                    - weight_without_augmentation / number_without_augmentation,
+                    flipped_weight_with_augmentation / flipped_number_with_augmentation
+                    - flipped_weight_without_augmentation / flipped_number_without_augmentation,
+                ]
+
+                for is_flipped, expected_weight_difference in enumerate(expected_weight_differences):
+                    if expected_weight_difference > max_block_divergence:
+                        max_block_divergence = expected_weight_difference
+                        if is_flipped:
+                            witness = symmetry.flipped_cover_relation(boundary_constraint, d, k)
+                        else:
+                            witness = boundary_constraint
+
+        progress.update(r, max_block_divergence, witness, is_final=True)
+
+        if is_exact:
+            return exact_maximum.value(), witness
+
+        return max_block_divergence, witness
+
+
+def format_result(result):
+
+    if isinstance(result, Fraction):
+        return str(result) + " = " + str(float(result))
+    return str(result)
+
+
+def parse_hexagon(text):
+
+    i, j = text.split(",")
+    return int(i), int(j)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Computes the block divergence of blocks of several hexagons in "
+                                                 "toroidal hexagonal grid graphs for every boundary position that is "
+                                                 "distinct under symmetry.")
+    parser.add_argument("--patch", choices=sorted(PATCHES), default="2",
+                        help="block of hexagons, see PATCHES in hexagonal_block.py (default: 2)")
+    parser.add_argument("--hexagons", type=parse_hexagon, nargs="+", default=None, metavar="I,J",
+                        help="instead of --patch, the top left vertices of the hexagons of the block in brick wall "
+                             "coordinates, see hexagonal_block.py")
+    parser.add_argument("--k", type=int, nargs="+", default=[2], help="values of k (default: 2)")
+    parser.add_argument("--exact", action="store_true",
+                        help="compare expected weight differences exactly and report the results as fractions")
+    instrumentation.add_arguments(parser)
+    arguments = parser.parse_args()
+    instrumentation.configure_from_arguments(arguments)
+
+    print("PYTHON VERSION:\n" + sys.version)
+
+    hexagons = PATCHES[arguments.patch] if arguments.hexagons is None else arguments.hexagons
+
+    for k in arguments.k:
+
+        block = HexagonalBlock(k, hexagons)
+        print("CASE k = " + str(k) + ", BLOCK OF " + str(len(block.hexagons)) + " HEXAGONS " + str(block.hexagons))
+        print("Block vertices: " + str(block.number_vertices) + ", boundary vertices: " + str(block.boundary_vertices))
+
+        max_block_divergence = 0
+
+        for augmentation_vertex in block.boundary_positions():
+            result, witness = block.block_divergence(augmentation_vertex, is_exact=arguments.exact)
+            print("Augmentation at boundary vertex " + str(block.boundary_vertices[augmentation_vertex]) + ": "
+                  + format_result(result) + "; witness: " + str(witness))
+            max_block_divergence = max(max_block_divergence, result)
+
+        print("BLOCK DIVERGENCE IN CASE k = " + str(k) + ": " + format_result(max_block_divergence))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
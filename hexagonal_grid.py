@@ -3,97 +3,230 @@
 # single hexagon, whose assignment will be encoded as a 6-tuple in clockwise (or, by symmetry, counterclockwise)
 # order. Each of these six vertices has exactly one boundary neighbor. In total, these six boundary neighbors can
 # impose (k+1)^6 different boundary restrictions to B, and there are k*(k+1)^5 different cover relations that differ on
-# a fixed boundary vertex d (by symmetry, this boundary vertex can be assumed to be fixed).
-
+# a fixed boundary vertex d (by symmetry, this boundary vertex can be assumed to be fixed). The reflection of the
+# hexagon that fixes d and the value flip h -> k - h reduce the number of cover relations that have to be computed
+# further; see symmetry.py .
+#
+# With the option --vectorized, the table of numbers and weights of admissible fillings is computed by NumPy in chunked
+# array operations, and the expected weight differences are evaluated in slices of arrays, see hexagonal_vectorized.py .
+# If NumPy is not installed, the pure Python computation is used instead.
+#
+# With the option --translation-quotient, large k are handled without enumerating the fillings for k. Adding 1 to a
+# boundary restriction and to all of its admissible fillings keeps them admissible unless a value leaves 0, ..., k,
+# and adds 6 to the weight of every filling. Since the values of a filling of the hexagon differ by at most 3 and every
+# boundary value differs by at most one from a value of the filling, an extensible boundary restriction spans at most 5
+# values. Hence, number and weight of its admissible fillings only depend on its shape, i.e. the restriction translated
+# such that its smallest value is 0, and on whether it touches 0 or k. They are looked up in the table for the fixed
+# k = TRANSLATION_K: a restriction that does not touch 0 is translated such that its smallest value is 1, and a
+# restriction that touches k is flipped first. The cover relations are enumerated as shapes together with all of their
+# translates, whose numbers and weights are obtained from the table by shifting the weights. So the cost of counting
+# does not depend on k; only the cheap evaluation of the expected weight differences grows linearly in k. All cover
+# relations are evaluated (without the reduction by the reflection), so that the result is exactly the same as without
+# this option, also in floating point arithmetic.
+#
+# With the option --incremental, the table of numbers and weights for k is extended from the one for k - 1 if that k
+# has been computed just before, see hexagonal_table.extend_count_and_weight_table(); only the boundary restrictions
+# that have a value <= 1 and a value >= k - 1 are counted from the fillings. The fillings themselves are enumerated as
+# k-heights of the hexagon by the depth-first search of generic_block.py, which cuts a branch as soon as the values of
+# a vertex cannot differ by at most one from those of its assigned neighbors (this is faster than extending the
+# fillings for k - 1 by the ones that take the value k). The results are the same as without this option.
+
+import argparse
 import itertools
 import sys
 
+import exact
+import generic_block
+import hexagonal_table
+import hexagonal_vectorized
+import instrumentation
+import symmetry
+import table_store
+
+
+parser = argparse.ArgumentParser(description="Computes the block divergence of 6-blocks in toroidal hexagonal grid "
+                                             "graphs.")
+parser.add_argument("--exact", action="store_true",
+                    help="compare expected weight differences exactly and report the maxima as fractions")
+parser.add_argument("--vectorized", action="store_true",
+                    help="compute the admissible fillings with NumPy if it is installed")
+parser.add_argument("--k", type=int, nargs="+", default=list(range(2, 7)), help="values of k (default: 2 3 4 5 6)")
+parser.add_argument("--translation-quotient", action="store_true",
+                    help="evaluate every shape of boundary restrictions only once up to translation, which makes large "
+                         "values of k feasible (only has an effect for k > 7)")
+parser.add_argument("--incremental", action="store_true",
+                    help="extend the table of numbers and weights for k from the one for k - 1, and enumerate the "
+                         "fillings by depth-first search")
+instrumentation.add_arguments(parser)
+table_store.add_arguments(parser)
+arguments = parser.parse_args()
+instrumentation.configure_from_arguments(arguments)
+table_store.configure_from_arguments(arguments)
 
 print("PYTHON VERSION:\n" + sys.version)
 
+is_vectorized = arguments.vectorized and hexagonal_vectorized.numpy is not None
+if arguments.vectorized and not is_vectorized:
+    print("NumPy is not installed, falling back to the pure Python computation.")
+
+
+translation_table = None
+
+# With --incremental, the table of numbers and weights of the previous k
+previous_k = None
+previous_table = None
+
+for k in arguments.k:
+    # Compute the block divergence of k-heights for k = 2, 3, 4, 5, 6 (by default)
+
+    is_translated = arguments.translation_quotient and k > hexagonal_table.TRANSLATION_K
+
+    if is_translated:
+
+        # Steps 1 and 2 with the translation quotient: the fillings for k are not needed, and all cover relations
+        # with admissible fillings on both sides are enumerated by their shapes, see the comment at the beginning.
+        if translation_table is None:
+            translation_table = hexagonal_table.count_and_weight_table(
+                hexagonal_table.compute_block_fillings(hexagonal_table.TRANSLATION_K), hexagonal_table.TRANSLATION_K)
+        cover_relations = list(hexagonal_table.translated_cover_relations(translation_table, k))
+
+    else:
+
+        # Step 1: Iterate over all 6-tuples of {0, ..., k} and keep those that are valid fillings.
+        if arguments.incremental or is_vectorized:
+            block_fillings = list(generic_block.get_all_k_heights(k, hexagonal_table.HEXAGON))
+        else:
+            block_fillings = hexagonal_table.compute_block_fillings(k)
+
+        # Step 2: Compute k*(k+1)^5 cover relations, i.e. pairs of boundary constraints that differ on exactly one
+        # vertex by one.
+        #
+        # By symmetry, it is sufficient to only consider cover relations on the boundary of B that differ on the
+        # neighbor vertex of the first block vertex (index 0 in the tuple). Moreover, the reflection of the hexagon that
+        # fixes this vertex and the value flip h -> k - h map cover relations to cover relations with the same expected
+        # weight difference. We only keep one representative of each orbit under these symmetries.
+
+        # With --vectorized, the orbits are not enumerated unless in exact mode: all cover relations are evaluated as
+        # arrays in step 3 instead, see hexagonal_vectorized.maximum_over_all_cover_relations().
+        cover_relations = []
+        number_cover_relations = k * (k + 1) ** 5
+        if not is_vectorized or arguments.exact:
+
+            # This list will contain the representatives of all cover relations as 2-tuples of 6-tuples. It may
+            # happen that we use boundary constraints that cannot be satisfied, i.e. for which there is no admissible
+            # filling. This happens when the difference of boundary values corresponding to close boundary vertices is
+            # too large. Such boundary constraints are missing from the table of numbers and weights, and the cover
+            # relations that contain them are skipped in step 3.
+            lower_boundary_constraints = []
+            for cover_relation_on_other_5 in itertools.product(range(k+1), repeat=5):
+                for cover_relation_first_entry in range(k):
+                    lower_boundary_constraints.append(tuple([cover_relation_first_entry]
+                                                            + list(cover_relation_on_other_5)))
+
+            hexagon_reflections = [(0, 1, 2, 3, 4, 5), (0, 5, 4, 3, 2, 1)]
+
+            number_represented_cover_relations = 0
+            for l, multiplicity in symmetry.canonical_cover_relations(lower_boundary_constraints, 0, k,
+                                                                      hexagon_reflections):
+                u = tuple([l[0] + 1] + list(l[1:]))
+                cover_relations.append((l, u))
+                number_represented_cover_relations += multiplicity
+
+            # Sanity check: the orbits cover all cover relations.
+            assert number_represented_cover_relations == k * (k + 1) ** 5
+            number_cover_relations = len(cover_relations)
+
+    # Step 3: For each cover relation, compute the expected weight difference on the block and take the maximum. The
+    # flipped cover relation (k - u, k - l) has the same expected weight difference; we nevertheless evaluate it from
+    # the number and weight of the admissible fillings as well, such that the floating point result is exactly the
+    # one that we would obtain when computing it separately.
+    #
+    # In exact mode, the expected weight differences are compared by integer cross-multiplication; see exact.py .
+    maximum_expected_weight_difference = 0
+    witness = None
+    exact_maximum = exact.ExactMaximum()
+    if is_translated:
+        number_cover_relations = len(cover_relations)
+    progress = instrumentation.Progress("hexagonal_grid", total=number_cover_relations, unit="cover relations", k=k)
+    if is_translated:
+        timer = instrumentation.Timer("hexagonal_table.translated_count_and_weight")
+    elif is_vectorized:
+        timer = instrumentation.Timer("hexagonal_vectorized.count_and_weight_table")
+    else:
+        timer = instrumentation.Timer("hexagonal_table.count_and_weight_table")
+    with instrumentation.profiled("hexagonal_grid_k" + str(k)):
+
+        if is_translated:
+            lookup = timer.wrap(hexagonal_table.translated_count_and_weight)
+            numbers_and_weights = (lookup(translation_table, k, l) + lookup(translation_table, k, u)
+                                   for l, u in cover_relations)
+        elif is_vectorized:
+            vectorized_table = timer.wrap(hexagonal_vectorized.count_and_weight_table)(block_fillings, k)
+            if arguments.exact:
+                numbers_l, weights_l = hexagonal_vectorized.look_up(vectorized_table, [l for l, _ in cover_relations],
+                                                                    k)
+                numbers_u, weights_u = hexagonal_vectorized.look_up(vectorized_table, [u for _, u in cover_relations],
+                                                                    k)
+                numbers_and_weights = zip(numbers_l.tolist(), weights_l.tolist(), numbers_u.tolist(),
+                                          weights_u.tolist())
+            else:
+                maximum_expected_weight_difference, witness = \
+                    hexagonal_vectorized.maximum_over_all_cover_relations(vectorized_table, k)
+                numbers_and_weights = []
+        else:
+            # Every boundary restriction is the lower or upper end of several cover relations, so number and weight of
+            # its admissible fillings are computed only once and then looked up.
+            if arguments.incremental and previous_k == k - 1 and previous_table is not None:
+                table = timer.wrap(hexagonal_table.extend_count_and_weight_table)(previous_table, block_fillings, k)
+            else:
+                table = timer.wrap(hexagonal_table.count_and_weight_table)(block_fillings, k)
+            previous_table = table if arguments.incremental else None
+            numbers_and_weights = (tuple(table.get(l, (0, 0))) + tuple(table.get(u, (0, 0)))
+                                   for l, u in cover_relations)
+
+        for i, (cover_relation, (number_l, weight_l, number_u, weight_u)) in \
+                enumerate(zip(cover_relations, numbers_and_weights)):
+            (l, u) = cover_relation
 
-class NoAdmissibleFilling(Exception):
-    pass
-
-
-def expected_weight(p_block_fillings, p_boundary_constraint):
-    # computes the expected weight of a filling of B taken uniformly at random from all possible fillings (
-    # block_fillings) that are compatible with the given boundary restriction (boundary_restriction).
-    # p_block_fillings:         list containing all possible fillings as 6-tuples, indexed in circular order
-    # p_boundary_constraint:    6-tuple of values that represent the boundary constraint, indexed in the same
-    #                           circular order, i.e. the i-th value corresponds to the boundary vertex that is adjacent
-    #                           to the block vertex to which the i-th value of the filling corresponds.
-
-    # This list will contain the weights of all admissible fillings w.r.t. p_boundary_restriction. The expected weight
-    # is then just the average of these values.
-    possible_weights = []
-
-    for filling in p_block_fillings:
-
-        # Check whether this filling is admissible
-        filling_is_admissible = True
-        for i in range(6):
-            if abs(filling[i] - p_boundary_constraint[i]) > 1:
-                filling_is_admissible = False
-        if filling_is_admissible:
-            # Yes, it is admissible. Add its weight to possible_weights .
-            possible_weights.append(sum(filling))
-
-    if len(possible_weights) == 0:
-        # This restriction cannot be fulfilled.
-        raise NoAdmissibleFilling()
+            if progress.is_due():
+                if arguments.exact:
+                    progress.update(i, exact_maximum.value(), exact_maximum.witness)
+                else:
+                    progress.update(i, maximum_expected_weight_difference, witness)
 
-    # Return the average of the possible_weights .
-    return sum(possible_weights) / len(possible_weights)
+            if number_l == 0 or number_u == 0:
+                continue
 
+            if arguments.exact:
+                exact_maximum.update(number_l, weight_l, number_u, weight_u, cover_relation)
+                continue
 
-for k in range(2, 7):
-    # Compute the block divergence of k-heights for k = 2, 3, 4, 5, 6
+            expected_weight_conditioned_on_l = weight_l / number_l
+            expected_weight_conditioned_on_u = weight_u / number_u
 
-    # Step 1: Iterate over all 6-tuples of {0, ..., k} and keep those that are valid fillings.
+            number_flipped_l, weight_flipped_l = symmetry.flip_count_and_weight(number_u, weight_u, k, 6)
+            number_flipped_u, weight_flipped_u = symmetry.flip_count_and_weight(number_l, weight_l, k, 6)
 
-    # This list will contain all internally valid fillings, i.e. the values of two successive vertices in circular
-    # order differ by at most one.
-    block_fillings = []
-    for filling in itertools.product(range(k+1), repeat=6):
-        is_valid_filling = True
-        for i in range(5):
-            if abs(filling[i] - filling[i+1]) > 1:
-                is_valid_filling = False
-        if abs(filling[0] - filling[5]) > 1:
-            is_valid_filling = False
-        if is_valid_filling:
-            block_fillings.append(filling)
+            for expected_weight_difference in [
+                    expected_weight_conditioned_on_u - expected_weight_conditioned_on_l,
+                    weight_flipped_u / number_flipped_u - weight_flipped_l / number_flipped_l]:
+                if expected_weight_difference > maximum_expected_weight_difference:
+                    maximum_expected_weight_difference = expected_weight_difference
+                    witness = cover_relation
 
-    # Step 2: Compute k*(k+1)^5 cover relations, i.e. pairs of boundary constraints that differ on exactly one vertex by one.
-    #
-    # By symmetry, it is sufficient to only consider cover relations on the boundary of B that differ on the neighbor
-    # vertex of the first block vertex (index 0 in the tuple).
-
-    # This list will contain all cover relations as 2-tuples of 6-tuples. It may happen that we use boundary constraints
-    # that cannot be satisfied, i.e. for which there is no admissible filling. This happens when the difference of
-    # boundary values corresponding to close boundary vertices is too large. However, this will just cause a
-    # NoAdmissibleFilling exception later which we can handle, i.e. we simply ignore those.
-    cover_relations = []
-    for cover_relation_on_other_5 in itertools.product(range(k+1), repeat=5):
-        for cover_relation_first_entry in range(k):
-            l = tuple([cover_relation_first_entry] + list(cover_relation_on_other_5))
-            u = tuple([cover_relation_first_entry + 1] + list(cover_relation_on_other_5))
-            cover_relations.append((l, u))
-
-    # Step 3: For each cover relation, compute the expected weight difference on the block and take the maximum.
-    maximum_expected_weight_difference = 0
-    for cover_relation in cover_relations:
-        try:
-            (l, u) = cover_relation
-            expected_weight_conditioned_on_l = expected_weight(block_fillings, l)
-            expected_weight_conditioned_on_u = expected_weight(block_fillings, u)
+    if arguments.exact:
+        maximum_expected_weight_difference = exact_maximum.value()
+        witness = exact_maximum.witness
+    progress.update(progress.total, maximum_expected_weight_difference, witness, is_final=True)
+    timer.write(k=k)
 
-            expected_weight_difference = expected_weight_conditioned_on_u - expected_weight_conditioned_on_l
-            if expected_weight_difference > maximum_expected_weight_difference:
-                maximum_expected_weight_difference = expected_weight_difference
-        except NoAdmissibleFilling:
-            pass
+    previous_k = k
+    if is_translated or is_vectorized:
+        previous_table = None
 
     # Print the computed block divergence.
-    print("Block divergence for k=" + str(k) + " : " + str(maximum_expected_weight_difference))
+    if arguments.exact:
+        print("Block divergence for k=" + str(k) + " : " + str(maximum_expected_weight_difference) + " = "
+              + str(float(maximum_expected_weight_difference)))
+    else:
+        print("Block divergence for k=" + str(k) + " : " + str(maximum_expected_weight_difference))
@@ -0,0 +1,157 @@
+# This code provides the tables of numbers and weights of the admissible fillings of the hexagon that are used by
+# hexagonal_grid.py: the fillings of the hexagon for k, the table of numbers and weights of the admissible fillings for
+# all boundary restrictions at once, its extension from k - 1 to k (option --incremental), and the lookup in the table
+# for TRANSLATION_K (option --translation-quotient); see the comment at the beginning of hexagonal_grid.py . The
+# functions are kept apart from the script, so that they can be imported, e.g. by benchmark.py .
+
+
+import itertools
+
+import generic_block
+import symmetry
+import table_store
+
+
+def count_and_weight_table(p_block_fillings, k):
+    # computes number and total weight of the admissible fillings for all boundary restrictions at once, in a single
+    # pass over p_block_fillings: every filling is added to each of the at most 3^6 boundary restrictions that it is
+    # compatible with.
+    # p_block_fillings:         list containing all possible fillings as 6-tuples, indexed in circular order
+    # k:                        the k of the k-heights
+    # Returns a dictionary that maps every boundary restriction that can be extended to B to a list [number of
+    # admissible fillings, total weight]. Boundary restrictions without admissible filling are missing.
+
+    table = dict()
+
+    for filling in p_block_fillings:
+        weight = sum(filling)
+        compatible_values = [range(max(h - 1, 0), min(h + 1, k) + 1) for h in filling]
+        for boundary_constraint in itertools.product(*compatible_values):
+            entry = table.get(boundary_constraint)
+            if entry is None:
+                table[boundary_constraint] = [1, weight]
+            else:
+                entry[0] += 1
+                entry[1] += weight
+
+    return table
+
+
+def extend_count_and_weight_table(p_table, p_block_fillings, k):
+    # computes the same table as count_and_weight_table(p_block_fillings, k), but takes the entries that do not depend
+    # on the new value k from the table for k - 1. Every value of an admissible filling differs by at most one from its
+    # boundary value. Hence, a boundary restriction whose values are at most k - 2 has the same admissible fillings as
+    # for k - 1, and a boundary restriction whose values are at least 2 has the admissible fillings of the restriction
+    # minus 1, plus 1, each with weight larger by 6. Only the remaining restrictions are counted from the fillings,
+    # namely those with a value <= 1 and a value >= k - 1, whose admissible fillings have a value <= 2 and a value
+    # >= k - 2.
+    # p_table:                  dictionary as returned by count_and_weight_table(..., k - 1)
+    # p_block_fillings:         list containing all possible fillings for k as 6-tuples, indexed in circular order
+
+    table = dict()
+
+    for boundary_constraint, (number, weight) in p_table.items():
+        if max(boundary_constraint) <= k - 2:
+            table[boundary_constraint] = [number, weight]
+        if min(boundary_constraint) >= 1:
+            table[tuple(value + 1 for value in boundary_constraint)] = [number, weight + 6 * number]
+
+    for filling in p_block_fillings:
+        if min(filling) > 2 or max(filling) < k - 2:
+            continue
+        weight = sum(filling)
+        compatible_values = [range(max(h - 1, 0), min(h + 1, k) + 1) for h in filling]
+        for boundary_constraint in itertools.product(*compatible_values):
+            if min(boundary_constraint) > 1 or max(boundary_constraint) < k - 1:
+                continue
+            entry = table.get(boundary_constraint)
+            if entry is None:
+                table[boundary_constraint] = [1, weight]
+            else:
+                entry[0] += 1
+                entry[1] += weight
+
+    return table
+
+
+# Maximum difference of two values of an extensible boundary restriction, see the comment at the beginning of
+# hexagonal_grid.py
+MAX_SPAN = 5
+
+# The k of the table of numbers and weights that is used for all larger k with the option --translation-quotient. All
+# shapes fit into 0, ..., TRANSLATION_K - 1 when their smallest value is 0 or 1, so that they do not touch the ceiling.
+TRANSLATION_K = MAX_SPAN + 2
+
+
+def compute_block_fillings(k):
+    # Iterates over all 6-tuples of {0, ..., k} and keeps those that are valid fillings.
+    # Returns the list of all internally valid fillings, i.e. the values of two successive vertices in circular order
+    # differ by at most one. With --table-directory, the list is computed once per k and kept on disk.
+
+    return table_store.cached("hexagon_fillings", {"k": k}, lambda: enumerate_block_fillings(k),
+                              lambda block_fillings: table_store.encode_rows("fillings", block_fillings, 6),
+                              lambda arrays: table_store.decode_rows(arrays, "fillings"))
+
+
+def enumerate_block_fillings(k):
+
+    block_fillings = []
+    for filling in itertools.product(range(k+1), repeat=6):
+        is_valid_filling = True
+        for i in range(5):
+            if abs(filling[i] - filling[i+1]) > 1:
+                is_valid_filling = False
+        if abs(filling[0] - filling[5]) > 1:
+            is_valid_filling = False
+        if is_valid_filling:
+            block_fillings.append(filling)
+
+    return block_fillings
+
+
+def translated_count_and_weight(p_table, k, p_boundary_constraint):
+    # looks up number and total weight of the admissible fillings of a boundary restriction for k > TRANSLATION_K in the
+    # table of TRANSLATION_K, see the comment at the beginning of hexagonal_grid.py .
+    # p_table:                  dictionary as returned by count_and_weight_table(..., TRANSLATION_K)
+    # p_boundary_constraint:    6-tuple of values in 0, ..., k
+    # Returns the tuple (number of admissible fillings, total weight).
+
+    lowest = min(p_boundary_constraint)
+    highest = max(p_boundary_constraint)
+    if highest - lowest > MAX_SPAN:
+        return 0, 0
+
+    if highest == k:
+        # Touches the ceiling, but not the floor since k > MAX_SPAN. The flipped restriction touches neither the
+        # ceiling nor (possibly) the floor.
+        number, weight = translated_count_and_weight(p_table, k, symmetry.flip(p_boundary_constraint, k))
+        return symmetry.flip_count_and_weight(number, weight, k, 6)
+
+    # A restriction that touches the floor is looked up as it is; otherwise, it is translated to the smallest value 1.
+    shift = lowest - min(lowest, 1)
+    number, weight = p_table.get(tuple(value - shift for value in p_boundary_constraint), (0, 0))
+    return number, weight + 6 * shift * number
+
+
+def translated_cover_relations(p_table, k):
+    # enumerates all cover relations (l, u) that differ on the first vertex and whose boundary restrictions both have
+    # admissible fillings, for k > TRANSLATION_K: every shape of l whose translates can have admissible fillings on both
+    # sides, together with all of its translates within 0, ..., k.
+    # p_table:  dictionary as returned by count_and_weight_table(..., TRANSLATION_K)
+
+    for shape in itertools.product(range(MAX_SPAN + 1), repeat=6):
+        if min(shape) != 0 or shape[0] == MAX_SPAN:
+            continue
+        augmented_shape = tuple([shape[0] + 1] + list(shape[1:]))
+        # Translated away from the floor, neither l nor u touch any bound. If they have no admissible fillings there,
+        # they have none at the floor or ceiling either.
+        if tuple(value + 1 for value in shape) not in p_table \
+                or tuple(value + 1 for value in augmented_shape) not in p_table:
+            continue
+        for translation in range(k - max(augmented_shape) + 1):
+            yield (tuple(value + translation for value in shape),
+                   tuple(value + translation for value in augmented_shape))
+
+
+# The hexagon as graph, for enumerating its fillings with --incremental
+HEXAGON = generic_block.canonical_graph(6, [(i, (i + 1) % 6) for i in range(6)])
@@ -0,0 +1,169 @@
+# This code provides an optional vectorized backend for hexagonal_grid.py based on NumPy. Like the pure Python
+# computation, it computes number and total weight of the admissible fillings once per boundary constraint and looks
+# them up for the lower and the upper boundary constraint of every cover relation. Every filling of the hexagon is
+# admissible for at most 3^6 boundary constraints, namely those whose i-th value differs by at most one from the i-th
+# value of the filling. These boundary constraints are generated for a chunk of fillings at once as an array, encoded
+# as integers in base k + 1, and their numbers and weights are summed up by numpy.bincount over the distinct codes. The
+# sums of the chunks are then added to the table of all distinct codes so far in 64-bit integers. The sums of bincount
+# are exact: they are far below 2^53, so that even its floating point sums are integers. Hence, all results are exactly
+# the same as in the pure Python computation. The cover relations are evaluated in slices of their codes as well, so
+# that the memory consumption besides the table and the fillings does not grow with k.
+#
+# If NumPy is not installed, the module can still be imported, but numpy is None and hexagonal_grid.py falls back to
+# its pure Python computation.
+
+
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def encode(boundary_constraints, k):
+
+    """
+    :param boundary_constraints:    Integer array (B, 6) of values in 0, ..., k
+    :return:                        Integer array (B,) of the boundary constraints as numbers in base k + 1, the first
+                                    value being the most significant digit
+    """
+
+    return boundary_constraints @ (k + 1) ** numpy.arange(5, -1, -1, dtype=numpy.int64)
+
+
+def count_and_weight_table(block_fillings, k, chunk_size=256):
+
+    """
+    Computes number and total weight of the admissible fillings for all boundary constraints at once, see the comment
+    at the beginning.
+    :param block_fillings:  List containing all possible fillings as 6-tuples, indexed in circular order
+    :param k:               The k of the k-heights
+    :param chunk_size:      Number of fillings that are processed at once. The memory consumption of a chunk is
+                            proportional to 3^6 * chunk_size.
+    :return:                Tuple (codes, numbers, weights) of int64 arrays: the sorted codes of the boundary
+                            constraints that have admissible fillings, see encode(), and their numbers and total
+                            weights of admissible fillings
+    """
+
+    fillings = numpy.array(block_fillings, dtype=numpy.int64).reshape(-1, 6)
+    offsets = numpy.array(list(itertools.product((-1, 0, 1), repeat=6)), dtype=numpy.int64)
+
+    codes = numpy.zeros(0, dtype=numpy.int64)
+    numbers = numpy.zeros(0, dtype=numpy.int64)
+    weights = numpy.zeros(0, dtype=numpy.int64)
+
+    for start in range(0, len(fillings), chunk_size):
+        chunk = fillings[start:start + chunk_size]
+        boundary_constraints = chunk[:, None, :] + offsets[None, :, :]
+        is_valid = ((boundary_constraints >= 0) & (boundary_constraints <= k)).all(axis=2)
+
+        chunk_codes, inverse = numpy.unique(encode(boundary_constraints[is_valid], k), return_inverse=True)
+        chunk_numbers = numpy.bincount(inverse, minlength=len(chunk_codes))
+        constraint_weights = numpy.broadcast_to(chunk.sum(axis=1)[:, None], is_valid.shape)[is_valid]
+        chunk_weights = numpy.bincount(inverse, weights=constraint_weights, minlength=len(chunk_codes))
+
+        # Both code arrays are sorted and free of duplicates, so every code occurs at most once on either side.
+        merged_codes = numpy.union1d(codes, chunk_codes)
+        merged_numbers = numpy.zeros(len(merged_codes), dtype=numpy.int64)
+        merged_weights = numpy.zeros(len(merged_codes), dtype=numpy.int64)
+        for part_codes, part_numbers, part_weights in ((codes, numbers, weights),
+                                                       (chunk_codes, chunk_numbers, chunk_weights)):
+            positions = numpy.searchsorted(merged_codes, part_codes)
+            merged_numbers[positions] += part_numbers.astype(numpy.int64)
+            merged_weights[positions] += part_weights.astype(numpy.int64)
+        codes, numbers, weights = merged_codes, merged_numbers, merged_weights
+
+    return codes, numbers, weights
+
+
+def look_up(table, boundary_constraints, k):
+
+    """
+    :param table:                   Result of count_and_weight_table()
+    :param boundary_constraints:    List of 6-tuples of values in 0, ..., k, indexed in circular order
+    :return:                        Tuple (numbers, weights) of int64 arrays of length len(boundary_constraints); 0 for
+                                    boundary constraints without admissible filling
+    """
+
+    return look_up_codes(table, encode(numpy.array(boundary_constraints, dtype=numpy.int64).reshape(-1, 6), k))
+
+
+def look_up_codes(table, constraint_codes):
+
+    """
+    Same as look_up(), but for an int64 array of encoded boundary constraints, see encode().
+    """
+
+    codes, numbers, weights = table
+    positions = numpy.minimum(numpy.searchsorted(codes, constraint_codes), len(codes) - 1)
+    is_found = codes[positions] == constraint_codes
+
+    return numpy.where(is_found, numbers[positions], 0), numpy.where(is_found, weights[positions], 0)
+
+
+def maximum_over_all_cover_relations(table, k, chunk_size=1 << 16):
+
+    """
+    Evaluates all k * (k + 1)^5 cover relations (l, u) that differ on the first vertex, without enumerating them in
+    Python: the codes of the lower boundary constraints with first value h are h * (k + 1)^5 + 0, 1, ..., and the codes
+    of the upper ones are larger by (k + 1)^5. Cover relations that are mapped to each other by the reflection of the
+    hexagon have the same numbers and weights, and both a cover relation and its flipped cover relation are evaluated,
+    see maximum_expected_weight_difference(). So the maximum is exactly the one over the representatives of the
+    orbits in hexagonal_grid.py, also in floating point arithmetic.
+    :param table:       Result of count_and_weight_table()
+    :param chunk_size:  Number of cover relations that are evaluated at once
+    :return:            Tuple (maximum, witness). The maximum is a float, or 0 if there is no cover relation with
+                        admissible fillings on both sides. The witness is a maximizing cover relation (l, u) as pair of
+                        6-tuples, or None.
+    """
+
+    size = (k + 1) ** 5
+
+    # The slices are walked in increasing order of the codes, and only a strictly larger difference replaces the
+    # maximum, so the witness does not depend on chunk_size.
+
+    maximum = 0
+    witness = None
+    for first_value in range(k):
+        for start in range(0, size, chunk_size):
+            codes = first_value * size + numpy.arange(start, min(start + chunk_size, size), dtype=numpy.int64)
+            numbers_l, weights_l = look_up_codes(table, codes)
+            numbers_u, weights_u = look_up_codes(table, codes + size)
+            difference, i = maximum_expected_weight_difference(numbers_l, weights_l, numbers_u, weights_u, k)
+            if i is not None and difference > maximum:
+                maximum = difference
+                l = tuple(int(value) for value in numpy.unravel_index(codes[i], (k + 1,) * 6))
+                witness = (l, (l[0] + 1,) + l[1:])
+
+    return maximum, witness
+
+
+def maximum_expected_weight_difference(numbers_l, weights_l, numbers_u, weights_u, k):
+
+    """
+    Computes the maximum expected weight difference over cover relations (l, u) with admissible fillings on both sides,
+    in floating point arithmetic. As in hexagonal_grid.py, the difference is also evaluated for the flipped cover
+    relation (k - u, k - l), see symmetry.py .
+    :return:    Tuple (maximum, index). The maximum is a float, or 0 if there is no cover relation with admissible
+                fillings on both sides. The index is the index of a maximizing cover relation, or None.
+    """
+
+    is_extensible = (numbers_l > 0) & (numbers_u > 0)
+    if not is_extensible.any():
+        return 0, None
+
+    indices = numpy.flatnonzero(is_extensible)
+    numbers_l = numbers_l[indices]
+    weights_l = weights_l[indices]
+    numbers_u = numbers_u[indices]
+    weights_u = weights_u[indices]
+
+    differences = numpy.maximum(
+        weights_u / numbers_u - weights_l / numbers_l,
+        (6 * k * numbers_l - weights_l) / numbers_l - (6 * k * numbers_u - weights_u) / numbers_u)
+
+    i = int(differences.argmax())
+    if differences[i] <= 0:
+        return 0, None
+    return float(differences[i]), int(indices[i])
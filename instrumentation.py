@@ -0,0 +1,243 @@
+# This code provides the instrumentation that is shared by the scripts and by generic_block.py: progress records with
+# processing rate, estimated remaining time and the current maximum together with its witness, timings of the hot
+# functions of the dynamic programs, and an optional profiler. If a metrics file is configured, every record is
+# appended to it as one line of JSON, so that runs can be followed while they are running and compared afterwards.
+# Progress messages on the console are throttled to at most one per progress interval and per progress object.
+#
+# Instrumentation is switched off by default: without a metrics file, no records are written and the timed functions
+# are not wrapped at all, so that the computations run at full speed.
+
+
+import cProfile
+import contextlib
+import json
+import os
+import time
+
+
+_settings = {
+    "metrics_file": None,
+    "profile_file": None,
+    "progress_interval": 10.0,
+}
+
+
+def add_arguments(parser):
+
+    """
+    Adds the command line options of the instrumentation to an argparse.ArgumentParser.
+    """
+
+    parser.add_argument("--metrics-file", default=None,
+                        help="append progress records and timings as JSON lines to this file")
+    parser.add_argument("--profile-file", default=None,
+                        help="profile the dynamic programs with cProfile and write the statistics to files with this "
+                             "prefix")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="minimum number of seconds between two progress messages (default: 10)")
+
+
+def configure(metrics_file=None, profile_file=None, progress_interval=10.0):
+
+    _settings["metrics_file"] = metrics_file
+    _settings["profile_file"] = profile_file
+    _settings["progress_interval"] = progress_interval
+
+
+def configure_from_arguments(arguments):
+
+    configure(arguments.metrics_file, arguments.profile_file, arguments.progress_interval)
+
+
+def get_settings():
+
+    """
+    :return:    The current settings as dictionary, e.g. for passing them to worker processes, see configure()
+    """
+
+    return dict(_settings)
+
+
+def is_enabled():
+
+    return _settings["metrics_file"] is not None
+
+
+def json_value(value):
+
+    # Values that JSON does not know are written as strings; in particular, fractions are written as "p/q", so that
+    # they are not rounded.
+
+    return str(value)
+
+
+def write_record(record):
+
+    """
+    Appends the record (a dictionary) together with a time stamp and the process id to the metrics file, if there is
+    one. Every record is written by a single call, so that records of several processes do not get mixed up.
+    """
+
+    if _settings["metrics_file"] is None:
+        return
+
+    record = dict(record, time=time.time(), pid=os.getpid())
+    with open(_settings["metrics_file"], "a") as file:
+        file.write(json.dumps(record, default=json_value) + "\n")
+
+
+class Progress:
+
+    def __init__(self, name, total=None, unit="items", report=None, processed=0, **context):
+
+        """
+        :param name:        Name of the computation, e.g. "rectangular_grid shard"
+        :param total:       Number of items to be processed in total, or None if unknown
+        :param unit:        Name of the processed items
+        :param report:      Function that is called with a throttled progress message, or None
+        :param processed:   Number of items that have already been processed, e.g. by an earlier run that is resumed.
+                            The rate only takes into account the items processed afterwards.
+        :param context:     Further entries of every record, e.g. k
+        """
+
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.report = report
+        self.context = context
+
+        self.start_time = time.time()
+        self.last_time = self.start_time
+        self.start_processed = processed
+
+    def record(self, processed, best, witness, fields, now):
+
+        elapsed = now - self.start_time
+        rate = (processed - self.start_processed) / elapsed if elapsed > 0 else None
+        eta = None
+        if rate and self.total is not None:
+            eta = (self.total - processed) / rate
+
+        record = {"name": self.name, "unit": self.unit, "processed": processed, "total": self.total,
+                  "elapsed": elapsed, "rate": rate, "eta": eta, "best": best, "best_float": None, "witness": witness}
+        if best is not None:
+            record["best_float"] = float(best)
+        record.update(self.context)
+        record.update(fields)
+        return record
+
+    def is_due(self):
+
+        """
+        :return:    True iff the next call of update() will report, i.e. the progress interval has passed. Callers can
+                    use this to avoid computing the arguments of update() in vain.
+        """
+
+        return time.time() - self.last_time >= _settings["progress_interval"]
+
+    def update(self, processed, best=None, witness=None, is_final=False, **fields):
+
+        """
+        Reports the progress, but at most once per progress interval unless is_final is set.
+        :param processed:   Number of processed items so far, including those of earlier runs if resumed
+        :param best:        The maximum found so far
+        :param witness:     Witness of the maximum, e.g. boundary constraint and augmentation vertex
+        :param is_final:    Whether this is the last update of the computation
+        :param fields:      Further entries of the record
+        """
+
+        now = time.time()
+        if not is_final and now - self.last_time < _settings["progress_interval"]:
+            return
+        self.last_time = now
+
+        record = self.record(processed, best, witness, fields, now)
+        record["final"] = is_final
+        write_record(record)
+
+        if self.report is not None:
+            message = self.name
+            if self.context:
+                message += " (" + ", ".join(key + " = " + str(value) for key, value in self.context.items()) + ")"
+            message += ": " + str(processed)
+            if self.total is not None:
+                message += " out of " + str(self.total)
+            message += " " + self.unit
+            if record["rate"] is not None:
+                message += ", " + format(record["rate"], ".1f") + " per second"
+            if record["eta"] is not None:
+                message += ", about " + format(record["eta"], ".0f") + " seconds remaining"
+            message += ". Max block divergence found so far: " + str(best)
+            self.report(message)
+
+
+class Timer:
+
+    def __init__(self, name):
+
+        """
+        Accumulates number, total and maximum duration of the calls of a function; see wrap().
+        """
+
+        self.name = name
+        self.number_calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def wrap(self, function):
+
+        """
+        :return:    The function itself if instrumentation is switched off, otherwise a function that additionally
+                    measures the duration of every call.
+        """
+
+        if not is_enabled():
+            return function
+
+        def timed_function(*arguments, **keyword_arguments):
+            start_time = time.perf_counter()
+            try:
+                return function(*arguments, **keyword_arguments)
+            finally:
+                duration = time.perf_counter() - start_time
+                self.number_calls += 1
+                self.total_time += duration
+                if duration > self.max_time:
+                    self.max_time = duration
+
+        return timed_function
+
+    def write(self, **context):
+
+        """
+        Writes the accumulated timings as a record, if there were calls.
+        """
+
+        if self.number_calls == 0:
+            return
+
+        record = {"name": "timing", "function": self.name, "calls": self.number_calls, "total_seconds": self.total_time,
+                  "mean_seconds": self.total_time / self.number_calls, "max_seconds": self.max_time}
+        record.update(context)
+        write_record(record)
+
+
+@contextlib.contextmanager
+def profiled(name):
+
+    """
+    Context manager that profiles the enclosed computation with cProfile if a profile file prefix is configured. The
+    statistics are written to the file <prefix>.<name>.<process id>.prof, which can be read by the pstats module.
+    """
+
+    if _settings["profile_file"] is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(_settings["profile_file"] + "." + name + "." + str(os.getpid()) + ".prof")
@@ -0,0 +1,401 @@
+# This program measures the mixing of k-heights empirically, complementing the bounds on the block divergence. It
+# simulates Glauber dynamics on toroidal rectangular and hexagonal grids, either single-site or with the blocks of
+# rectangular_grid.py and hexagonal_grid.py, and reports the coalescence times of the monotone coupling that starts
+# from the top k-height (all values k) and the bottom k-height (all values 0). By the coupling inequality, the
+# distribution of the coalescence time bounds the total variation distance from the uniform distribution.
+#
+# A heat-bath step replaces the values on a block by a uniformly random filling that is admissible with respect to the
+# current values on the boundary of the block. A single site is a block with one vertex. The filling is sampled vertex
+# by vertex: every vertex takes the value given by the inverse of the distribution function of its conditional
+# distribution at a uniform random number, and the same random numbers are used for the top and the bottom chain. The
+# conditional distributions are monotone in the boundary and in the values chosen before, since the admissible fillings
+# form a distributive lattice; hence, the top chain stays above the bottom chain, and once they agree, they agree
+# forever.
+#
+# The conditional distributions are obtained by the transfer-matrix method of transfer_matrix.py: a block is given as
+# a sequence of rows, and the candidates for every row are enumerated once (the k-strips for the rows of a rectangular
+# block, all fillings of the hexagon for a hexagonal block, see generic_block.py). Backward messages count the
+# admissible completions of the rows behind, and the rows are then sampled from the front. The numbers of completions
+# grow exponentially with the size of the block and would overflow integer arrays, so they are kept in floating point
+# and every message is rescaled by a power of two. The rescaling is exact, so the sampling is exactly the same as with
+# integers as long as the numbers have at most 53 bits; beyond, the conditional distributions are exact up to the
+# rounding of floating point numbers.
+#
+# The state of all chains is one integer array, and all blocks of a colour class, i.e. blocks that neither overlap nor
+# are adjacent, are updated at once by array operations; the colour classes are updated one after the other. A sweep
+# updates every block once. This needs NumPy; without it, the script only prints a message.
+
+
+import argparse
+import sys
+
+import generic_block
+import instrumentation
+import table_store
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def rectangular_torus(rows, columns):
+
+    """
+    :return:    List of the neighbors of every vertex of the toroidal (rows x columns)-grid. Vertex (i, j) has the index
+                i * columns + j.
+    """
+
+    return [[((i - 1) % rows) * columns + j, ((i + 1) % rows) * columns + j, i * columns + (j - 1) % columns,
+             i * columns + (j + 1) % columns] for i in range(rows) for j in range(columns)]
+
+
+def rectangular_blocks(rows, columns, width, height):
+
+    """
+    :return:    All translates of the (width x height)-block in the toroidal (rows x columns)-grid, each as list of its
+                rows from the front to the back, every row as tuple of vertex indices from the left to the right.
+    """
+
+    return [[tuple(((i + r) % rows) * columns + (j + c) % columns for c in range(width)) for r in range(height)]
+            for i in range(rows) for j in range(columns)]
+
+
+def hexagonal_torus(rows, columns):
+
+    """
+    :return:    List of the neighbors of every vertex of the toroidal hexagonal grid, drawn as brick wall: vertex (i, j)
+                has the index i * columns + j, it is adjacent to its left and right neighbor in row i, and to the
+                vertex below if i + j is even, otherwise to the vertex above. rows and columns have to be even.
+    """
+
+    if rows % 2 or columns % 2:
+        raise ValueError("The hexagonal torus needs an even number of rows and columns.")
+
+    neighbors = []
+    for i in range(rows):
+        for j in range(columns):
+            vertical = (i + 1) % rows if (i + j) % 2 == 0 else (i - 1) % rows
+            neighbors.append([i * columns + (j - 1) % columns, i * columns + (j + 1) % columns, vertical * columns + j])
+    return neighbors
+
+
+def hexagonal_blocks(rows, columns):
+
+    """
+    :return:    All hexagons of the toroidal hexagonal grid, each as list of one row, namely the tuple of its six
+                vertex indices in circular order, see hexagonal_torus()
+    """
+
+    blocks = []
+    for i in range(rows):
+        for j in range(columns):
+            if (i + j) % 2 == 0:
+                below = (i + 1) % rows
+                blocks.append([(i * columns + j, i * columns + (j + 1) % columns, i * columns + (j + 2) % columns,
+                                below * columns + (j + 2) % columns, below * columns + (j + 1) % columns,
+                                below * columns + j)])
+    return blocks
+
+
+def single_site_blocks(number_vertices):
+
+    return [[(v,)] for v in range(number_vertices)]
+
+
+def colour_blocks(neighbors, blocks):
+
+    """
+    Colours the blocks greedily such that two blocks of the same colour neither overlap nor are adjacent, so that they
+    can be updated at the same time.
+    :return:    List of colour classes, each a list of indices of blocks
+    """
+
+    blocks_by_vertex = [[] for _ in neighbors]
+    for b, block in enumerate(blocks):
+        for row in block:
+            for v in row:
+                blocks_by_vertex[v].append(b)
+
+    colours = [None] * len(blocks)
+    for b, block in enumerate(blocks):
+        used = set()
+        for row in block:
+            for v in row:
+                for w in [v] + neighbors[v]:
+                    used.update(colours[c] for c in blocks_by_vertex[w] if colours[c] is not None)
+        colours[b] = min(c for c in range(len(used) + 1) if c not in used)
+
+    return [[b for b in range(len(blocks)) if colours[b] == c] for c in range(max(colours) + 1)]
+
+
+class BlockStructure:
+
+    def __init__(self, k, neighbors, block):
+
+        """
+        Everything about a block that is the same for all of its translates: the candidates for every row, the
+        compatibility of successive rows and the boundary edges, given by local indices.
+        :param k:           The k of the k-heights
+        :param neighbors:   Neighbors of every vertex of the graph
+        :param block:       One translate of the block as list of rows, see rectangular_blocks()
+        """
+
+        position = {v: (r, c) for r, row in enumerate(block) for c, v in enumerate(row)}
+        if len(position) != sum(len(row) for row in block):
+            raise ValueError("The block contains a vertex twice; the torus is too small for the block.")
+
+        # candidates[r] is an array with one row per k-height of the subgraph induced by the r-th row of the block.
+
+        self.candidates = []
+        for r, row in enumerate(block):
+            edges = [(c, position[w][1]) for c, v in enumerate(row) for w in neighbors[v]
+                     if w in position and position[w][0] == r and c < position[w][1]]
+            graph = generic_block.canonical_graph(len(row), edges)
+            self.candidates.append(numpy.array(generic_block.get_all_k_heights(k, graph), dtype=numpy.int64))
+
+        # compatible[r][s, t] is 1 iff candidate s of row r and candidate t of row r + 1 fit together.
+
+        self.compatible = []
+        for r in range(len(block) - 1):
+            is_compatible = numpy.ones((len(self.candidates[r]), len(self.candidates[r + 1])), dtype=bool)
+            for c, v in enumerate(block[r]):
+                for w in neighbors[v]:
+                    if w in position and position[w][0] == r + 1:
+                        is_compatible &= numpy.abs(self.candidates[r][:, c, None]
+                                                   - self.candidates[r + 1][None, :, position[w][1]]) <= 1
+            self.compatible.append(is_compatible.astype(numpy.float64))
+
+        for v in position:
+            for w in neighbors[v]:
+                if w in position and abs(position[w][0] - position[v][0]) > 1:
+                    raise ValueError("Edges within a block may only join successive rows.")
+
+        # Boundary edges as pairs (row, column) of the block vertex, one per outside neighbor, in a fixed order.
+
+        self.boundary_positions = [(r, c) for r, row in enumerate(block) for c, v in enumerate(row)
+                                   for w in neighbors[v] if w not in position]
+
+        # near_value[r][c][h, s] is True iff the c-th value of candidate s of row r differs by at most one from h.
+        # value_indicator[r][c][s, h] is 1.0 iff the c-th value of candidate s of row r is h.
+
+        values = numpy.arange(k + 1)
+        self.near_value = [[numpy.abs(values[:, None] - candidates[None, :, c]) <= 1
+                            for c in range(candidates.shape[1])] for candidates in self.candidates]
+        self.value_indicator = [[(candidates[:, c, None] == values[None, :]).astype(numpy.float64)
+                                 for c in range(candidates.shape[1])] for candidates in self.candidates]
+
+    def boundary_vertices(self, neighbors, block):
+
+        """
+        :return:    The outside neighbors of the translate block, in the order of boundary_positions
+        """
+
+        inside = set(v for row in block for v in row)
+        outside = [w for row in block for v in row for w in neighbors[v] if w not in inside]
+        if len(outside) != len(self.boundary_positions):
+            raise ValueError("The translates of a block have to be congruent.")
+        return outside
+
+
+class BlockDynamics:
+
+    def __init__(self, k, neighbors, blocks):
+
+        """
+        Heat-bath dynamics on k-heights of a graph that updates the given blocks, see the comment at the beginning.
+        :param k:           The k of the k-heights
+        :param neighbors:   List of the neighbors of every vertex
+        :param blocks:      Congruent blocks as lists of rows of vertex indices, see rectangular_blocks()
+        """
+
+        self.k = k
+        self.number_vertices = len(neighbors)
+        self.structure = BlockStructure(k, neighbors, blocks[0])
+
+        # For every colour class: the vertex indices of the blocks as array (blocks, rows, columns) per row, and the
+        # outside neighbors as array (blocks, boundary edges).
+
+        self.colour_classes = []
+        for colour_class in colour_blocks(neighbors, blocks):
+            rows = [numpy.array([blocks[b][r] for b in colour_class], dtype=numpy.int64)
+                    for r in range(len(blocks[0]))]
+            outside = numpy.array([self.structure.boundary_vertices(neighbors, blocks[b]) for b in colour_class],
+                                  dtype=numpy.int64).reshape(len(colour_class), -1)
+            self.colour_classes.append((rows, outside))
+
+    def update(self, states, rows, outside, uniforms):
+
+        """
+        Replaces the values on the blocks of one colour class by admissible fillings, in place.
+        :param states:      Array (chains, vertices) of the current k-heights
+        :param rows:        Vertex indices of the blocks of the colour class, see __init__()
+        :param outside:     Outside neighbors of the blocks of the colour class, see __init__()
+        :param uniforms:    Array (chains or 1, blocks, block vertices) of uniform random numbers in [0, 1). Chains
+                            that get the same random numbers are coupled monotonically.
+        """
+
+        structure = self.structure
+        number_rows = len(structure.candidates)
+
+        # masks[r][chain, block, s] is 1.0 iff candidate s of row r respects the boundary of the block.
+
+        masks = [numpy.ones(states.shape[:1] + outside.shape[:1] + candidates.shape[:1], dtype=numpy.float64)
+                 for candidates in structure.candidates]
+        boundary_values = states[:, outside]
+        for e, (r, c) in enumerate(structure.boundary_positions):
+            masks[r] *= structure.near_value[r][c][boundary_values[:, :, e]]
+
+        # messages[r][chain, block, s] is the number of admissible completions of rows r, r + 1, ... that start with
+        # candidate s of row r, divided by a power of two that depends on chain and block only, such that the largest
+        # entry is in [1/2, 1).
+
+        messages = [None] * number_rows
+        messages[-1] = masks[-1]
+        for r in range(number_rows - 2, -1, -1):
+            messages[r] = masks[r] * (messages[r + 1] @ structure.compatible[r].T)
+            exponents = numpy.frexp(messages[r].max(axis=-1))[1]
+            messages[r] = numpy.ldexp(messages[r], -exponents[..., None])
+
+        u = 0
+        for r in range(number_rows):
+            weights = messages[r]
+            if r > 0:
+                weights = weights * structure.compatible[r - 1][previous]
+            for c in range(structure.candidates[r].shape[1]):
+                marginal = numpy.cumsum(weights @ structure.value_indicator[r][c], axis=-1)
+                # The value h is taken iff marginal[h - 1] <= threshold < marginal[h]. The threshold is kept below the
+                # total, which the product of the uniform random number and the total may reach by rounding.
+                total = marginal[..., -1]
+                threshold = numpy.minimum(uniforms[..., u] * total, numpy.nextafter(total, 0))
+                values = (marginal <= threshold[..., None]).sum(axis=-1)
+                weights = weights * structure.value_indicator[r][c][:, values].transpose(1, 2, 0)
+                states[:, rows[r][:, c]] = values
+                u += 1
+            previous = weights.argmax(axis=-1)
+
+    def sweep(self, states, generator, number_runs):
+
+        """
+        Updates every block once, colour class by colour class.
+        :param states:      Array (2, number_runs, vertices): the top chains and the bottom chains
+        :param generator:   numpy.random.Generator
+        """
+
+        flat_states = states.reshape(-1, self.number_vertices)
+        number_block_vertices = sum(candidates.shape[1] for candidates in self.structure.candidates)
+        for rows, outside in self.colour_classes:
+            uniforms = generator.random((number_runs, len(outside), number_block_vertices))
+            self.update(flat_states, rows, outside, numpy.concatenate([uniforms, uniforms]))
+
+    def coalescence_times(self, number_runs, max_sweeps, seed=0, progress=None):
+
+        """
+        Runs number_runs independent pairs of monotonically coupled chains from the top and the bottom k-height.
+        :return:    List with the number of sweeps after which the chains of every pair agree, or None if they do not
+                    agree after max_sweeps sweeps
+        """
+
+        generator = numpy.random.default_rng(seed)
+        states = numpy.empty((2, number_runs, self.number_vertices), dtype=numpy.int64)
+        states[0] = self.k
+        states[1] = 0
+
+        times = [None] * number_runs
+        for t in range(1, max_sweeps + 1):
+            self.sweep(states, generator, number_runs)
+
+            # Sanity check: the coupling is monotone.
+            assert (states[1] <= states[0]).all()
+
+            for run in numpy.flatnonzero((states[0] == states[1]).all(axis=-1)):
+                if times[run] is None:
+                    times[run] = t
+            if progress is not None:
+                progress.update(t, number_coalesced=sum(time is not None for time in times))
+            if all(time is not None for time in times):
+                break
+
+        return times
+
+
+def summarize(times, max_sweeps):
+
+    coalesced = sorted(time for time in times if time is not None)
+    if not coalesced:
+        return "no pair of chains agrees after " + str(max_sweeps) + " sweeps"
+
+    def quantile(q):
+        return coalesced[min(len(coalesced) - 1, int(q * len(coalesced)))]
+
+    summary = ("mean " + format(sum(coalesced) / len(coalesced), ".2f") + ", median " + str(quantile(0.5))
+               + ", 90% quantile " + str(quantile(0.9)) + ", maximum " + str(coalesced[-1]) + " sweeps")
+    if len(coalesced) < len(times):
+        summary += "; " + str(len(times) - len(coalesced)) + " pairs do not agree after " + str(max_sweeps) + " sweeps"
+    return summary
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Measures coalescence times of the monotone coupling of Glauber "
+                                                 "dynamics on k-heights of toroidal grids.")
+    parser.add_argument("--grid", choices=["rectangular", "hexagonal"], default="rectangular",
+                        help="toroidal grid (default: rectangular)")
+    parser.add_argument("--size", type=int, nargs=2, default=[8, 8], metavar=("ROWS", "COLUMNS"),
+                        help="number of rows and columns of the torus (default: 8 8)")
+    parser.add_argument("--dynamics", choices=["single-site", "block"], default="single-site",
+                        help="update single sites or blocks, i.e. (width x height)-blocks in the rectangular grid and "
+                             "hexagons in the hexagonal grid (default: single-site)")
+    parser.add_argument("--block-size", type=int, nargs=2, default=[4, 4], metavar=("WIDTH", "HEIGHT"),
+                        help="size of the blocks in the rectangular grid (default: 4 4)")
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 3], help="values of k (default: 2 3)")
+    parser.add_argument("--runs", type=int, default=20, help="number of coupled pairs of chains (default: 20)")
+    parser.add_argument("--max-sweeps", type=int, default=10000,
+                        help="maximum number of sweeps of a pair of chains (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random numbers (default: 0)")
+    instrumentation.add_arguments(parser)
+    table_store.add_arguments(parser)
+    arguments = parser.parse_args()
+    instrumentation.configure_from_arguments(arguments)
+    table_store.configure_from_arguments(arguments)
+
+    print("PYTHON VERSION:\n" + sys.version)
+
+    if numpy is None:
+        print("NumPy is not installed, but needed for the simulation.")
+        return
+
+    rows, columns = arguments.size
+    if arguments.grid == "rectangular":
+        neighbors = rectangular_torus(rows, columns)
+    else:
+        neighbors = hexagonal_torus(rows, columns)
+
+    if arguments.dynamics == "single-site":
+        blocks = single_site_blocks(len(neighbors))
+        description = "single-site dynamics"
+    elif arguments.grid == "rectangular":
+        width, height = arguments.block_size
+        blocks = rectangular_blocks(rows, columns, width, height)
+        description = "(" + str(width) + "x" + str(height) + ")-block dynamics"
+    else:
+        blocks = hexagonal_blocks(rows, columns)
+        description = "hexagon block dynamics"
+
+    for k in arguments.k:
+        dynamics = BlockDynamics(k, neighbors, blocks)
+        progress = instrumentation.Progress("markov_chain", total=arguments.max_sweeps, unit="sweeps", k=k,
+                                            grid=arguments.grid, size=arguments.size, dynamics=arguments.dynamics)
+        times = dynamics.coalescence_times(arguments.runs, arguments.max_sweeps, arguments.seed, progress)
+        instrumentation.write_record({"name": "markov_chain result", "k": k, "grid": arguments.grid,
+                                      "size": arguments.size, "dynamics": arguments.dynamics,
+                                      "coalescence_times": times})
+
+        print("Coalescence times for k=" + str(k) + ", " + description + " on the " + str(rows) + "x" + str(columns)
+              + " " + arguments.grid + " torus, " + str(arguments.runs) + " runs: "
+              + summarize(times, arguments.max_sweeps))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
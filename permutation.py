@@ -0,0 +1,69 @@
+# This code provides seeded pseudo-random permutations of the integers 0, ..., n - 1 that are evaluated index by index,
+# so that a large index space can be traversed in a random order without materializing and shuffling a list. The
+# permutation is a Feistel network on the integers with 2 * half_bits bits, where 2^(2 * half_bits) is the smallest
+# even power of two that is at least n. A Feistel network is a bijection for every round function. Results that are not
+# smaller than n are mapped again until they are ("cycle walking"), which restricts the bijection to 0, ..., n - 1.
+# Since 2^(2 * half_bits) < 4n, this takes less than four evaluations of the network on average.
+
+
+import random
+
+
+_MASK_64 = (1 << 64) - 1
+
+
+class SeededPermutation:
+
+    def __init__(self, n, seed, number_rounds=4):
+
+        """
+        :param n:               Size of the permuted index space 0, ..., n - 1
+        :param seed:            Seed of the round keys. The permutation only depends on n, seed and number_rounds.
+        :param number_rounds:   Number of rounds of the Feistel network
+        """
+
+        self.n = n
+        self.half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half_bits) - 1
+
+        generator = random.Random(seed)
+        self.round_keys = [generator.getrandbits(64) for _ in range(number_rounds)]
+
+    def __len__(self):
+        return self.n
+
+    def round_function(self, x, round_key):
+
+        # An integer hash (multiplication by an odd constant followed by xor-shifts), truncated to half_bits bits.
+
+        x = ((x + round_key) * 0x9E3779B97F4A7C15) & _MASK_64
+        x ^= x >> 29
+        x = (x * 0xBF58476D1CE4E5B9) & _MASK_64
+        x ^= x >> 32
+        return x & self.half_mask
+
+    def encrypt(self, x):
+
+        """
+        :return:    The image of x under the Feistel network on 0, ..., 2^(2 * half_bits) - 1
+        """
+
+        left = x >> self.half_bits
+        right = x & self.half_mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self.round_function(right, round_key)
+        return (left << self.half_bits) | right
+
+    def __call__(self, index):
+
+        """
+        :return:    The image of index under the permutation of 0, ..., n - 1
+        """
+
+        if not 0 <= index < self.n:
+            raise IndexError("index " + str(index) + " out of range(" + str(self.n) + ")")
+
+        x = self.encrypt(index)
+        while x >= self.n:
+            x = self.encrypt(x)
+        return x
@@ -0,0 +1,324 @@
+# This code computes the block divergence of rectangular (width x height)-blocks in toroidal rectangular grids; see
+# rectangular_grid.py for the case of (4x4)-blocks. The boundary of the block consists of four sides: the front and
+# the back side have width vertices and are indexed from left to right, the left and the right side have height
+# vertices and are indexed from front to back. The vertices of a side form a path, and the two end vertices of
+# neighboring sides have distance 2, hence they can differ by at most two.
+#
+# The expected weights are computed by the row-by-row dynamic program of transfer_matrix.py. The rows are always chosen
+# parallel to the shorter sides of the block, so that the cost is exponential only in the shorter dimension. If the
+# block is wider than high, the block is transposed internally, i.e. front and left side as well as back and right
+# side swap their roles.
+#
+# For computing the block divergence, only boundary positions that are distinct under the symmetries of the rectangle
+# are considered, and only one cover relation of every pair of cover relations that are mapped to each other by the
+# value flip h -> k - h; see symmetry.py .
+
+
+import argparse
+import itertools
+import sys
+from fractions import Fraction
+
+import exact
+import generic_block
+import symmetry
+from transfer_matrix import TransferMatrix, compute_strips
+
+
+def flip_boundary_group(k, boundary_group):
+
+    return tuple(symmetry.flip(side, k) for side in boundary_group)
+
+
+def is_canonical_boundary_group(k, boundary_group):
+
+    """
+    :param boundary_group:  Tuple (left, right, back) of k-strips
+    :return:                True iff the boundary vertices at distance 2 differ by at most two and the group is not
+                            larger than its flipped group
+    """
+
+    boundary_left, boundary_right, boundary_back = boundary_group
+    if abs(boundary_right[-1] - boundary_back[-1]) > 2:
+        return False
+    if abs(boundary_back[0] - boundary_left[-1]) > 2:
+        return False
+    return flip_boundary_group(k, boundary_group) >= boundary_group
+
+
+def compute_boundary_groups(k, side_strips, back_strips):
+
+    """
+    Computes all combinations of left, right and back side of a boundary restriction in which the boundary vertices at
+    distance 2 differ by at most two, up to the value flip.
+    :param k:               The k of the k-heights
+    :param side_strips:     All k-strips that are possible for the left and the right side
+    :param back_strips:     All k-strips that are possible for the back side
+    :return:                List of tuples (left, right, back) in a deterministic order
+    """
+
+    return [boundary_group for boundary_group in itertools.product(side_strips, side_strips, back_strips)
+            if is_canonical_boundary_group(k, boundary_group)]
+
+
+def compute_boundary_fronts_by_corners(k, front_strips):
+
+    """
+    :return:    Dictionary which maps the pair (first value of the left side, first value of the right side) to the list
+                of all front sides that differ by at most two from these values at their ends.
+    """
+
+    boundary_fronts_by_corners = dict()
+    for boundary_left_corner in range(k + 1):
+        for boundary_right_corner in range(k + 1):
+            boundary_fronts_by_corners[(boundary_left_corner, boundary_right_corner)] = [
+                boundary_front for boundary_front in front_strips
+                if abs(boundary_front[-1] - boundary_right_corner) <= 2
+                and abs(boundary_front[0] - boundary_left_corner) <= 2]
+
+    return boundary_fronts_by_corners
+
+
+def augment_front(k, boundary_front, boundary_left, boundary_right, augmentation_vertex):
+
+    """
+    Augments the front side of a boundary restriction at the given vertex by one.
+    :return:    The augmented front side, or None if the augmented boundary restriction is not valid
+    """
+
+    if boundary_front[augmentation_vertex] == k:
+        return None
+
+    augmented_boundary_front = boundary_front[:augmentation_vertex] + (boundary_front[augmentation_vertex] + 1,) \
+        + boundary_front[augmentation_vertex + 1:]
+
+    for i in range(len(augmented_boundary_front) - 1):
+        if abs(augmented_boundary_front[i] - augmented_boundary_front[i + 1]) > 1:
+            return None
+    if abs(augmented_boundary_front[0] - boundary_left[0]) > 2:
+        return None
+    if abs(augmented_boundary_front[-1] - boundary_right[0]) > 2:
+        return None
+
+    return augmented_boundary_front
+
+
+class RectangularBlock:
+
+    def __init__(self, k, width, height):
+
+        """
+        :param k:           The k of the k-heights
+        :param width:       Number of vertices of the block on its front and on its back side
+        :param height:      Number of vertices of the block on its left and on its right side
+        """
+
+        self.k = k
+        self.width = width
+        self.height = height
+        self.number_vertices = width * height
+
+        self.is_transposed = width > height
+        if self.is_transposed:
+            self.transfer_matrix = TransferMatrix(k, height, width)
+        else:
+            self.transfer_matrix = TransferMatrix(k, width, height)
+
+        self.front_strips = compute_strips(k, width)
+        self.side_strips = compute_strips(k, height)
+
+    def count_and_weight(self, front, left, right, back):
+
+        """
+        Counts the fillings of the block that are admissible with respect to the boundary constraint and sums up their
+        weights.
+        :return:    Tuple of integers (number of admissible fillings, total weight of admissible fillings)
+        """
+
+        if self.is_transposed:
+            return self.transfer_matrix.count_and_weight(left, front, back, right)
+        return self.transfer_matrix.count_and_weight(front, left, right, back)
+
+    def expected_weight(self, front, left, right, back):
+
+        """
+        Computes the expected weight of a filling uniformly chosen at random from all fillings that are compatible with
+        the boundary constraint. Raises a NoAdmissibleFilling exception if there is no such filling.
+        :return:    Float. Expected weight.
+        """
+
+        count, weight = self.count_and_weight(front, left, right, back)
+
+        if count == 0:
+            raise generic_block.NoAdmissibleFilling()
+
+        return weight / count
+
+    def boundary_positions(self):
+
+        """
+        :return:    List of the boundary positions that are distinct under the symmetries of the block, given as tuples
+                    (side, index) with side "front" or "left".
+        """
+
+        positions = [("front", index) for index in range((self.width + 1) // 2)]
+        if self.width != self.height:
+            positions += [("left", index) for index in range((self.height + 1) // 2)]
+        return positions
+
+    def block_divergence(self, side, index, report=None, is_exact=False):
+
+        """
+        Computes the maximum expected weight difference over all cover relations that differ on the given boundary
+        position.
+        :param side:        "front" or "left"
+        :param index:       Index of the augmented vertex on the side
+        :param report:      Function that is called with a progress message every 1000 boundary constraints, or None
+        :param is_exact:    Whether the expected weight differences are compared exactly, see exact.py
+        :return:            Tuple (maximum expected weight difference, witness). The witness is a dictionary containing
+                            the four sides of the lower boundary constraint of a maximizing cover relation. The maximum
+                            is a fractions.Fraction in exact mode and a float otherwise.
+        """
+
+        if side == "left":
+            # Transposing the block maps the left side to the front side.
+            transposed_block = RectangularBlock(self.k, self.height, self.width)
+            max_block_divergence, witness = transposed_block.block_divergence("front", index, report, is_exact)
+            if witness is not None:
+                witness = {"front": witness["left"], "left": witness["front"], "right": witness["back"],
+                           "back": witness["right"]}
+            return max_block_divergence, witness
+
+        k = self.k
+        boundary_groups = compute_boundary_groups(k, self.side_strips, self.front_strips)
+        boundary_fronts_by_corners = compute_boundary_fronts_by_corners(k, self.front_strips)
+
+        number_boundary_constraints = 0
+        for boundary_left, boundary_right, boundary_back in boundary_groups:
+            number_boundary_constraints += len(boundary_fronts_by_corners[(boundary_left[0], boundary_right[0])])
+
+        max_block_divergence = 0
+        witness = None
+        exact_maximum = exact.ExactMaximum()
+        r = 0
+
+        for boundary_group in boundary_groups:
+
+            boundary_left, boundary_right, boundary_back = boundary_group
+            is_self_flipped = flip_boundary_group(k, boundary_group) == boundary_group
+
+            # If the rows are parallel to the front, the dynamic program is run once from the back for the whole group,
+            # and the front is only contracted afterwards. Otherwise, every boundary constraint needs its own run.
+
+            if not self.is_transposed:
+                messages = self.transfer_matrix.backward_messages(boundary_left, boundary_right, boundary_back)
+
+            def evaluate(boundary_front):
+                if self.is_transposed:
+                    return self.count_and_weight(boundary_front, boundary_left, boundary_right, boundary_back)
+                return self.transfer_matrix.contract(messages, boundary_front)
+
+            for boundary_front in boundary_fronts_by_corners[(boundary_left[0], boundary_right[0])]:
+
+                if report is not None and (r % 1000) == 0:
+                    report("Processing " + str(r) + "th boundary constraint out of " + str(number_boundary_constraints)
+                           + " in total. Max block divergence found so far: " + str(max_block_divergence))
+                r += 1
+
+                augmented_boundary_front = augment_front(k, boundary_front, boundary_left, boundary_right, index)
+                if augmented_boundary_front is None:
+                    continue
+
+                if is_self_flipped and symmetry.flipped_cover_relation(boundary_front, index, k) < boundary_front:
+                    # the flipped cover relation is considered instead
+                    continue
+
+                number_without_augmentation, weight_without_augmentation = evaluate(boundary_front)
+                if number_without_augmentation == 0:
+                    continue
+                number_with_augmentation, weight_with_augmentation = evaluate(augmented_boundary_front)
+                if number_with_augmentation == 0:
+                    continue
+
+                if is_exact:
+                    if exact_maximum.update(number_without_augmentation, weight_without_augmentation,
+                                            number_with_augmentation, weight_with_augmentation):
+                        max_block_divergence = exact_maximum.numerator / exact_maximum.denominator
+                        witness = {"front": boundary_front, "left": boundary_left, "right": boundary_right,
+                                   "back": boundary_back}
+                    continue
+
+                # The flipped cover relation has the same expected weight difference. We nevertheless evaluate it from
+                # the number and weight of the admissible fillings as well, such that the floating point result is
+                # exactly the one that we would obtain when computing it separately.
+
+                flipped_number_without_augmentation, flipped_weight_without_augmentation = \
+                    symmetry.flip_count_and_weight(number_with_augmentation, weight_with_augmentation, k,
+                                                   self.number_vertices)
+                flipped_number_with_augmentation, flipped_weight_with_augmentation = \
+                    symmetry.flip_count_and_weight(number_without_augmentation, weight_without_augmentation, k,
+                                                   self.number_vertices)
+
+                expected_weight_differences = [
+                    weight_with_augmentation / number_with_augmentation
+                    - weight_without_augmentation / number_without_augmentation,
+                    flipped_weight_with_augmentation / flipped_number_with_augmentation
+                    - flipped_weight_without_augmentation / flipped_number_without_augmentation,
+                ]
+
+                for is_flipped, expected_weight_difference in enumerate(expected_weight_differences):
+                    if expected_weight_difference > max_block_divergence:
+                        max_block_divergence = expected_weight_difference
+                        if is_flipped:
+                            witness_left, witness_right, witness_back = flip_boundary_group(k, boundary_group)
+                            witness = {"front": symmetry.flipped_cover_relation(boundary_front, index, k),
+                                       "left": witness_left, "right": witness_right, "back": witness_back}
+                        else:
+                            witness = {"front": boundary_front, "left": boundary_left, "right": boundary_right,
+                                       "back": boundary_back}
+
+        if is_exact:
+            return exact_maximum.value(), witness
+
+        return max_block_divergence, witness
+
+
+def format_result(result):
+
+    if isinstance(result, Fraction):
+        return str(result) + " = " + str(float(result))
+    return str(result)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Computes the block divergence of rectangular blocks in toroidal "
+                                                 "rectangular grid graphs for every boundary position that is distinct "
+                                                 "under symmetry.")
+    parser.add_argument("--width", type=int, required=True, help="number of vertices on the front side")
+    parser.add_argument("--height", type=int, required=True, help="number of vertices on the left side")
+    parser.add_argument("--k", type=int, nargs="+", default=[2], help="values of k (default: 2)")
+    parser.add_argument("--exact", action="store_true",
+                        help="compare expected weight differences exactly and report the results as fractions")
+    arguments = parser.parse_args()
+
+    print("PYTHON VERSION:\n" + sys.version)
+
+    for k in arguments.k:
+
+        print("CASE k = " + str(k) + ", BLOCK " + str(arguments.width) + " x " + str(arguments.height))
+
+        block = RectangularBlock(k, arguments.width, arguments.height)
+        max_block_divergence = 0
+
+        for side, index in block.boundary_positions():
+            result, witness = block.block_divergence(side, index, is_exact=arguments.exact)
+            print("Augmentation at " + side + " vertex " + str(index) + ": " + format_result(result) + "; witness: "
+                  + str(witness))
+            max_block_divergence = max(max_block_divergence, result)
+
+        print("BLOCK DIVERGENCE IN CASE k = " + str(k) + ": " + format_result(max_block_divergence))
+
+
+if __name__ == "__main__":
+    main()
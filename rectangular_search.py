@@ -0,0 +1,252 @@
+# This code searches for boundary restrictions of the (4x4)-block in rectangular grids (see rectangular_grid.py) with a
+# large expected weight difference, in order to obtain lower bounds on the block divergence for values of k for which
+# the complete sweep over all boundary restrictions is infeasible. It is an anytime method: every value it reports is
+# the expected weight difference of an actual cover relation, which is reported as witness, hence a lower bound.
+#
+# A state of the search is a boundary restriction (front, left, right, back). Its value is the maximum expected weight
+# difference over the cover relations that augment its 0-th or 1-th front vertex (see rectangular_sweep.py); states
+# that cannot be extended to the block are not visited. A move changes one of the 16 boundary values by +1 or -1 such
+# that the boundary restriction stays valid. Every restart begins with a random constant boundary restriction and runs
+# simulated annealing, with a temperature that decreases geometrically from start_temperature to end_temperature;
+# with temperature 0, this is hill climbing. Number and weight of the admissible fillings are computed by the same
+# dynamic program as in the sweep, and the backward messages are shared by all moves that only change the front side.
+#
+# The restarts are independent and are run in parallel by a pool of processes. Whenever a restart finishes with a new
+# best value, this value is reported together with its witness and the elapsed time.
+
+
+import math
+import multiprocessing
+import random
+import threading
+import time
+
+import instrumentation
+from rectangular_sweep import augmented_fronts, encode_boundary_constraint, get_transfer_matrix
+
+
+def is_valid_boundary(k, boundary):
+
+    """
+    :param boundary:    List [front, left, right, back] of lists of boundary values, see TransferMatrix.count_and_weight
+    :return:            True iff all values are in 0, ..., k, successive values on a side differ by at most one, and
+                        the values at the two ends of a corner differ by at most two
+    """
+
+    front, left, right, back = boundary
+
+    for side in boundary:
+        if any(value < 0 or value > k for value in side):
+            return False
+        if any(abs(side[i] - side[i + 1]) > 1 for i in range(len(side) - 1)):
+            return False
+
+    return abs(front[0] - left[0]) <= 2 and abs(front[-1] - right[0]) <= 2 and abs(back[0] - left[-1]) <= 2 \
+        and abs(back[-1] - right[-1]) <= 2
+
+
+class BoundaryEvaluator:
+
+    def __init__(self, k, number_cached_messages=64):
+
+        """
+        Evaluates boundary restrictions of the (4x4)-block, see evaluate().
+        :param number_cached_messages:  Number of backward messages that are kept, see the comment at the beginning
+        """
+
+        self.k = k
+        self.transfer_matrix = get_transfer_matrix(k)
+        self.number_cached_messages = number_cached_messages
+        self.messages = dict()
+        self.number_evaluations = 0
+
+    def backward_messages(self, left, right, back):
+
+        key = (left, right, back)
+        if key not in self.messages:
+            if len(self.messages) >= self.number_cached_messages:
+                self.messages.clear()
+            self.messages[key] = self.transfer_matrix.backward_messages(left, right, back)
+        return self.messages[key]
+
+    def evaluate(self, boundary):
+
+        """
+        :param boundary:    Valid boundary restriction [front, left, right, back]
+        :return:            None if the boundary restriction cannot be extended to the block. Otherwise, the tuple
+                            (maximum expected weight difference, augmentation vertex) over the cover relations that
+                            augment its 0-th or 1-th front vertex, or (0, None) if there is no such cover relation.
+        """
+
+        self.number_evaluations += 1
+        front, left, right, back = (tuple(side) for side in boundary)
+        messages = self.backward_messages(left, right, back)
+
+        number_without_augmentation, weight_without_augmentation = self.transfer_matrix.contract(messages, front)
+        if number_without_augmentation == 0:
+            return None
+
+        result = (0, None)
+        for augmentation_vertex, augmented_front in augmented_fronts(self.k, front, left):
+            number_with_augmentation, weight_with_augmentation = self.transfer_matrix.contract(messages,
+                                                                                               augmented_front)
+            if number_with_augmentation == 0:
+                continue
+            expected_weight_difference = weight_with_augmentation / number_with_augmentation \
+                - weight_without_augmentation / number_without_augmentation
+            if expected_weight_difference > result[0]:
+                result = (expected_weight_difference, augmentation_vertex)
+
+        return result
+
+
+def run_restart(k, restart, seed=0, number_steps=2000, start_temperature=0.05, end_temperature=0.0005,
+                deadline=None):
+
+    """
+    Runs one restart of the simulated annealing, see the comment at the beginning.
+    :param restart:             Index of the restart; together with seed, it determines the random numbers
+    :param number_steps:        Number of proposed moves
+    :param start_temperature:   Temperature of the first move; 0 for hill climbing
+    :param end_temperature:     Temperature of the last move
+    :param deadline:            Time (as time.time()) after which the restart is stopped early, or None
+    :return:                    Dictionary with the index of the restart, the best value, its witness and the number of
+                                evaluated boundary restrictions
+    """
+
+    generator = random.Random(str(seed) + "/" + str(restart))
+    evaluator = BoundaryEvaluator(k)
+
+    value = generator.randint(0, k)
+    boundary = [[value] * 4 for _ in range(4)]
+    current, augmentation_vertex = evaluator.evaluate(boundary)
+    best = (current, augmentation_vertex, [list(side) for side in boundary])
+
+    for step in range(number_steps):
+
+        if deadline is not None and time.time() >= deadline:
+            break
+
+        side = generator.randrange(4)
+        i = generator.randrange(4)
+        delta = generator.choice((-1, 1))
+        boundary[side][i] += delta
+
+        evaluation = evaluator.evaluate(boundary) if is_valid_boundary(k, boundary) else None
+
+        is_accepted = False
+        if evaluation is not None:
+            difference = evaluation[0] - current
+            temperature = 0
+            if start_temperature > 0:
+                temperature = start_temperature * (end_temperature / start_temperature) ** (step / number_steps)
+            is_accepted = difference >= 0 or (temperature > 0
+                                              and generator.random() < math.exp(difference / temperature))
+
+        if not is_accepted:
+            boundary[side][i] -= delta
+            continue
+
+        current = evaluation[0]
+        if current > best[0]:
+            best = (current, evaluation[1], [list(side) for side in boundary])
+
+    best_value, best_augmentation_vertex, (front, left, right, back) = best
+    witness = None
+    if best_augmentation_vertex is not None:
+        witness = {"boundary_constraint": list(encode_boundary_constraint(tuple(front), tuple(left), tuple(right),
+                                                                          tuple(back))),
+                   "augmentation_vertex": best_augmentation_vertex}
+
+    return {"restart": restart, "best": best_value, "witness": witness,
+            "number_evaluations": evaluator.number_evaluations}
+
+
+def _run_restart_star(arguments):
+
+    # The last argument are the settings of the instrumentation, which worker processes do not necessarily inherit.
+
+    instrumentation.configure(**arguments[-1])
+    return run_restart(*arguments[:-1])
+
+
+def search(k, time_limit, number_restarts=None, processes=1, seed=0, number_steps=2000, start_temperature=0.05,
+           end_temperature=0.0005, report=print):
+
+    """
+    Runs restarts of the simulated annealing in parallel until the time limit is reached or number_restarts restarts
+    are finished, and reports every improvement of the best value.
+    :param k:                   The k of the k-heights
+    :param time_limit:          Number of seconds after which no further restart is begun and running restarts stop
+    :param number_restarts:     Maximum number of restarts, or None for no limit
+    :param processes:           Number of worker processes
+    :param seed:                Seed of the random numbers
+    :param report:              Function that is called with a message for every improvement, or None
+    :return:                    Tuple (best value, witness), where the value is a lower bound on the block divergence
+    """
+
+    start_time = time.time()
+    deadline = start_time + time_limit
+    progress = instrumentation.Progress("rectangular_search", total=number_restarts, unit="restarts", k=k)
+
+    # The pool takes the arguments from the generator in a separate thread as fast as it can. The semaphore keeps the
+    # generator at most two restarts per process ahead of the finished restarts.
+
+    number_pending_restarts = threading.Semaphore(2 * processes)
+    is_stopped = threading.Event()
+
+    def arguments():
+        restart = 0
+        while number_restarts is None or restart < number_restarts:
+            number_pending_restarts.acquire()
+            if is_stopped.is_set() or time.time() >= deadline:
+                return
+            yield (k, restart, seed, number_steps, start_temperature, end_temperature, deadline,
+                   instrumentation.get_settings())
+            restart += 1
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_run_restart_star, arguments())
+    else:
+        pool = None
+        results = map(_run_restart_star, arguments())
+
+    best = 0
+    witness = None
+    number_finished_restarts = 0
+    number_evaluations = 0
+    is_complete = False
+
+    try:
+        for result in results:
+            number_pending_restarts.release()
+            number_finished_restarts += 1
+            number_evaluations += result["number_evaluations"]
+            if result["best"] > best:
+                best = result["best"]
+                witness = result["witness"]
+                instrumentation.write_record({"name": "rectangular_search improvement", "k": k,
+                                              "elapsed": time.time() - start_time, "restart": result["restart"],
+                                              "best": best, "witness": witness})
+                if report is not None:
+                    report("After " + format(time.time() - start_time, ".1f") + " seconds (restart "
+                           + str(result["restart"]) + "): lower bound " + str(best) + ", witness " + str(witness))
+            progress.update(number_finished_restarts, best, witness, evaluations=number_evaluations)
+        is_complete = True
+    finally:
+        # The generator may be waiting for the semaphore in the task handler thread of the pool; it is woken up and
+        # stops, so that the pool can be joined.
+        is_stopped.set()
+        number_pending_restarts.release()
+        if pool is not None:
+            if is_complete:
+                pool.close()
+            else:
+                # A restart raised an exception or the run was interrupted.
+                pool.terminate()
+            pool.join()
+
+    progress.update(number_finished_restarts, best, witness, is_final=True, evaluations=number_evaluations)
+
+    return best, witness
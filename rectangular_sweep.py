@@ -0,0 +1,402 @@
+# This code runs the search over all boundary restrictions of the (4x4)-block in rectangular grids (see
+# rectangular_grid.py) as a sharded sweep. The boundary restrictions are grouped by their left, right and back side, and
+# the groups are distributed to shards deterministically, i.e. the content of a shard depends only on k, on the number
+# of shards and on the index of the shard. A group is identified by its index in the product of three lists of k-strips.
+# The index space is traversed in a pseudo-random order that is given by a seeded permutation (see permutation.py), and
+# shard s processes the positions s, s + number_shards, s + 2 * number_shards, ... of this order. Hence, the groups are
+# never materialized in memory, and every shard still sees a random sample of all groups. The shards can be processed
+# in parallel by a pool of processes. If a checkpoint directory is given, every shard regularly writes its progress,
+# its running maximum and the corresponding witness to a checkpoint file, so that an interrupted run can be resumed and
+# a run on a subset of the shards can be extended later on by the remaining shards.
+#
+# The value flip h -> k - h maps the cover relation (l, u) to the cover relation (k - u, k - l) with the same expected
+# weight difference, and it maps a group of boundary restrictions with left, right and back side (L, R, B) to the group
+# (k - L, k - R, k - B). Therefore, only the groups that are not larger than their flipped group are processed. A group
+# that is mapped to itself is processed completely, but within the group, only one cover relation of every pair of
+# flipped cover relations is considered. (The reflection of the block that fixes the front side has already been used
+# for restricting the augmentation to the 0-th and 1-th front vertex.)
+#
+# In exact mode, the expected weight differences are compared by integer cross-multiplication instead of floating point
+# arithmetic, and the maximum is kept as numerator and denominator; see exact.py .
+
+
+import json
+import multiprocessing
+import os
+import time
+
+import exact
+import instrumentation
+import symmetry
+from permutation import SeededPermutation
+from rectangular_block import compute_boundary_fronts_by_corners, flip_boundary_group, is_canonical_boundary_group
+from transfer_matrix import TransferMatrix
+
+
+# Transfer matrices are cached per process, such that a worker process builds them only once per k.
+_transfer_matrices = dict()
+
+
+def get_transfer_matrix(k):
+
+    """
+    :return:    The transfer matrix of the (4x4)-block for the given k. As in the dynamic program that produced our
+                published results, the last row is checked against the first three vertices of the back side.
+    """
+
+    if k not in _transfer_matrices:
+        _transfer_matrices[k] = TransferMatrix(k, width=4, height=4, back_columns=range(3))
+    return _transfer_matrices[k]
+
+
+def augmented_fronts(k, boundary_front, boundary_left):
+
+    """
+    Computes all front sides that arise from boundary_front by augmenting its 0-th or its 1-th vertex by one such that
+    the boundary restriction stays valid (the other cases are symmetric).
+    :return:    List of tuples (augmentation vertex, augmented front)
+    """
+
+    result = []
+
+    # augment 0-th front vertex if possible
+
+    if boundary_front[0] != k:
+        augmented_boundary_front = (boundary_front[0] + 1,) + boundary_front[1:]
+
+        if not (abs(augmented_boundary_front[0] - augmented_boundary_front[1]) > 1) \
+                and not (abs(augmented_boundary_front[0] - boundary_left[0]) > 2):
+            # is still a valid boundary after augmentation
+            result.append((0, augmented_boundary_front))
+
+    # augment 1-th front vertex if possible
+
+    if boundary_front[1] != k:
+        augmented_boundary_front = boundary_front[:1] + (boundary_front[1] + 1,) + boundary_front[2:]
+
+        if not (abs(augmented_boundary_front[1] - augmented_boundary_front[2]) > 1) \
+                and not (abs(augmented_boundary_front[0] - augmented_boundary_front[1]) > 1):
+            # is still a valid boundary after augmentation
+            result.append((1, augmented_boundary_front))
+
+    return result
+
+
+def decode_boundary_group(k_strips, index):
+
+    """
+    :return:    The tuple (left, right, back) with the given index in the product of three copies of k_strips
+    """
+
+    number_strips = len(k_strips)
+    return (k_strips[index // (number_strips * number_strips)], k_strips[(index // number_strips) % number_strips],
+            k_strips[index % number_strips])
+
+
+def encode_boundary_constraint(boundary_front, boundary_left, boundary_right, boundary_back):
+
+    """
+    :return:    The boundary restriction as 16-tuple in counterclockwise order starting with the front side.
+    """
+
+    return boundary_front + boundary_right + boundary_back[::-1] + boundary_left[::-1]
+
+
+def checkpoint_path(checkpoint_directory, k, shard, number_shards, is_exact):
+
+    return os.path.join(checkpoint_directory, "rectangular_grid_k" + str(k) + "_shard" + str(shard) + "_of"
+                        + str(number_shards) + ("_exact" if is_exact else "") + ".json")
+
+
+def read_checkpoint(checkpoint_directory, k, shard, number_shards, is_exact=False):
+
+    """
+    :return:    The content of the checkpoint file of the shard, or None if there is no such file.
+    """
+
+    if checkpoint_directory is None:
+        return None
+
+    path = checkpoint_path(checkpoint_directory, k, shard, number_shards, is_exact)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_checkpoint(checkpoint_directory, checkpoint):
+
+    # Write to a temporary file first and rename it afterwards, such that an interruption never leaves a broken
+    # checkpoint file behind.
+
+    path = checkpoint_path(checkpoint_directory, checkpoint["k"], checkpoint["shard"], checkpoint["number_shards"],
+                           checkpoint["exact"])
+    with open(path + ".tmp", "w") as file:
+        json.dump(checkpoint, file)
+    os.replace(path + ".tmp", path)
+
+
+def run_shard(k, shard, number_shards, checkpoint_directory=None, checkpoint_interval=60.0, report=None,
+              is_exact=False):
+
+    """
+    Computes the maximum expected weight difference over all cover relations whose boundary group belongs to the shard.
+    If a checkpoint of the shard exists, the computation is resumed from there.
+    :param k:                       The k of the k-heights
+    :param shard:                   Index of the shard, 0 <= shard < number_shards
+    :param number_shards:           Total number of shards
+    :param checkpoint_directory:    Directory for checkpoint files, or None for not writing checkpoints
+    :param checkpoint_interval:     Number of seconds between two checkpoints
+    :param report:                  Function that is called with a throttled progress message, or None; see
+                                    instrumentation.py
+    :param is_exact:                Whether the expected weight differences are compared exactly. The checkpoint then
+                                    additionally contains numerator and denominator of the maximum.
+    :return:                        The final checkpoint of the shard as dictionary
+    """
+
+    transfer_matrix = get_transfer_matrix(k)
+    k_strips = transfer_matrix.strips
+    boundary_fronts_by_corners = compute_boundary_fronts_by_corners(k, k_strips)
+
+    # The groups are processed in a random order (see rectangular_grid.py), but the permutation is seeded by k only,
+    # such that the order does not change when the shard is resumed. Positions whose group is not valid or not
+    # canonical are skipped.
+
+    permutation = SeededPermutation(len(k_strips) ** 3, "rectangular_grid/" + str(k))
+    shard_positions = range(shard, len(permutation), number_shards)
+
+    checkpoint = read_checkpoint(checkpoint_directory, k, shard, number_shards, is_exact)
+    if checkpoint is None:
+        checkpoint = {
+            "k": k,
+            "shard": shard,
+            "number_shards": number_shards,
+            "exact": is_exact,
+            "max_numerator": 0,
+            "max_denominator": 1,
+            "number_groups": len(shard_positions),
+            "processed_groups": 0,
+            "processed_boundary_constraints": 0,
+            "max_block_divergence": 0,
+            "witness": None,
+        }
+
+    last_checkpoint_time = time.time()
+
+    r = checkpoint["processed_boundary_constraints"]
+    max_block_divergence = checkpoint["max_block_divergence"]
+    exact_maximum = exact.ExactMaximum(checkpoint["max_numerator"], checkpoint["max_denominator"], checkpoint["witness"])
+
+    progress = instrumentation.Progress("rectangular_grid shard", total=len(shard_positions), unit="groups",
+                                        report=report, processed=checkpoint["processed_groups"], k=k, shard=shard,
+                                        number_shards=number_shards)
+    backward_messages_timer = instrumentation.Timer("TransferMatrix.backward_messages")
+    contract_timer = instrumentation.Timer("TransferMatrix.contract")
+    backward_messages = backward_messages_timer.wrap(transfer_matrix.backward_messages)
+    contract = contract_timer.wrap(transfer_matrix.contract)
+
+    with instrumentation.profiled("rectangular_grid_k" + str(k) + "_shard" + str(shard)):
+
+        for position in shard_positions[checkpoint["processed_groups"]:]:
+
+            boundary_group = decode_boundary_group(k_strips, permutation(position))
+            boundary_left, boundary_right, boundary_back = boundary_group
+
+            if is_canonical_boundary_group(k, boundary_group):
+                boundary_fronts = boundary_fronts_by_corners[(boundary_left[0], boundary_right[0])]
+                messages = backward_messages(boundary_left, boundary_right, boundary_back)
+                is_self_flipped = flip_boundary_group(k, boundary_group) == boundary_group
+            else:
+                boundary_fronts = []
+
+            for boundary_front in boundary_fronts:
+
+                r += 1
+
+                number_without_augmentation, weight_without_augmentation = contract(messages, boundary_front)
+                if number_without_augmentation == 0:
+                    continue
+
+                for augmentation_vertex, augmented_boundary_front in augmented_fronts(k, boundary_front, boundary_left):
+
+                    if is_self_flipped and \
+                            symmetry.flipped_cover_relation(boundary_front, augmentation_vertex, k) < boundary_front:
+                        # the flipped cover relation is considered instead
+                        continue
+
+                    number_with_augmentation, weight_with_augmentation = contract(messages, augmented_boundary_front)
+                    if number_with_augmentation == 0:
+                        continue
+
+                    if is_exact:
+                        if exact_maximum.update(number_without_augmentation, weight_without_augmentation,
+                                                number_with_augmentation, weight_with_augmentation):
+                            max_block_divergence = exact_maximum.numerator / exact_maximum.denominator
+                            exact_maximum.witness = {
+                                "boundary_constraint": list(encode_boundary_constraint(boundary_front, boundary_left,
+                                                                                       boundary_right, boundary_back)),
+                                "augmentation_vertex": augmentation_vertex,
+                            }
+                        continue
+
+                    # The flipped cover relation has the same expected weight difference. We nevertheless evaluate it
+                    # from the number and weight of the admissible fillings as well, such that the floating point result
+                    # is exactly the one that we would obtain when computing it separately.
+
+                    flipped_number_without_augmentation, flipped_weight_without_augmentation = \
+                        symmetry.flip_count_and_weight(number_with_augmentation, weight_with_augmentation, k, 16)
+                    flipped_number_with_augmentation, flipped_weight_with_augmentation = \
+                        symmetry.flip_count_and_weight(number_without_augmentation, weight_without_augmentation, k, 16)
+
+                    expected_weight_differences = [
+                        weight_with_augmentation / number_with_augmentation
+                        - weight_without_augmentation / number_without_augmentation,
+                        flipped_weight_with_augmentation / flipped_number_with_augmentation
+                        - flipped_weight_without_augmentation / flipped_number_without_augmentation,
+                    ]
+
+                    for is_flipped, expected_weight_difference in enumerate(expected_weight_differences):
+                        if expected_weight_difference > max_block_divergence:
+                            max_block_divergence = expected_weight_difference
+                            if is_flipped:
+                                witness_front = symmetry.flipped_cover_relation(boundary_front, augmentation_vertex, k)
+                                witness_left, witness_right, witness_back = flip_boundary_group(
+                                    k, (boundary_left, boundary_right, boundary_back))
+                            else:
+                                witness_front = boundary_front
+                                witness_left, witness_right, witness_back = boundary_left, boundary_right, boundary_back
+                            checkpoint["witness"] = {
+                                "boundary_constraint": list(encode_boundary_constraint(witness_front, witness_left,
+                                                                                       witness_right, witness_back)),
+                                "augmentation_vertex": augmentation_vertex,
+                            }
+
+            checkpoint["processed_groups"] += 1
+            checkpoint["processed_boundary_constraints"] = r
+            checkpoint["max_block_divergence"] = max_block_divergence
+            if is_exact:
+                checkpoint["max_numerator"] = exact_maximum.numerator
+                checkpoint["max_denominator"] = exact_maximum.denominator
+                checkpoint["witness"] = exact_maximum.witness
+
+            if checkpoint_directory is not None and time.time() - last_checkpoint_time >= checkpoint_interval:
+                write_checkpoint(checkpoint_directory, checkpoint)
+                last_checkpoint_time = time.time()
+
+            if progress.is_due():
+                progress.update(checkpoint["processed_groups"],
+                                exact_maximum.value() if is_exact else max_block_divergence, checkpoint["witness"],
+                                boundary_constraints=r)
+
+    progress.update(checkpoint["processed_groups"], exact_maximum.value() if is_exact else max_block_divergence,
+                    checkpoint["witness"], is_final=True, boundary_constraints=r)
+    backward_messages_timer.write(k=k, shard=shard)
+    contract_timer.write(k=k, shard=shard)
+
+    if checkpoint_directory is not None:
+        write_checkpoint(checkpoint_directory, checkpoint)
+
+    return checkpoint
+
+
+def _run_shard_star(arguments):
+
+    # The last argument are the settings of the instrumentation, which worker processes do not necessarily inherit.
+
+    instrumentation.configure(**arguments[-1])
+    return run_shard(*arguments[:-1])
+
+
+def merge_checkpoints(checkpoints):
+
+    """
+    Merges the results of several shards.
+    :return:    Tuple (maximum expected weight difference, witness, number of processed boundary constraints). The
+                maximum is a fractions.Fraction if the checkpoints are exact, otherwise a float.
+    """
+
+    max_block_divergence = 0
+    witness = None
+    exact_maximum = exact.ExactMaximum()
+    is_exact = False
+    processed_boundary_constraints = 0
+
+    for checkpoint in checkpoints:
+        processed_boundary_constraints += checkpoint["processed_boundary_constraints"]
+        if checkpoint["exact"]:
+            is_exact = True
+            exact_maximum.merge(exact.ExactMaximum(checkpoint["max_numerator"], checkpoint["max_denominator"],
+                                                   checkpoint["witness"]))
+        elif checkpoint["max_block_divergence"] > max_block_divergence:
+            max_block_divergence = checkpoint["max_block_divergence"]
+            witness = checkpoint["witness"]
+
+    if is_exact:
+        return exact_maximum.value(), exact_maximum.witness, processed_boundary_constraints
+
+    return max_block_divergence, witness, processed_boundary_constraints
+
+
+def sweep(k, number_shards=1, shards=None, processes=1, checkpoint_directory=None, checkpoint_interval=60.0,
+          report=print, report_shard_progress=False, is_exact=False):
+
+    """
+    Processes the given shards, in parallel if processes > 1, and merges them with all other shards for which a
+    checkpoint exists.
+    :param k:                       The k of the k-heights
+    :param number_shards:           Total number of shards
+    :param shards:                  Indices of the shards to be processed now. Defaults to all shards.
+    :param processes:               Number of worker processes
+    :param checkpoint_directory:    Directory for checkpoint files, or None for not writing checkpoints
+    :param checkpoint_interval:     Number of seconds between two checkpoints of a shard
+    :param report:                  Function that is called with a progress message whenever a shard is finished
+    :param report_shard_progress:   Whether report is also called from within the shards with throttled progress
+                                    messages
+    :param is_exact:                Whether the expected weight differences are compared exactly. The maximum is then
+                                    returned as fractions.Fraction.
+    :return:                        Tuple (maximum expected weight difference, witness, True iff all shards are
+                                    complete)
+    """
+
+    if shards is None:
+        shards = range(number_shards)
+
+    if checkpoint_directory is not None:
+        os.makedirs(checkpoint_directory, exist_ok=True)
+
+    checkpoints = dict()
+    for shard in range(number_shards):
+        checkpoint = read_checkpoint(checkpoint_directory, k, shard, number_shards, is_exact)
+        if checkpoint is not None:
+            checkpoints[shard] = checkpoint
+
+    arguments = [(k, shard, number_shards, checkpoint_directory, checkpoint_interval,
+                  report if report_shard_progress else None, is_exact, instrumentation.get_settings())
+                 for shard in shards
+                 if shard not in checkpoints or checkpoints[shard]["processed_groups"] < checkpoints[shard]["number_groups"]]
+
+    if processes > 1 and len(arguments) > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_run_shard_star, arguments)
+    else:
+        pool = None
+        results = map(_run_shard_star, arguments)
+
+    try:
+        for checkpoint in results:
+            checkpoints[checkpoint["shard"]] = checkpoint
+            max_block_divergence, witness, processed_boundary_constraints = merge_checkpoints(checkpoints.values())
+            report("Finished shard " + str(checkpoint["shard"]) + " out of " + str(number_shards) + " shards ("
+                   + str(processed_boundary_constraints) + " boundary constraints processed in total). Max block "
+                   + "divergence found so far: " + str(max_block_divergence))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    max_block_divergence, witness, processed_boundary_constraints = merge_checkpoints(checkpoints.values())
+    is_complete = len(checkpoints) == number_shards and all(
+        checkpoint["processed_groups"] == checkpoint["number_groups"] for checkpoint in checkpoints.values())
+
+    return max_block_divergence, witness, is_complete
@@ -0,0 +1,656 @@
+# This program computes the spectral gap of single-site Glauber dynamics (heat-bath) of k-heights on small toroidal
+# rectangular and hexagonal grids exactly, up to the accuracy of the eigenvalue iteration, in order to cross-check the
+# coupling bounds and the coalescence times of markov_chain.py. A step of the chain chooses a vertex uniformly at
+# random and gives it a value chosen uniformly at random from the values that are admissible with respect to its
+# neighbors. Its transition matrix P is symmetric, so the uniform distribution is stationary, and it is positive
+# semidefinite, since it is the average of the projections that resample one vertex. Hence, its eigenvalues are
+# 1 = lambda_1 >= lambda_2 >= ... >= 0, and the relaxation time is 1 / (1 - lambda_2) steps. The mixing time t_mix(1/4)
+# is at least (t_rel - 1) log 2 and at most t_rel log(4 N), where N is the number of states.
+#
+# The state space is enumerated row by row like in the transfer-matrix method of transfer_matrix.py: the candidates for
+# every row of the torus are the k-heights of a cycle (see generic_block.get_all_k_heights), and two candidates may
+# follow each other iff the values at the vertical edges between the two rows differ by at most one; the last row has
+# to be compatible with the first row. A state is encoded as the integer whose digits in base "number of candidates"
+# are the indices of its row candidates. Since the candidates are in lexicographic order, the states are generated in
+# increasing order of their codes, and the sorted array of codes is a minimal perfect hash: the index of a state is
+# found by binary search. The codes take 8 bytes per state.
+#
+# The transition matrix is built in chunks of rows in compressed sparse row format. Only the off-diagonal entries are
+# stored, each as the index of the column (4 bytes if possible) and the number of admissible values of the changed
+# vertex (1 byte), which determines the entry; the diagonal follows from the row sums. If the matrix does not fit into
+# the memory budget, the chunks are computed again in every multiplication instead. The second eigenvalue is computed
+# by the Lanczos method or by power iteration on the orthogonal complement of the constant vectors. Everything works in
+# pure Python; with NumPy, the enumeration, the construction of the matrix and the vector operations are vectorized,
+# which is needed for tens of millions of states.
+
+
+import argparse
+import array
+import bisect
+import itertools
+import math
+import random
+import sys
+
+import generic_block
+import instrumentation
+import table_store
+from markov_chain import hexagonal_torus, rectangular_torus
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def compute_row_compatibility(candidates, vertical_columns):
+
+    """
+    :param candidates:          List of the candidates for a row, i.e. tuples of values
+    :param vertical_columns:    Columns of the vertical edges between this row and the next one
+    :return:                    List whose i-th entry is the sorted tuple of the indices of all candidates that may
+                                follow candidate i in the next row
+    """
+
+    # The compatible candidates only depend on the values in the vertical columns.
+    groups = dict()
+    for i, candidate in enumerate(candidates):
+        groups.setdefault(tuple(candidate[j] for j in vertical_columns), []).append(i)
+
+    successors = dict()
+    for projection in groups:
+        indices = []
+        for neighbor in itertools.product(*[(value - 1, value, value + 1) for value in projection]):
+            indices.extend(groups.get(neighbor, ()))
+        successors[projection] = tuple(sorted(indices))
+
+    return [successors[tuple(candidate[j] for j in vertical_columns)] for candidate in candidates]
+
+
+class TorusStateSpace:
+
+    def __init__(self, k, grid, rows, columns):
+
+        """
+        The k-heights of a toroidal grid, see the comment at the beginning.
+        :param grid:    "rectangular" or "hexagonal", see markov_chain.rectangular_torus() and hexagonal_torus()
+        """
+
+        if rows < 2 or columns < 2:
+            raise ValueError("The torus needs at least two rows and two columns.")
+
+        self.k = k
+        self.grid = grid
+        self.rows = rows
+        self.columns = columns
+        self.neighbors = rectangular_torus(rows, columns) if grid == "rectangular" else hexagonal_torus(rows, columns)
+        self.number_vertices = rows * columns
+
+        cycle = generic_block.canonical_graph(columns, [(j, (j + 1) % columns) for j in range(columns)])
+        self.candidates = generic_block.get_all_k_heights(k, cycle)
+        self.candidate_index = {candidate: i for i, candidate in enumerate(self.candidates)}
+        self.radix = len(self.candidates)
+        if self.radix ** rows >= 1 << 63:
+            raise ValueError("The states of the " + str(rows) + "x" + str(columns) + " torus do not fit into 64 bits.")
+        self.row_weights = [self.radix ** (rows - 1 - r) for r in range(rows)]
+
+        # vertical_columns[r] are the columns of the edges between row r and row r + 1 (modulo rows), and
+        # compatible[r] are the successors of the candidates of row r in row r + 1.
+        self.vertical_columns = []
+        compatibilities = dict()
+        self.compatible = []
+        for r in range(rows):
+            below = (r + 1) % rows
+            vertical_columns = tuple(j for j in range(columns)
+                                     if below * columns + j in self.neighbors[r * columns + j])
+            if vertical_columns not in compatibilities:
+                compatibilities[vertical_columns] = compute_row_compatibility(self.candidates, vertical_columns)
+            self.vertical_columns.append(vertical_columns)
+            self.compatible.append(compatibilities[vertical_columns])
+
+        # replacements[i][j * (k + 1) + value] is the index of candidate i with the value in column j replaced, or -1.
+        self.replacements = []
+        for candidate in self.candidates:
+            replacement = []
+            for j in range(columns):
+                for value in range(k + 1):
+                    changed = candidate[:j] + (value,) + candidate[j + 1:]
+                    replacement.append(self.candidate_index.get(changed, -1))
+            self.replacements.append(replacement)
+
+        self.codes = None
+
+    @property
+    def number_states(self):
+
+        return len(self.codes)
+
+    def decode(self, code):
+
+        """
+        :return:    List of the indices of the row candidates of the state with the given code
+        """
+
+        indices = []
+        for _ in range(self.rows):
+            code, index = divmod(code, self.radix)
+            indices.append(index)
+        return indices[::-1]
+
+    def values(self, code):
+
+        """
+        :return:    Tuple of the values of the state with the given code, indexed by vertex
+        """
+
+        return tuple(itertools.chain.from_iterable(self.candidates[i] for i in self.decode(code)))
+
+    def index(self, code):
+
+        """
+        :return:    Index of the state with the given code among all states
+        """
+
+        return bisect.bisect_left(self.codes, code)
+
+    def enumerate_states(self, use_numpy=True, progress=None):
+
+        """
+        Enumerates the codes of all states in increasing order and keeps them in self.codes, an array.array or, with
+        NumPy, a numpy.ndarray of 64-bit integers.
+        """
+
+        if use_numpy and numpy is not None:
+            self.codes = self.enumerate_states_vectorized(progress)
+            return self.codes
+
+        codes = array.array("q")
+        last = self.rows - 1
+        closing = [set(successors) for successors in self.compatible[last]]
+
+        for first in range(self.radix):
+            # Depth-first search over the rows 1, ..., rows - 1, with one iterator of successors per row.
+            stack = [(first, iter(self.compatible[0][first]))]
+            while stack:
+                code, successors = stack[-1]
+                index = next(successors, None)
+                if index is None:
+                    stack.pop()
+                    continue
+                if len(stack) == last:
+                    if first in closing[index]:
+                        codes.append(code * self.radix + index)
+                else:
+                    stack.append((code * self.radix + index, iter(self.compatible[len(stack)][index])))
+
+            if progress is not None:
+                progress.update(first + 1, states=len(codes))
+
+        self.codes = codes
+        return codes
+
+    def enumerate_states_vectorized(self, progress=None):
+
+        candidate_values = numpy.array(self.candidates, dtype=numpy.int8).reshape(self.radix, self.columns)
+        offsets = []
+        successors = []
+        for compatible in self.compatible:
+            offsets.append(numpy.cumsum([0] + [len(indices) for indices in compatible]))
+            successors.append(numpy.fromiter(itertools.chain.from_iterable(compatible), dtype=numpy.int64))
+
+        parts = []
+        number_states = 0
+        for first in range(self.radix):
+            # Extends all prefixes that begin with the first candidate by all successors of their last candidate.
+            codes = numpy.array([first], dtype=numpy.int64)
+            lasts = codes.copy()
+            for r in range(1, self.rows):
+                begins = offsets[r - 1][lasts]
+                degrees = offsets[r - 1][lasts + 1] - begins
+                parents = numpy.repeat(numpy.arange(len(codes)), degrees)
+                positions = numpy.arange(len(parents)) - numpy.repeat(numpy.cumsum(degrees) - degrees, degrees)
+                lasts = successors[r - 1][begins[parents] + positions]
+                codes = codes[parents] * self.radix + lasts
+
+            columns = list(self.vertical_columns[-1])
+            differences = candidate_values[lasts][:, columns] - candidate_values[first, columns]
+            codes = codes[numpy.all(numpy.abs(differences) <= 1, axis=1)]
+            parts.append(codes)
+            number_states += len(codes)
+
+            if progress is not None:
+                progress.update(first + 1, states=number_states)
+
+        return numpy.concatenate(parts)
+
+    def transitions(self, code):
+
+        """
+        :return:    List of the off-diagonal entries of the row of the transition matrix for the state with the given
+                    code, each as tuple (code of the other state, number of admissible values of the changed vertex)
+        """
+
+        indices = self.decode(code)
+        values = list(itertools.chain.from_iterable(self.candidates[i] for i in indices))
+
+        entries = []
+        for v, neighbors in enumerate(self.neighbors):
+            low = max(0, max(values[w] for w in neighbors) - 1)
+            high = min(self.k, min(values[w] for w in neighbors) + 1)
+            r, j = divmod(v, self.columns)
+            replacement = self.replacements[indices[r]]
+            for value in range(low, high + 1):
+                if value != values[v]:
+                    changed_code = code + (replacement[j * (self.k + 1) + value] - indices[r]) * self.row_weights[r]
+                    entries.append((changed_code, high - low + 1))
+        return entries
+
+
+class TransitionMatrix:
+
+    def __init__(self, space, memory_budget=1 << 30, chunk_size=1 << 16, use_numpy=True, progress=None):
+
+        """
+        The transition matrix of single-site Glauber dynamics on a TorusStateSpace whose states are enumerated, in
+        chunks of rows, see the comment at the beginning.
+        :param memory_budget:   Maximum number of bytes of the stored chunks; if the matrix is larger, the chunks are
+                                computed again in every multiplication
+        :param chunk_size:      Number of rows per chunk
+        """
+
+        self.space = space
+        self.chunk_size = chunk_size
+        self.is_vectorized = use_numpy and numpy is not None
+        self.number_states = space.number_states
+
+        # An entry for a vertex with c admissible values is 1 / (n * c).
+        self.entry_values = [0.0] + [1 / (space.number_vertices * c) for c in range(1, space.k + 2)]
+
+        if self.is_vectorized:
+            self.entry_values = numpy.array(self.entry_values)
+            self.candidate_values = numpy.array(space.candidates, dtype=numpy.int8).reshape(space.radix,
+                                                                                           space.columns)
+            self.replacements = numpy.array(space.replacements, dtype=numpy.int64)
+            self.neighbors = numpy.array(space.neighbors, dtype=numpy.int64)
+            self.index_type = numpy.uint32 if self.number_states < 1 << 32 else numpy.int64
+        else:
+            self.index_typecode = table_store.smallest_typecode(max(self.number_states - 1, 0))
+
+        # The chunks are kept while they fit into the memory budget.
+        self.chunks = []
+        self.number_entries = 0
+        self.number_bytes = 0
+        for chunk in self.compute_chunks(progress):
+            self.number_entries += len(chunk[2])
+            self.number_bytes += sum(part.itemsize * len(part) for part in chunk[1:])
+            if self.chunks is not None:
+                self.chunks.append(chunk)
+                if self.number_bytes > memory_budget:
+                    self.chunks = None
+        self.is_stored = self.chunks is not None
+
+    def compute_chunks(self, progress=None):
+
+        """
+        Generates the chunks of rows, each as tuple (index of the first row, row pointers, column indices, numbers of
+        admissible values), where the row pointers begin with 0.
+        """
+
+        for start in range(0, self.number_states, self.chunk_size):
+            stop = min(start + self.chunk_size, self.number_states)
+            if self.is_vectorized:
+                yield self.compute_chunk_vectorized(start, stop)
+            else:
+                yield self.compute_chunk(start, stop)
+            if progress is not None:
+                progress.update(stop)
+
+    def compute_chunk(self, start, stop):
+
+        space = self.space
+        row_pointers = array.array("Q", [0])
+        indices = array.array(self.index_typecode)
+        counts = array.array("B")
+        for code in space.codes[start:stop]:
+            for changed_code, count in space.transitions(code):
+                indices.append(space.index(changed_code))
+                counts.append(count)
+            row_pointers.append(len(indices))
+        return start, row_pointers, indices, counts
+
+    def compute_chunk_vectorized(self, start, stop):
+
+        space = self.space
+        codes = numpy.asarray(space.codes[start:stop])
+        indices = [(codes // weight) % space.radix for weight in space.row_weights]
+        values = numpy.hstack([self.candidate_values[row_indices] for row_indices in indices])
+
+        neighbor_values = values[:, self.neighbors]
+        lows = numpy.maximum(neighbor_values.max(axis=2) - 1, 0)
+        highs = numpy.minimum(neighbor_values.min(axis=2) + 1, space.k)
+
+        rows = []
+        columns = []
+        counts = []
+        for v in range(space.number_vertices):
+            r, j = divmod(v, space.columns)
+            for value in range(space.k + 1):
+                selected = numpy.nonzero((lows[:, v] <= value) & (value <= highs[:, v]) & (values[:, v] != value))[0]
+                if len(selected) == 0:
+                    continue
+                replaced = self.replacements[indices[r][selected], j * (space.k + 1) + value]
+                changed_codes = codes[selected] + (replaced - indices[r][selected]) * space.row_weights[r]
+                rows.append(selected)
+                columns.append(numpy.searchsorted(space.codes, changed_codes))
+                counts.append(highs[selected, v] - lows[selected, v] + 1)
+
+        if rows:
+            rows = numpy.concatenate(rows)
+            order = numpy.argsort(rows, kind="stable")
+            columns = numpy.concatenate(columns)[order].astype(self.index_type)
+            counts = numpy.concatenate(counts)[order].astype(numpy.uint8)
+            row_pointers = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(rows, minlength=stop - start))])
+        else:
+            columns = numpy.zeros(0, dtype=self.index_type)
+            counts = numpy.zeros(0, dtype=numpy.uint8)
+            row_pointers = numpy.zeros(stop - start + 1, dtype=numpy.int64)
+
+        return start, row_pointers, columns, counts
+
+    def iterate_chunks(self):
+
+        return iter(self.chunks) if self.is_stored else self.compute_chunks()
+
+    def multiply(self, vector):
+
+        """
+        :return:    The product of the transition matrix and the vector, a list of floats or, with NumPy, a
+                    numpy.ndarray
+        """
+
+        if self.is_vectorized:
+            result = numpy.empty_like(vector)
+            for start, row_pointers, columns, counts in self.iterate_chunks():
+                stop = start + len(row_pointers) - 1
+                entries = self.entry_values[counts]
+                # reduceat() needs valid starts; the appended zero serves the empty rows at the end.
+                starts = row_pointers[:-1]
+                sums = numpy.add.reduceat(numpy.append(entries * vector[columns], 0.0), starts)
+                totals = numpy.add.reduceat(numpy.append(entries, 0.0), starts)
+                is_empty = row_pointers[1:] == starts
+                sums[is_empty] = 0.0
+                totals[is_empty] = 0.0
+                result[start:stop] = vector[start:stop] * (1.0 - totals) + sums
+            return result
+
+        result = list(vector)
+        entry_values = self.entry_values
+        for start, row_pointers, columns, counts in self.iterate_chunks():
+            for i in range(len(row_pointers) - 1):
+                value = vector[start + i]
+                total = 0.0
+                for e in range(row_pointers[i], row_pointers[i + 1]):
+                    total += entry_values[counts[e]] * (vector[columns[e]] - value)
+                result[start + i] = value + total
+        return result
+
+
+# Vector operations for lists of floats and NumPy arrays.
+
+def _dot(x, y):
+
+    if numpy is not None and isinstance(x, numpy.ndarray):
+        return float(numpy.dot(x, y))
+    return math.fsum(a * b for a, b in zip(x, y))
+
+
+def _combine(a, x, b, y):
+
+    """
+    :return:    a * x + b * y
+    """
+
+    if numpy is not None and isinstance(x, numpy.ndarray):
+        return a * x + b * y
+    return [a * u + b * v for u, v in zip(x, y)]
+
+
+def _scale(a, x):
+
+    if numpy is not None and isinstance(x, numpy.ndarray):
+        return a * x
+    return [a * u for u in x]
+
+
+def _remove_mean(x):
+
+    """
+    :return:    The projection of x onto the orthogonal complement of the constant vectors
+    """
+
+    if numpy is not None and isinstance(x, numpy.ndarray):
+        return x - x.mean()
+    mean = math.fsum(x) / len(x)
+    return [u - mean for u in x]
+
+
+def random_start_vector(number_states, is_vectorized, seed=0):
+
+    """
+    :return:    Random unit vector that is orthogonal to the constant vectors
+    """
+
+    if is_vectorized:
+        vector = numpy.random.RandomState(seed).standard_normal(number_states)
+    else:
+        generator = random.Random(seed)
+        vector = [generator.gauss(0, 1) for _ in range(number_states)]
+    vector = _remove_mean(vector)
+    return _scale(1 / math.sqrt(_dot(vector, vector)), vector)
+
+
+def largest_tridiagonal_eigenvalue(diagonal, off_diagonal):
+
+    """
+    Computes the largest eigenvalue of a symmetric tridiagonal matrix by bisection with Sturm sequences.
+    :param diagonal:        The m diagonal entries
+    :param off_diagonal:    The m - 1 entries next to the diagonal
+    """
+
+    m = len(diagonal)
+    radii = [abs(off_diagonal[i - 1]) if i > 0 else 0 for i in range(m)]
+    radii = [radii[i] + (abs(off_diagonal[i]) if i < m - 1 else 0) for i in range(m)]
+    lower = min(diagonal[i] - radii[i] for i in range(m))
+    upper = max(diagonal[i] + radii[i] for i in range(m))
+
+    def number_smaller(x):
+        number = 0
+        d = 1.0
+        for i in range(m):
+            d = diagonal[i] - x - (off_diagonal[i - 1] ** 2 / d if i > 0 else 0)
+            if d == 0:
+                d = 1e-300
+            if d < 0:
+                number += 1
+        return number
+
+    while upper - lower > 1e-15 * max(1.0, abs(lower), abs(upper)):
+        middle = (lower + upper) / 2
+        if middle <= lower or middle >= upper:
+            break
+        if number_smaller(middle) == m:
+            upper = middle
+        else:
+            lower = middle
+    return (lower + upper) / 2
+
+
+def lanczos(matrix, start, max_iterations=300, tolerance=1e-12, progress=None):
+
+    """
+    Computes the largest eigenvalue of the symmetric matrix on the orthogonal complement of the constant vectors by the
+    Lanczos method. Every vector is projected onto the complement again, so that rounding errors do not bring back the
+    eigenvalue 1. The Lanczos vectors are not reorthogonalized; the loss of orthogonality only produces copies of
+    converged eigenvalues and does not affect the largest one.
+    :param matrix:      Object with a method multiply()
+    :param start:       Unit start vector that is orthogonal to the constant vectors
+    :return:            Tuple (eigenvalue, number of iterations)
+    """
+
+    diagonal = []
+    off_diagonal = []
+    previous = None
+    vector = start
+    eigenvalue = None
+
+    for iteration in range(1, max_iterations + 1):
+        product = _remove_mean(matrix.multiply(vector))
+        alpha = _dot(product, vector)
+        product = _combine(1.0, product, -alpha, vector)
+        if previous is not None:
+            product = _combine(1.0, product, -off_diagonal[-1], previous)
+        diagonal.append(alpha)
+
+        last_eigenvalue = eigenvalue
+        eigenvalue = largest_tridiagonal_eigenvalue(diagonal, off_diagonal)
+        if progress is not None:
+            progress.update(iteration, eigenvalue=eigenvalue)
+
+        beta = math.sqrt(_dot(product, product))
+        if beta <= 1e-14 or (last_eigenvalue is not None and abs(eigenvalue - last_eigenvalue) <= tolerance):
+            return eigenvalue, iteration
+
+        off_diagonal.append(beta)
+        previous, vector = vector, _scale(1 / beta, product)
+
+    return eigenvalue, max_iterations
+
+
+def power_iteration(matrix, start, max_iterations=100000, tolerance=1e-12, progress=None):
+
+    """
+    Computes the largest eigenvalue of the positive semidefinite matrix on the orthogonal complement of the constant
+    vectors by power iteration with Rayleigh quotients. It converges much slower than lanczos() if the spectral gap is
+    small.
+    :return:    Tuple (eigenvalue, number of iterations)
+    """
+
+    vector = start
+    eigenvalue = None
+
+    for iteration in range(1, max_iterations + 1):
+        product = _remove_mean(matrix.multiply(vector))
+        last_eigenvalue = eigenvalue
+        eigenvalue = _dot(product, vector)
+        if progress is not None:
+            progress.update(iteration, eigenvalue=eigenvalue)
+
+        norm = math.sqrt(_dot(product, product))
+        if norm <= 1e-300 or (last_eigenvalue is not None and abs(eigenvalue - last_eigenvalue) <= tolerance):
+            return eigenvalue, iteration
+        vector = _scale(1 / norm, product)
+
+    return eigenvalue, max_iterations
+
+
+def spectral_gap(k, grid, rows, columns, method="lanczos", max_iterations=None, tolerance=1e-12,
+                 memory_budget=1 << 30, chunk_size=1 << 16, use_numpy=True, seed=0):
+
+    """
+    Computes the second eigenvalue of single-site Glauber dynamics of k-heights on a toroidal grid.
+    :param method:          "lanczos" or "power"
+    :param max_iterations:  Maximum number of iterations, or None for the default of the method
+    :return:                Dictionary with the number of states and transitions, the second eigenvalue, the spectral
+                            gap, the relaxation time and the bounds on the mixing time t_mix(1/4), in steps
+    """
+
+    context = {"k": k, "grid": grid, "size": [rows, columns]}
+    is_vectorized = use_numpy and numpy is not None
+
+    space = TorusStateSpace(k, grid, rows, columns)
+    progress = instrumentation.Progress("spectral_gap enumeration", total=space.radix, unit="first rows", **context)
+    space.enumerate_states(use_numpy, progress)
+    progress.update(space.radix, is_final=True, states=space.number_states)
+
+    progress = instrumentation.Progress("spectral_gap matrix", total=space.number_states, unit="states", **context)
+    matrix = TransitionMatrix(space, memory_budget, chunk_size, use_numpy, progress)
+    progress.update(space.number_states, is_final=True, entries=matrix.number_entries, stored=matrix.is_stored)
+
+    start = random_start_vector(space.number_states, is_vectorized, seed)
+    iterate = lanczos if method == "lanczos" else power_iteration
+    iteration_arguments = {"tolerance": tolerance}
+    if max_iterations is not None:
+        iteration_arguments["max_iterations"] = max_iterations
+    progress = instrumentation.Progress("spectral_gap " + method, total=max_iterations, unit="iterations", **context)
+    if space.number_states > 1:
+        eigenvalue, number_iterations = iterate(matrix, start, progress=progress, **iteration_arguments)
+    else:
+        eigenvalue, number_iterations = 0.0, 0
+    progress.update(number_iterations, is_final=True, eigenvalue=eigenvalue)
+
+    gap = 1 - eigenvalue
+    relaxation_time = 1 / gap
+    return {"number_states": space.number_states, "number_transitions": matrix.number_entries,
+            "matrix_bytes": matrix.number_bytes, "is_stored": matrix.is_stored, "iterations": number_iterations,
+            "second_eigenvalue": eigenvalue, "spectral_gap": gap, "relaxation_time": relaxation_time,
+            "mixing_time_lower_bound": (relaxation_time - 1) * math.log(2),
+            "mixing_time_upper_bound": relaxation_time * math.log(4 * space.number_states)}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Computes the spectral gap of single-site Glauber dynamics on "
+                                                 "k-heights of small toroidal grids.")
+    parser.add_argument("--grid", choices=["rectangular", "hexagonal"], default="rectangular",
+                        help="toroidal grid (default: rectangular)")
+    parser.add_argument("--size", type=int, nargs=2, default=[4, 4], metavar=("ROWS", "COLUMNS"),
+                        help="number of rows and columns of the torus (default: 4 4)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2], help="values of k (default: 1 2)")
+    parser.add_argument("--method", choices=["lanczos", "power"], default="lanczos",
+                        help="eigenvalue iteration (default: lanczos)")
+    parser.add_argument("--iterations", type=int, default=None,
+                        help="maximum number of iterations (default: 300 for lanczos, 100000 for power)")
+    parser.add_argument("--tolerance", type=float, default=1e-12,
+                        help="stop when the eigenvalue changes by at most this much (default: 1e-12)")
+    parser.add_argument("--memory-budget", type=float, default=1024, metavar="MEGABYTES",
+                        help="maximum size of the stored transition matrix; a larger matrix is computed again in "
+                             "every iteration (default: 1024)")
+    parser.add_argument("--chunk-size", type=int, default=1 << 16,
+                        help="number of rows of the transition matrix per chunk (default: 65536)")
+    parser.add_argument("--pure-python", action="store_true", help="do not use NumPy even if it is installed")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the start vector (default: 0)")
+    instrumentation.add_arguments(parser)
+    table_store.add_arguments(parser)
+    arguments = parser.parse_args()
+    instrumentation.configure_from_arguments(arguments)
+    table_store.configure_from_arguments(arguments)
+
+    print("PYTHON VERSION:\n" + sys.version)
+    if numpy is None and not arguments.pure_python:
+        print("NumPy is not installed; using the pure Python implementation.")
+
+    rows, columns = arguments.size
+    for k in arguments.k:
+        result = spectral_gap(k, arguments.grid, rows, columns, arguments.method, arguments.iterations,
+                              arguments.tolerance, int(arguments.memory_budget * (1 << 20)), arguments.chunk_size,
+                              not arguments.pure_python, arguments.seed)
+        record = {"name": "spectral_gap result", "k": k, "grid": arguments.grid, "size": arguments.size,
+                  "method": arguments.method}
+        record.update(result)
+        instrumentation.write_record(record)
+
+        number_vertices = rows * columns
+        print("Single-site dynamics for k=" + str(k) + " on the " + str(rows) + "x" + str(columns) + " "
+              + arguments.grid + " torus: " + str(result["number_states"]) + " states, "
+              + str(result["number_transitions"]) + " transitions, " + str(result["iterations"]) + " iterations")
+        print("    second eigenvalue " + str(result["second_eigenvalue"]) + ", spectral gap "
+              + str(result["spectral_gap"]))
+        print("    relaxation time " + format(result["relaxation_time"], ".6g") + " steps ("
+              + format(result["relaxation_time"] / number_vertices, ".6g") + " sweeps), mixing time t_mix(1/4) between "
+              + format(result["mixing_time_lower_bound"] / number_vertices, ".6g") + " and "
+              + format(result["mixing_time_upper_bound"] / number_vertices, ".6g") + " sweeps")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
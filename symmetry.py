@@ -0,0 +1,82 @@
+# This code provides the symmetries of cover relations that are used to reduce the number of cover relations which have
+# to be considered when computing the block divergence. A cover relation is a pair (l, u) of boundary constraints that
+# differ exactly on the augmentation vertex, where u is larger by one. Besides the symmetries of the block and its
+# boundary which fix the augmentation vertex, there is the value flip h -> k - h: it maps every k-height to a k-height
+# and the cover relation (l, u) to the cover relation (k - u, k - l) which differs on the same vertex. The flip maps the
+# admissible fillings with respect to a boundary constraint c bijectively to the admissible fillings with respect to
+# k - c, hence a filling of weight w to a filling of weight n * k - w where n is the number of block vertices. In
+# particular, both cover relations have the same expected weight difference.
+
+
+def flip(boundary_constraint, k):
+
+    """
+    :return:    The boundary constraint (or any other tuple of values) after applying the value flip h -> k - h.
+    """
+
+    return tuple(k - value for value in boundary_constraint)
+
+
+def flip_count_and_weight(count, weight, k, number_vertices):
+
+    """
+    :return:    Number and total weight of the admissible fillings with respect to the flipped boundary constraint,
+                given number and total weight of the admissible fillings with respect to the boundary constraint.
+    """
+
+    return count, number_vertices * k * count - weight
+
+
+def flipped_cover_relation(lower_boundary_constraint, augmentation_vertex, k):
+
+    """
+    :return:    The lower boundary constraint k - u of the flipped cover relation (k - u, k - l), where l is the given
+                lower boundary constraint and u is l augmented at augmentation_vertex.
+    """
+
+    flipped = list(flip(lower_boundary_constraint, k))
+    flipped[augmentation_vertex] -= 1
+    return tuple(flipped)
+
+
+def cover_relation_orbit(lower_boundary_constraint, augmentation_vertex, k, permutations):
+
+    """
+    Computes the orbit of a cover relation under the group generated by the value flip and the given permutations of
+    the boundary vertices.
+    :param lower_boundary_constraint:   Lower boundary constraint l of the cover relation
+    :param augmentation_vertex:         Boundary vertex on which the cover relation differs
+    :param k:                           The k of the k-heights
+    :param permutations:                All elements of a group of symmetries of the boundary, each fixing the
+                                        augmentation vertex, given as tuples p such that the boundary constraint c is
+                                        mapped to (c[p[0]], c[p[1]], ...).
+    :return:                            Set of the lower boundary constraints of all cover relations in the orbit
+    """
+
+    flipped = flipped_cover_relation(lower_boundary_constraint, augmentation_vertex, k)
+
+    orbit = set()
+    for permutation in permutations:
+        orbit.add(tuple(lower_boundary_constraint[i] for i in permutation))
+        orbit.add(tuple(flipped[i] for i in permutation))
+
+    return orbit
+
+
+def canonical_cover_relations(lower_boundary_constraints, augmentation_vertex, k, permutations):
+
+    """
+    Yields one representative of every orbit of cover relations, namely the one with the lexicographically smallest
+    lower boundary constraint.
+    :param lower_boundary_constraints:  Iterable over the lower boundary constraints of all cover relations, which has
+                                        to be closed under the symmetries
+    :param augmentation_vertex:         Boundary vertex on which the cover relations differ
+    :param k:                           The k of the k-heights
+    :param permutations:                See cover_relation_orbit()
+    :return:                            Generator of tuples (lower boundary constraint, size of the orbit)
+    """
+
+    for lower_boundary_constraint in lower_boundary_constraints:
+        orbit = cover_relation_orbit(lower_boundary_constraint, augmentation_vertex, k, permutations)
+        if lower_boundary_constraint == min(orbit):
+            yield lower_boundary_constraint, len(orbit)
@@ -0,0 +1,265 @@
+# This code provides a persistent store for the tables that do not depend on a boundary constraint and that every run
+# otherwise rebuilds from itertools.product before the real work starts: the k-strips and their compatibility structure
+# (transfer_matrix.py), the fillings of the hexagon (hexagonal_grid.py), and the k-heights and filling bitsets of
+# generic blocks (generic_block.py). If a table directory is configured, every table is computed once per shape and k
+# and written to a file in this directory; later runs and worker processes read the file instead of computing the table
+# again.
+#
+# A table file consists of a header and a number of named arrays of unsigned integers. The header is the magic string,
+# the length of a JSON object as 8-byte little-endian integer and the JSON object itself, which contains the name and
+# the key of the tables together with type code, offset and length of every array. The arrays are stored as raw
+# machine integers, aligned to 8 bytes, so that they are read from a read-only memory map by memoryview.cast(). Callers
+# decode the arrays into the Python objects that they use, e.g. tuples of values or integers as bitsets, which is much
+# faster than computing them again. The store is a cache of the start-up work only: every process keeps its own decoded
+# copy of the tables, so neither the memory of the tables is shared between processes nor are the tables used in place.
+#
+# A file whose header does not match the requested tables, e.g. because it was written on a machine with a different
+# byte order, is computed and written again. Files are written to a temporary file first and then renamed, so that
+# processes that compute the same tables concurrently do not read incomplete files. The table directory has to be
+# cleared if the computation of the tables is changed.
+#
+# The table directory is also kept in an environment variable, so that worker processes inherit it regardless of how
+# they are started.
+
+
+import array
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import sys
+
+
+MAGIC = b"KHTABLE1"
+
+ENVIRONMENT_VARIABLE = "K_HEIGHTS_TABLE_DIRECTORY"
+
+ALIGNMENT = 8
+
+
+def add_arguments(parser):
+
+    """
+    Adds the command line option of the table store to an argparse.ArgumentParser.
+    """
+
+    parser.add_argument("--table-directory", default=os.environ.get(ENVIRONMENT_VARIABLE),
+                        help="keep the precomputed tables of strips, fillings and compatibilities in this directory "
+                             "(default: the environment variable " + ENVIRONMENT_VARIABLE + ", or no directory)")
+
+
+def configure(table_directory=None):
+
+    if table_directory is None:
+        os.environ.pop(ENVIRONMENT_VARIABLE, None)
+    else:
+        os.environ[ENVIRONMENT_VARIABLE] = table_directory
+
+
+def configure_from_arguments(arguments):
+
+    configure(arguments.table_directory)
+
+
+def get_table_directory():
+
+    return os.environ.get(ENVIRONMENT_VARIABLE) or None
+
+
+def table_path(table_directory, name, key):
+
+    digest = hashlib.sha1(json.dumps([name, key], sort_keys=True).encode()).hexdigest()
+    return os.path.join(table_directory, name + "-" + digest[:16] + ".tbl")
+
+
+def smallest_typecode(maximum):
+
+    """
+    :return:    Type code of the smallest unsigned array type that holds all values in 0, ..., maximum
+    """
+
+    for typecode in ["B", "H", "I", "Q"]:
+        if maximum < 1 << (8 * array.array(typecode).itemsize):
+            return typecode
+    raise OverflowError("value " + str(maximum) + " does not fit into an array")
+
+
+def values_array(values):
+
+    """
+    :return:    array.array of the smallest unsigned type that holds the nonnegative integers of the iterable values
+    """
+
+    values = list(values)
+    return array.array(smallest_typecode(max(values, default=0)), values)
+
+
+def write_tables(path, name, key, arrays):
+
+    """
+    Writes the tables to path, see the comment at the beginning.
+    :param arrays:  Dictionary which maps the names of the arrays to array.array objects
+    """
+
+    entries = []
+    offset = 0
+    for array_name in sorted(arrays):
+        values = arrays[array_name]
+        entries.append({"name": array_name, "typecode": values.typecode, "itemsize": values.itemsize,
+                        "offset": offset, "length": len(values)})
+        offset += -(-len(values) * values.itemsize // ALIGNMENT) * ALIGNMENT
+
+    header = {"name": name, "key": key, "byteorder": sys.byteorder, "arrays": entries}
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+    start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC + len(header_bytes).to_bytes(8, "little") + header_bytes)
+        for entry in entries:
+            file.seek(start + entry["offset"])
+            arrays[entry["name"]].tofile(file)
+        file.truncate(start + offset)
+    os.replace(temporary_path, path)
+
+
+def read_tables(path, name, key):
+
+    """
+    Opens the tables in path as read-only memory map.
+    :return:    Dictionary which maps the names of the arrays to one-dimensional memoryviews, or None if there is no
+                such file or if it does not contain the requested tables
+    """
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < len(MAGIC) + 8:
+            return None
+        memory_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        if memory_map[:len(MAGIC)] != MAGIC:
+            return None
+        header_length = int.from_bytes(memory_map[len(MAGIC):len(MAGIC) + 8], "little")
+        header = json.loads(memory_map[len(MAGIC) + 8:len(MAGIC) + 8 + header_length].decode())
+    except ValueError:
+        return None
+
+    if header.get("name") != name or header.get("key") != key or header.get("byteorder") != sys.byteorder:
+        return None
+
+    start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    view = memoryview(memory_map)
+    arrays = dict()
+    for entry in header["arrays"]:
+        if array.array(entry["typecode"]).itemsize != entry["itemsize"]:
+            return None
+        begin = start + entry["offset"]
+        end = begin + entry["length"] * entry["itemsize"]
+        if end > len(memory_map):
+            return None
+        arrays[entry["name"]] = view[begin:end].cast(entry["typecode"])
+
+    return arrays
+
+
+def cached(name, key, compute, encode, decode):
+
+    """
+    Returns compute(), or its copy from the table directory if one is configured, see the comment at the beginning.
+    :param name:        Name of the kind of tables; it is the beginning of the file name
+    :param key:         JSON-serializable value that identifies the tables of this kind, e.g. {"k": 3, "width": 4}
+    :param compute:     Function without arguments that computes the tables
+    :param encode:      Function that maps the result of compute() to a dictionary of array.array objects
+    :param decode:      Function that maps a dictionary of memoryviews with the same names to the result of compute()
+    """
+
+    table_directory = get_table_directory()
+    if table_directory is None:
+        return compute()
+
+    # Tuples in the key are read back from the header as lists.
+    key = json.loads(json.dumps(key))
+    path = table_path(table_directory, name, key)
+    arrays = read_tables(path, name, key)
+    if arrays is not None:
+        return decode(arrays)
+
+    result = compute()
+    write_tables(path, name, key, encode(result))
+    return result
+
+
+# Encodings of the kinds of tables that occur. Every array name is prefixed by the name of the table, so that several
+# tables can be kept in one file.
+
+def encode_rows(table_name, rows, width):
+
+    """
+    :param rows:    Sequence of tuples of nonnegative integers, all of length width
+    """
+
+    values = values_array(itertools.chain.from_iterable(rows))
+    return {table_name + ".shape": array.array("Q", [len(rows), width]), table_name + ".values": values}
+
+
+def decode_rows(arrays, table_name):
+
+    """
+    :return:    List of tuples, see encode_rows()
+    """
+
+    number_rows, width = arrays[table_name + ".shape"]
+    if width == 0:
+        return [()] * number_rows
+    return list(zip(*[iter(arrays[table_name + ".values"])] * width))
+
+
+def encode_ragged_rows(table_name, rows):
+
+    """
+    :param rows:    Sequence of tuples of nonnegative integers of any lengths
+    """
+
+    offsets = array.array("Q", [0])
+    for row in rows:
+        offsets.append(offsets[-1] + len(row))
+    values = values_array(itertools.chain.from_iterable(rows))
+    return {table_name + ".offsets": offsets, table_name + ".values": values}
+
+
+def decode_ragged_rows(arrays, table_name):
+
+    """
+    :return:    List of tuples, see encode_ragged_rows()
+    """
+
+    offsets = arrays[table_name + ".offsets"]
+    values = arrays[table_name + ".values"]
+    return [tuple(values[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+
+def encode_bitsets(table_name, bitsets, number_bits):
+
+    """
+    :param bitsets:     Sequence of nonnegative integers that are smaller than 2 ** number_bits
+    """
+
+    number_bytes = (number_bits + 7) // 8
+    values = array.array("B", b"".join(bitset.to_bytes(number_bytes, "little") for bitset in bitsets))
+    return {table_name + ".shape": array.array("Q", [len(bitsets), number_bytes]), table_name + ".values": values}
+
+
+def decode_bitsets(arrays, table_name):
+
+    """
+    :return:    List of integers, see encode_bitsets()
+    """
+
+    number_bitsets, number_bytes = arrays[table_name + ".shape"]
+    values = arrays[table_name + ".values"]
+    return [int.from_bytes(values[i * number_bytes:(i + 1) * number_bytes], "little") for i in range(number_bitsets)]
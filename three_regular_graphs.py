@@ -5,21 +5,28 @@
 # for computing the block divergence of small blocks which can be found in generic_block.py . For transparency,
 # with each computation, we not just log the results but also the parameters that are used when calling the
 # computation. This includes the graph structure of the block.
+#
+# The cases are described as data and computed by case_runner.py, in parallel by a pool of processes and optionally
+# with a cache file of results; the output does not depend on either.
 
+import argparse
 import math
+import os
 import sys
-import generic_block
 
+import case_runner
+import instrumentation
+import table_store
 
-print("PYTHON VERSION:\n" + sys.version)
 
-# column description line for reading the output as a CSV
-#
-print("k; case; number of internally valid fillings; number of valid boundary constraints; result (block divergence); "
-      "input number_vertices; input edges; input number_boundary_vertices; input boundary_edges; input "
-      "block_boundary_edges")
+def compute_cases(k):
+
+    """
+    :return:    List of all cases described in the article for the given k, in the order of the output, see
+                case_runner.make_case()
+    """
 
-for k in range(2, 4):
+    cases = []
 
     #
     # TYPE 1.X.1 for 3 <= X <= 10
@@ -33,11 +40,9 @@ for k in range(2, 4):
         block_boundary_edges = [(i, i) for i in range(0, x)]
         augmentation_vertex = 0
 
-        block = generic_block.Block(k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges)
-        result = block.block_divergence(augmentation_vertex)
-
-        print(f'{k}; Type 1.{x}.1; {len(block.fillings)}; {len(block.boundary_constraints)}; {result}; '
-              + f'{number_vertices}; {edges}; {number_boundary_vertices}; {boundary_edges}; {block_boundary_edges}')
+        cases.append(case_runner.make_case(f'Type 1.{x}.1', k, number_vertices, edges,
+                                           number_boundary_vertices, boundary_edges, block_boundary_edges,
+                                           augmentation_vertex))
 
     #
     # TYPE 1.X.1Y for 3 <= X <= 10, 2 <= Y <= floor(X / 2)
@@ -57,11 +62,9 @@ for k in range(2, 4):
             for i in range(y, x):
                 block_boundary_edges.append((i, i - 1))
 
-            block = generic_block.Block(k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges)
-            result = block.block_divergence(augmentation_vertex)
-
-            print(f'{k}; Type 1.{x}.1{y}; {len(block.fillings)}; {len(block.boundary_constraints)}; {result}; '
-                  + f'{number_vertices}; {edges}; {number_boundary_vertices}; {boundary_edges}; {block_boundary_edges}')
+            cases.append(case_runner.make_case(f'Type 1.{x}.1{y}', k, number_vertices, edges,
+                                               number_boundary_vertices, boundary_edges, block_boundary_edges,
+                                               augmentation_vertex))
 
     #
     # TYPE 1.L.XYZ WHERE 1 = X < Y < Z < L <= 10 AND (Y - X) <= (Z - Y) <= (L + 1 - Z)
@@ -97,13 +100,9 @@ for k in range(2, 4):
                 for i in range(Z, L):
                     block_boundary_edges.append((i, i - 2))
 
-                block = generic_block.Block(k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges)
-                result = block.block_divergence(augmentation_vertex)
-
-                #print("Type 1." + str(L) + "." + str(X) + str(Y) + str(Z) + ": " + str(result))
-
-                print(f'{k}; Type 1.{L}.{X}{Y}{Z}; {len(block.fillings)}; {len(block.boundary_constraints)}; {result}; '
-                      + f'{number_vertices}; {edges}; {number_boundary_vertices}; {boundary_edges}; {block_boundary_edges}')
+                cases.append(case_runner.make_case(f'Type 1.{L}.{X}{Y}{Z}', k, number_vertices, edges,
+                                                   number_boundary_vertices, boundary_edges, block_boundary_edges,
+                                                   augmentation_vertex))
 
     #
     # TYPE 2.X FOR 1 <= X <= 4
@@ -118,11 +117,9 @@ for k in range(2, 4):
     for X in range(1, 5):
         augmentation_vertex = X
 
-        block = generic_block.Block(k, number_vertices, edges, number_boundary_vertices, boundary_edges, block_boundary_edges)
-        result = block.block_divergence(augmentation_vertex)
-
-        print(f'{k}; Type 2.{X}; {len(block.fillings)}; {len(block.boundary_constraints)}; {result}; '
-              + f'{number_vertices}; {edges}; {number_boundary_vertices}; {boundary_edges}; {block_boundary_edges}')
+        cases.append(case_runner.make_case(f'Type 2.{X}', k, number_vertices, edges,
+                                           number_boundary_vertices, boundary_edges, block_boundary_edges,
+                                           augmentation_vertex))
 
     #
     # TYPE 2.XY FOR 1 <= X < Y <= 8 WHERE (X - 1) <= (8 - Y)
@@ -148,12 +145,9 @@ for k in range(2, 4):
             for i in range(Y, 8):
                 block_boundary_edges.append((i, i))
 
-            block = generic_block.Block(k, number_vertices, edges, number_boundary_vertices, boundary_edges,
-                                        block_boundary_edges)
-            result = block.block_divergence(augmentation_vertex)
-
-            print(f'{k}; Type 2.{X}{Y}; {len(block.fillings)}; {len(block.boundary_constraints)}; {result}; '
-                  + f'{number_vertices}; {edges}; {number_boundary_vertices}; {boundary_edges}; {block_boundary_edges}')
+            cases.append(case_runner.make_case(f'Type 2.{X}{Y}', k, number_vertices, edges,
+                                               number_boundary_vertices, boundary_edges, block_boundary_edges,
+                                               augmentation_vertex))
 
     #
     # TYPE 2.XYZ FOR 1 <= X < Y < Z <= 8 WHERE (X - 1) <= (8 - Z)
@@ -183,9 +177,57 @@ for k in range(2, 4):
                 for i in range(Z, 8):
                     block_boundary_edges.append((i, i - 1))
 
-                block = generic_block.Block(k, number_vertices, edges, number_boundary_vertices, boundary_edges,
-                                            block_boundary_edges)
-                result = block.block_divergence(augmentation_vertex)
-
-                print(f'{k}; Type 2.{X}{Y}{Z}; {len(block.fillings)}; {len(block.boundary_constraints)}; {result}; '
-                      + f'{number_vertices}; {edges}; {number_boundary_vertices}; {boundary_edges}; {block_boundary_edges}')
\ No newline at end of file
+                cases.append(case_runner.make_case(f'Type 2.{X}{Y}{Z}', k, number_vertices, edges,
+                                                   number_boundary_vertices, boundary_edges, block_boundary_edges,
+                                                   augmentation_vertex))
+
+    return cases
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Bounds the block divergence in all cases of blocks in three regular "
+                                                 "planar graphs.")
+    parser.add_argument("--exact", action="store_true",
+                        help="compare expected weight differences exactly and report the results as fractions")
+    parser.add_argument("--backend", choices=sorted(case_runner.BLOCK_CLASSES), default="enumeration",
+                        help="enumerate all fillings of a block (default) or count them by variable elimination, see "
+                             "elimination_block.py")
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 3], help="values of k (default: 2 3)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of cores)")
+    parser.add_argument("--cache-file", default=None,
+                        help="file in which the results are kept; cases found there are not computed again")
+    parser.add_argument("--incremental", action="store_true",
+                        help="extend the tables of every block for k from those for k - 1 instead of computing them "
+                             "from scratch; the blocks for all k are computed by the same process")
+    instrumentation.add_arguments(parser)
+    table_store.add_arguments(parser)
+    arguments = parser.parse_args()
+    instrumentation.configure_from_arguments(arguments)
+    table_store.configure_from_arguments(arguments)
+
+    print("PYTHON VERSION:\n" + sys.version)
+
+    # column description line for reading the output as a CSV
+    #
+    print("k; case; number of internally valid fillings; number of valid boundary constraints; result (block "
+          "divergence); input number_vertices; input edges; input number_boundary_vertices; input boundary_edges; "
+          "input block_boundary_edges")
+    sys.stdout.flush()
+
+    cases = []
+    for k in arguments.k:
+        cases += compute_cases(k)
+
+    for case, number_fillings, number_boundary_constraints, result in case_runner.run_cases(
+            cases, arguments.backend, arguments.exact, arguments.processes, arguments.cache_file,
+            arguments.incremental):
+        print(f'{case["k"]}; {case["name"]}; {number_fillings}; {number_boundary_constraints}; {result}; '
+              + f'{case["number_vertices"]}; {case["edges"]}; {case["number_boundary_vertices"]}; '
+              + f'{case["boundary_edges"]}; {case["block_boundary_edges"]}')
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
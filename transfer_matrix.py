@@ -0,0 +1,300 @@
+# This code provides a transfer-matrix engine for the row-by-row dynamic program that counts the fillings of a
+# rectangular block and sums up their weights. A filling is built row by row, starting at the front; every row is a
+# k-strip, i.e. a k-height on a path whose length is the width of the block. Everything that does not depend on the
+# boundary constraint is computed once per k: the list of k-strips, the compatibility structure between strips of
+# successive rows, and for every column and every boundary value the set of strips that respect this boundary value in
+# that column. Sets of strips are encoded as bitmasks (Python integers) whose i-th bit corresponds to the i-th strip.
+# Evaluating a boundary constraint then only takes a few sparse matrix-vector steps over (count, weight) vectors. The
+# strips and their compatibility structure can be kept on disk for later runs, see table_store.py .
+
+
+import itertools
+
+import generic_block
+import table_store
+
+
+def compute_strips(k, length):
+
+    """
+    Computes all k-strips of the given length, i.e. all k-heights on a path with vertices 0, ..., length - 1.
+    :param k:           The parameter k of the k-heights
+    :param length:      Number of vertices of the path
+    :return:            List of length-tuples in lexicographic order
+    """
+
+    strips = []
+
+    for strip in itertools.product(range(k + 1), repeat=length):
+        is_valid_k_strip = True
+        for i in range(length - 1):
+            if abs(strip[i] - strip[i + 1]) > 1:
+                is_valid_k_strip = False
+                break
+        if is_valid_k_strip:
+            strips.append(strip)
+
+    return strips
+
+
+def compute_compatibility(strips):
+
+    """
+    :param strips:  List of k-strips of the same length, see compute_strips()
+    :return:        List whose i-th entry is the sorted tuple of the indices of all strips that may follow strip i
+                    in the next row (and vice versa)
+    """
+
+    strip_index = {strip: i for i, strip in enumerate(strips)}
+
+    compatible = []
+    for strip in strips:
+        neighbors = []
+        for candidate in itertools.product(*[(value - 1, value, value + 1) for value in strip]):
+            if candidate in strip_index:
+                neighbors.append(strip_index[candidate])
+        compatible.append(tuple(sorted(neighbors)))
+
+    return compatible
+
+
+def get_strips_and_compatibility(k, width):
+
+    """
+    :return:    Tuple (strips, compatible) of compute_strips() and compute_compatibility(), from the table directory if
+                one is configured
+    """
+
+    def compute():
+        strips = compute_strips(k, width)
+        return strips, compute_compatibility(strips)
+
+    def encode(tables):
+        arrays = table_store.encode_rows("strips", tables[0], width)
+        arrays.update(table_store.encode_ragged_rows("compatible", tables[1]))
+        return arrays
+
+    def decode(arrays):
+        return table_store.decode_rows(arrays, "strips"), table_store.decode_ragged_rows(arrays, "compatible")
+
+    return table_store.cached("strips", {"k": k, "width": width}, compute, encode, decode)
+
+
+class TransferMatrix:
+
+    def __init__(self, k, width=4, height=4, back_columns=None):
+
+        """
+        Remark: Rows are indexed from the front to the back, columns from the left to the right.
+
+        :param k:               The k of the k-heights
+        :param width:           Number of columns of the block, i.e. the length of the strips
+        :param height:          Number of rows of the block
+        :param back_columns:    Columns in which the last row is checked against the back side of the boundary.
+                                Defaults to all columns.
+        """
+
+        self.k = k
+        self.width = width
+        self.height = height
+        self.back_columns = tuple(range(width)) if back_columns is None else tuple(back_columns)
+
+        # compatible[i] contains the indices of all strips that may follow strip i in the next row (and vice versa).
+
+        self.strips, self.compatible = get_strips_and_compatibility(k, width)
+        self.strip_index = {strip: i for i, strip in enumerate(self.strips)}
+        self.strip_weights = [sum(strip) for strip in self.strips]
+        self.all_strips_mask = (1 << len(self.strips)) - 1
+
+        # column_masks[j][value] is the bitmask of the strips whose j-th entry differs by at most one from value. We
+        # also cover the values -1 and k + 1 so that augmented or shifted boundary values can be looked up as well.
+
+        self.column_masks = []
+        for j in range(width):
+            masks = dict()
+            for value in range(-1, k + 2):
+                mask = 0
+                for i, strip in enumerate(self.strips):
+                    if abs(strip[j] - value) <= 1:
+                        mask |= 1 << i
+                masks[value] = mask
+            self.column_masks.append(masks)
+
+        self._members = dict()
+
+    def column_mask(self, column, value):
+
+        """
+        :return:    Bitmask of the strips whose entry in the given column is compatible with the boundary value.
+        """
+
+        if value in self.column_masks[column]:
+            return self.column_masks[column][value]
+        return 0
+
+    def side_mask(self, side, columns=None):
+
+        """
+        Computes the bitmask of the strips that are compatible with a front or back side of the boundary.
+        :param side:        Boundary values of the side, indexed from left to right
+        :param columns:     Columns that are checked against the side. Defaults to all columns.
+        :return:            Bitmask of strips
+        """
+
+        mask = self.all_strips_mask
+        for j in (range(self.width) if columns is None else columns):
+            mask &= self.column_mask(j, side[j])
+        return mask
+
+    def row_masks(self, left, right, back):
+
+        """
+        Computes for each row the bitmask of the strips that are compatible with the left, right and back side of the
+        boundary. The front side is not taken into account.
+        """
+
+        masks = [self.column_mask(0, left[row]) & self.column_mask(self.width - 1, right[row])
+                 for row in range(self.height)]
+        masks[-1] &= self.side_mask(back, self.back_columns)
+        return masks
+
+    def members(self, mask):
+
+        """
+        :return:    Tuple of the indices of the strips contained in the bitmask. Results are cached.
+        """
+
+        if mask not in self._members:
+            self._members[mask] = tuple(i for i in range(len(self.strips)) if (mask >> i) & 1)
+        return self._members[mask]
+
+    def step(self, counts, weights, mask):
+
+        """
+        Performs one step of the dynamic program: given number and weight of the partial fillings by their last row,
+        computes number and weight of the partial fillings that are extended by one further row which is contained in
+        mask.
+        """
+
+        new_counts = [0] * len(self.strips)
+        new_weights = [0] * len(self.strips)
+
+        for j in self.members(mask):
+            count = 0
+            weight = 0
+            for i in self.compatible[j]:
+                count += counts[i]
+                weight += weights[i]
+            if count:
+                new_counts[j] = count
+                new_weights[j] = weight + count * self.strip_weights[j]
+
+        return new_counts, new_weights
+
+    def count_and_weight(self, front, left, right, back):
+
+        """
+        Counts the fillings of the block that are admissible with respect to the boundary constraint and sums up their
+        weights.
+        :param front:   Front side of the boundary, indexed from left to right
+        :param left:    Left side of the boundary, indexed from front to back
+        :param right:   Right side of the boundary, indexed from front to back
+        :param back:    Back side of the boundary, indexed from left to right
+        :return:        Tuple of integers (number of admissible fillings, total weight of admissible fillings)
+        """
+
+        masks = self.row_masks(left, right, back)
+
+        # The first row only has to be compatible with the front and with its own row mask.
+
+        counts = [0] * len(self.strips)
+        weights = [0] * len(self.strips)
+        for j in self.members(masks[0] & self.side_mask(front)):
+            counts[j] = 1
+            weights[j] = self.strip_weights[j]
+
+        for row in range(1, self.height):
+            counts, weights = self.step(counts, weights, masks[row])
+
+        return sum(counts), sum(weights)
+
+    def backward_messages(self, left, right, back):
+
+        """
+        Runs the dynamic program from the back towards the front. The result contains, for every possible first row,
+        the number and the total weight of all fillings with this first row that are admissible with respect to the
+        left, right and back side of the boundary. The front side is not taken into account, so that the messages can
+        be shared by all boundary constraints that agree on the other three sides; see contract().
+        :return:    Tuple (counts, weights) of lists indexed by strips
+        """
+
+        masks = self.row_masks(left, right, back)
+
+        counts = [0] * len(self.strips)
+        weights = [0] * len(self.strips)
+        for j in self.members(masks[-1]):
+            counts[j] = 1
+            weights[j] = self.strip_weights[j]
+
+        for row in range(self.height - 2, -1, -1):
+            counts, weights = self.step(counts, weights, masks[row])
+
+        return counts, weights
+
+    def completion_counts(self, front, left, right, back):
+
+        """
+        Counts, for every row and every strip, the admissible completions of the rows behind: the r-th list contains,
+        for every strip, the number of admissible partial fillings of the rows r, r + 1, ..., height - 1 whose row r is
+        this strip. The first row is checked against the front side of the boundary as well, so that the sum of the
+        first list is the number of admissible fillings. Used for sampling fillings row by row, see block_sampler.py .
+        :return:    List of height lists indexed by strips
+        """
+
+        masks = self.row_masks(left, right, back)
+        masks[0] &= self.side_mask(front)
+
+        counts = [[0] * len(self.strips) for _ in range(self.height)]
+        for j in self.members(masks[-1]):
+            counts[-1][j] = 1
+
+        for row in range(self.height - 2, -1, -1):
+            following = counts[row + 1]
+            for j in self.members(masks[row]):
+                counts[row][j] = sum(following[i] for i in self.compatible[j])
+
+        return counts
+
+    def contract(self, messages, front):
+
+        """
+        Completes the backward messages by the front side of the boundary.
+        :param messages:    Result of backward_messages()
+        :param front:       Front side of the boundary, indexed from left to right
+        :return:            Tuple of integers (number of admissible fillings, total weight of admissible fillings)
+        """
+
+        counts, weights = messages
+
+        count = 0
+        weight = 0
+        for j in self.members(self.side_mask(front)):
+            count += counts[j]
+            weight += weights[j]
+
+        return count, weight
+
+    def expected_weight(self, front, left, right, back):
+
+        """
+        Computes the expected weight of a filling uniformly chosen at random from all fillings that are compatible with
+        the boundary constraint. Raises a NoAdmissibleFilling exception if there is no such filling.
+        :return:    Float. Expected weight.
+        """
+
+        count, weight = self.count_and_weight(front, left, right, back)
+
+        if count == 0:
+            raise generic_block.NoAdmissibleFilling()
+
+        return weight / count